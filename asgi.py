@@ -0,0 +1,49 @@
+"""
+ASGI entry point for serving the Chainlit app with several worker processes.
+
+`chainlit run chainlit_app.py` serves everything from one process. To use
+every core, run the same app under uvicorn with N workers behind one port:
+
+    WEB_CONCURRENCY=4 uvicorn asgi:app --host 0.0.0.0 --port 8000
+
+uvicorn reads WEB_CONCURRENCY as its worker count, and the app reads it to
+switch on shared state: conversation checkpoints, the query-result cache and
+result handles live in SQLite files in WAL mode that every worker uses (see
+src/utils/shared_state.py), so a conversation can continue on any worker.
+
+The browser is restricted to the websocket transport. A websocket stays on
+the worker that accepted it, so no sticky routing is needed in front of the
+workers; with socket.io long polling, consecutive requests of one session
+could land on different workers and fail.
+
+/healthz answers as soon as a worker is up; /readyz (see
+src/services/startup.py) returns 503 until its warm-up has finished.
+"""
+from contextlib import asynccontextmanager
+from chainlit.config import config
+from chainlit.utils import mount_chainlit
+from fastapi import FastAPI
+from src.services.startup import begin_warm_up
+from src.utils.shared_state import APP_WORKERS, shared_state_enabled
+
+# Socket.io long polling needs sticky sessions; websockets do not
+config.project.transports = ["websocket"]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mounted apps get no lifespan events, so Chainlit's on_app_startup never runs here
+    begin_warm_up()
+    yield
+
+
+app = FastAPI(title="Data Analyst Agent", lifespan=lifespan)
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe for the worker answering the request."""
+    return {"status": "ok", "workers": APP_WORKERS, "shared_state": shared_state_enabled()}
+
+
+mount_chainlit(app=app, target="chainlit_app.py", path="/")
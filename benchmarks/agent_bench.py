@@ -0,0 +1,309 @@
+"""
+End-to-end benchmark for the data analyst agent.
+
+Replays the question corpus through the compiled LangGraph workflow with a
+scripted fake chat model (no network, no Ollama), so the numbers isolate the
+agent's own overhead: graph scheduling, SQL execution, chart building and
+the astream_events plumbing that run_data_analyst consumes.
+
+Metrics (milliseconds unless noted):
+    node.analyst / node.tools   graph node latency
+    tool.execute_sql_tool       SQL tool latency (execution plus result formatting)
+    tool.draw_chart_*           chart build and serialization (either chart tool)
+    chart.decode                UI-side chart resolution and serialization on on_tool_end
+    events.handling             time spent in the event loop body per run
+    events.overhead             astream_events run minus the paired ainvoke run
+    events.count                events per run (count, not time)
+
+Usage:
+    python -m benchmarks.agent_bench --iterations 5 --concurrency 8 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+import plotly.io as pio
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from benchmarks.fake_llm import FAKE_MODEL_NAME, ScriptedChatModel
+from src.services.chart_store import get_chart_store
+from src.services.data_analyst_agent import CHART_TOOL_NAMES, create_data_analyst_workflow
+from src.services.sql_engine import DB_PATH
+from src.utils.graph_utils import get_model_config
+from src.utils.model_registry import get_model_registry
+from src.utils.query_cache import get_query_cache
+
+CORPUS_PATH = Path(__file__).parent / "corpus.json"
+
+# Graph nodes timed individually
+NODE_NAMES = ("analyst", "tools")
+
+
+# ================================================================================
+# Statistics
+# ================================================================================
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = position - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def summarize(samples: list[float]) -> dict:
+    """Summarize samples given in seconds as milliseconds."""
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+# ================================================================================
+# Runner
+# ================================================================================
+
+def load_corpus(path: Path = CORPUS_PATH) -> list[dict]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def install_fake_model(corpus: list[dict], latency: float = 0.0) -> str:
+    """Register the scripted model under FAKE_MODEL_NAME and return the name."""
+    scripts = {entry["question"]: entry for entry in corpus}
+    model = ScriptedChatModel(scripts=scripts, latency=latency)
+    get_model_registry().register(FAKE_MODEL_NAME, get_model_config(FAKE_MODEL_NAME), model)
+    return FAKE_MODEL_NAME
+
+
+def decode_chart(tool_output: str):
+    """
+    UI-side chart handling, as done by run_data_analyst on on_tool_end:
+    resolve the handle and serialize the figure once, like cl.Plotly does.
+    """
+    chart = get_chart_store().resolve(tool_output)
+    if chart is None:
+        return None
+    return pio.to_json(chart.figure, validate=False)
+
+
+class BenchmarkRecorder:
+    """Collects timing samples by metric name."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.counts: dict[str, list[int]] = defaultdict(list)
+        self.errors = 0
+
+    def add(self, metric: str, seconds: float):
+        self.samples[metric].append(seconds)
+
+    def add_count(self, metric: str, value: int):
+        self.counts[metric].append(value)
+
+    def report(self) -> dict:
+        report = {metric: summarize(values) for metric, values in sorted(self.samples.items())}
+        for metric, values in sorted(self.counts.items()):
+            report[metric] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values), 1),
+                "max": max(values),
+            }
+        return report
+
+
+async def run_streamed(workflow, question: str, model_name: str, recorder: BenchmarkRecorder):
+    """
+    Run one question through astream_events the way run_data_analyst does and
+    record node, tool, chart-decode and event-handling timings.
+    """
+    config = {"configurable": {"model_name": model_name, "thread_id": f"bench-{uuid.uuid4().hex}"}}
+    started: dict[str, float] = {}
+    handling = 0.0
+    events = 0
+
+    start = time.perf_counter()
+    async for event in workflow.astream_events(
+        {"messages": [HumanMessage(content=question)]}, config=config, version="v2"
+    ):
+        received = time.perf_counter()
+        events += 1
+        event_type = event.get("event", "")
+        name = event.get("name", "")
+        run_id = event.get("run_id")
+
+        if event_type == "on_chain_start" and name in NODE_NAMES:
+            started[run_id] = received
+        elif event_type == "on_chain_end" and name in NODE_NAMES and run_id in started:
+            recorder.add(f"node.{name}", received - started.pop(run_id))
+        elif event_type == "on_tool_start":
+            started[run_id] = received
+        elif event_type == "on_tool_end":
+            if run_id in started:
+                recorder.add(f"tool.{name}", received - started.pop(run_id))
+            if name in CHART_TOOL_NAMES:
+                decode_start = time.perf_counter()
+                decode_chart(event.get("data", {}).get("output", ""))
+                recorder.add("chart.decode", time.perf_counter() - decode_start)
+
+        handling += time.perf_counter() - received
+
+    elapsed = time.perf_counter() - start
+    recorder.add("run.streamed", elapsed)
+    recorder.add("events.handling", handling)
+    recorder.add_count("events.count", events)
+    return elapsed
+
+
+async def run_invoked(workflow, question: str, model_name: str, recorder: BenchmarkRecorder):
+    """Run one question with ainvoke (no event stream) as the overhead baseline."""
+    config = {"configurable": {"model_name": model_name, "thread_id": f"bench-{uuid.uuid4().hex}"}}
+    start = time.perf_counter()
+    await workflow.ainvoke({"messages": [HumanMessage(content=question)]}, config=config)
+    elapsed = time.perf_counter() - start
+    recorder.add("run.invoked", elapsed)
+    return elapsed
+
+
+async def run_benchmark(
+    corpus: list[dict],
+    iterations: int = 3,
+    concurrency: int = 1,
+    llm_latency: float = 0.0,
+    baseline: bool = True,
+    cold_cache: bool = False,
+    warmup: int = 1
+) -> dict:
+    """
+    Replay the corpus and return a machine-readable report.
+
+    Args:
+        corpus: Question scripts (see corpus.json)
+        iterations: Passes over the corpus
+        concurrency: Questions in flight at once
+        llm_latency: Simulated model latency per call, in seconds
+        baseline: Also run each question with ainvoke to measure event-stream overhead
+        cold_cache: Clear the SQL result cache before every question
+        warmup: Untimed passes over the corpus before measuring
+
+    Returns:
+        Report dictionary
+    """
+    model_name = install_fake_model(corpus, latency=llm_latency)
+    workflow = create_data_analyst_workflow(checkpointer=MemorySaver())
+    cache = get_query_cache(DB_PATH)
+    recorder = BenchmarkRecorder()
+
+    for _ in range(warmup):
+        scratch = BenchmarkRecorder()
+        for entry in corpus:
+            await run_streamed(workflow, entry["question"], model_name, scratch)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(question: str):
+        async with semaphore:
+            try:
+                if cold_cache:
+                    cache.clear()
+                streamed = await run_streamed(workflow, question, model_name, recorder)
+                if baseline:
+                    if cold_cache:
+                        cache.clear()
+                    invoked = await run_invoked(workflow, question, model_name, recorder)
+                    recorder.add("events.overhead", max(streamed - invoked, 0.0))
+            except Exception:
+                recorder.errors += 1
+                raise
+
+    questions = [entry["question"] for _ in range(iterations) for entry in corpus]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_one(q) for q in questions), return_exceptions=True)
+    wall_time = time.perf_counter() - start
+    failures = [repr(r) for r in results if isinstance(r, Exception)]
+
+    metrics = recorder.report()
+
+    return {
+        "benchmark": "agent",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "questions": len(corpus),
+            "iterations": iterations,
+            "concurrency": concurrency,
+            "llm_latency_ms": llm_latency * 1000,
+            "baseline": baseline,
+            "cold_cache": cold_cache,
+            "warmup": warmup,
+        },
+        "summary": {
+            "runs": len(questions),
+            "failures": len(failures),
+            "wall_time_s": round(wall_time, 3),
+            "throughput_qps": round(len(questions) / wall_time, 3) if wall_time else 0.0,
+        },
+        "metrics": metrics,
+        "errors": failures[:10],
+        "query_cache": cache.stats().to_dict(),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the data analyst agent with a scripted model")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_PATH, help="Question corpus JSON file")
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over the corpus")
+    parser.add_argument("--concurrency", type=int, default=1, help="Questions in flight at once")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated model latency per call")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed passes before measuring")
+    parser.add_argument("--no-baseline", action="store_true", help="Skip the ainvoke baseline runs")
+    parser.add_argument("--cold-cache", action="store_true", help="Clear the SQL result cache before each run")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    if not DB_PATH.exists():
+        print(f"Database not found at {DB_PATH}", file=sys.stderr)
+        return 1
+
+    report = asyncio.run(run_benchmark(
+        load_corpus(args.corpus),
+        iterations=args.iterations,
+        concurrency=args.concurrency,
+        llm_latency=args.llm_latency_ms / 1000,
+        baseline=not args.no_baseline,
+        cold_cache=args.cold_cache,
+        warmup=args.warmup
+    ))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 1 if report["summary"]["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Benchmark of the columnar mirror against SQLite on aggregate queries.
+
+Every query runs on both engines (the SQL engine without its result cache,
+and the columnar engine); the results must be identical, including value
+types, or the benchmark fails. Queries the columnar engine declines are
+reported as fallbacks.
+
+Usage:
+    python -m benchmarks.columnar_bench --iterations 5 --output columnar.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.services.columnar_engine import ColumnarEngine
+from src.services.sql_engine import DB_PATH, SQLEngine
+
+# Aggregate queries of the kind the agent writes
+QUERIES = {
+    "orders_by_status": """
+        SELECT order_status, COUNT(*) AS orders FROM orders
+        GROUP BY order_status ORDER BY orders DESC
+    """,
+    "monthly_orders": """
+        SELECT strftime('%Y-%m', order_purchase_timestamp) AS month, COUNT(*) AS orders
+        FROM orders GROUP BY month ORDER BY month
+    """,
+    "monthly_revenue_by_category": """
+        SELECT strftime('%Y-%m', o.order_purchase_timestamp) AS month,
+               p.product_category_name AS category,
+               ROUND(SUM(oi.price), 2) AS revenue, COUNT(*) AS items
+        FROM order_items oi
+        JOIN orders o ON o.order_id = oi.order_id
+        JOIN products p ON p.product_id = oi.product_id
+        GROUP BY month, category ORDER BY month, category
+    """,
+    "review_score_by_state": """
+        SELECT c.customer_state, ROUND(AVG(r.review_score), 2) AS avg_score, COUNT(*) AS reviews
+        FROM order_reviews r
+        JOIN orders o ON o.order_id = r.order_id
+        JOIN customers c ON c.customer_id = o.customer_id
+        GROUP BY c.customer_state ORDER BY c.customer_state
+    """,
+    "top_categories_by_revenue": """
+        SELECT p.product_category_name, ROUND(SUM(oi.price), 2) AS revenue
+        FROM order_items oi JOIN products p ON p.product_id = oi.product_id
+        WHERE p.product_category_name IS NOT NULL
+        GROUP BY p.product_category_name ORDER BY revenue DESC LIMIT 10
+    """,
+    "payments_by_type": """
+        SELECT payment_type, COUNT(*) AS payments, ROUND(AVG(payment_value), 2) AS avg_value,
+               SUM(payment_installments) AS installments, MAX(payment_value) AS largest
+        FROM order_payments GROUP BY payment_type ORDER BY payments DESC
+    """,
+    "delivered_2018_by_state": """
+        SELECT c.customer_state, COUNT(DISTINCT o.customer_id) AS customers, COUNT(*) AS orders
+        FROM orders o JOIN customers c ON c.customer_id = o.customer_id
+        WHERE o.order_status = 'delivered' AND o.order_purchase_timestamp >= '2018-01-01'
+        GROUP BY c.customer_state ORDER BY orders DESC, c.customer_state
+    """,
+    "freight_share_by_seller_state": """
+        SELECT s.seller_state, ROUND(SUM(oi.freight_value) * 100.0 / SUM(oi.price), 2) AS freight_pct,
+               MIN(oi.price) AS cheapest, MAX(oi.price) AS priciest
+        FROM order_items oi JOIN sellers s ON s.seller_id = oi.seller_id
+        GROUP BY s.seller_state ORDER BY s.seller_state
+    """,
+    "orders_without_review": """
+        SELECT o.order_status, COUNT(*) AS orders
+        FROM orders o LEFT JOIN order_reviews r ON r.order_id = o.order_id
+        WHERE r.review_id IS NULL
+        GROUP BY o.order_status ORDER BY o.order_status
+    """,
+    "totals": """
+        SELECT COUNT(*) AS items, COUNT(DISTINCT order_id) AS orders,
+               ROUND(SUM(price), 2) AS revenue, ROUND(AVG(freight_value), 2) AS avg_freight
+        FROM order_items
+    """,
+    "yearly_orders": """
+        SELECT strftime('%Y', order_purchase_timestamp) AS year, COUNT(*) AS orders
+        FROM orders WHERE order_status IN ('delivered', 'shipped')
+        GROUP BY 1 ORDER BY 1
+    """,
+    "unrounded_revenue": """
+        SELECT customer_state, SUM(price) FROM order_items oi
+        JOIN orders o ON o.order_id = oi.order_id
+        JOIN customers c ON c.customer_id = o.customer_id
+        GROUP BY customer_state
+    """,
+    "empty_total": """
+        SELECT TOTAL(payment_installments), SUM(payment_installments), COUNT(*) FROM order_payments
+        WHERE payment_type = 'nothing'
+    """,
+}
+
+
+def typed(rows: list[tuple]) -> list[tuple]:
+    """Rows with the type of every value, so 1 and 1.0 do not compare equal."""
+    return [tuple((type(value).__name__, value) for value in row) for row in rows]
+
+
+def median(values: list[float]) -> float:
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def run(db_path: Path, iterations: int) -> dict:
+    sqlite_engine = SQLEngine(db_path)
+    with tempfile.TemporaryDirectory() as root:
+        columnar = ColumnarEngine(db_path, Path(root), auto_refresh=False)
+        build_start = time.perf_counter()
+        columnar.refresh(force=True)
+        build_s = time.perf_counter() - build_start
+
+        report = {"build_s": round(build_s, 3), "queries": {}, "mismatches": [], "fallbacks": []}
+        for name, query in QUERIES.items():
+            expected = sqlite_engine.execute(query, use_cache=False)
+            answered = columnar.execute(query)
+            if answered is None:
+                report["fallbacks"].append(name)
+                continue
+            if answered.columns != expected.columns or typed(answered.rows) != typed(expected.rows):
+                report["mismatches"].append(name)
+                continue
+
+            timings = {"sqlite": [], "columnar": []}
+            for _ in range(iterations):
+                start = time.perf_counter()
+                sqlite_engine.execute(query, use_cache=False)
+                timings["sqlite"].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                columnar.execute(query)
+                timings["columnar"].append(time.perf_counter() - start)
+
+            sqlite_ms = median(timings["sqlite"]) * 1000
+            columnar_ms = median(timings["columnar"]) * 1000
+            report["queries"][name] = {
+                "rows": len(expected.rows),
+                "sqlite_ms": round(sqlite_ms, 2),
+                "columnar_ms": round(columnar_ms, 2),
+                "speedup": round(sqlite_ms / columnar_ms, 2) if columnar_ms else None,
+            }
+    sqlite_engine.shutdown()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar mirror vs SQLite benchmark")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    report = run(args.db, args.iterations)
+    report["environment"] = {"python": platform.python_version(), "platform": platform.platform()}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+    if report["mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Deterministic scripted chat model for benchmarking the agent without a network.
+
+Each corpus entry maps a question to the tool calls the model "decides" on,
+one step per analyst turn, followed by a canned final answer.
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Any, Optional, Sequence
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FAKE_MODEL_NAME = "fake:scripted"
+
+DEFAULT_ANSWER = "**📝 Summary:**\nNo scripted answer for this question."
+
+# Script argument replaced by the latest result handle returned by execute_sql_tool
+LAST_RESULT_PLACEHOLDER = "$last_result"
+
+_RESULT_HANDLE = re.compile(r"Result handle: (result_[0-9a-f]+)")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Replays the tool-call script of the corpus entry matching the latest user
+    question. The step is the number of AI turns since that question, so the
+    model behaves like a ReAct agent: tool calls first, then a final answer.
+    """
+
+    scripts: dict[str, dict]
+    latency: float = 0.0
+    """Simulated per-call model latency in seconds."""
+    chunk_size: int = 16
+    """Characters per streamed chunk of the final answer."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Sequence, **kwargs: Any) -> "ScriptedChatModel":
+        # Tool calls come from the script, so binding is a no-op
+        return self
+
+    def _next_message(self, messages: list[BaseMessage]) -> AIMessage:
+        question, step, last_result = "", 0, None
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                question = message.content if isinstance(message.content, str) else ""
+                break
+            if isinstance(message, AIMessage):
+                step += 1
+            elif isinstance(message, ToolMessage) and last_result is None:
+                match = _RESULT_HANDLE.search(str(message.content))
+                last_result = match.group(1) if match else None
+
+        script = self.scripts.get(question.strip(), {})
+        steps = script.get("steps", [])
+        if step < len(steps):
+            tool_calls = [
+                {
+                    "name": call["name"],
+                    "args": {
+                        key: last_result if value == LAST_RESULT_PLACEHOLDER else value
+                        for key, value in call["args"].items()
+                    },
+                    "id": f"call_{step}_{index}",
+                    "type": "tool_call"
+                }
+                for index, call in enumerate(steps[step])
+            ]
+            return AIMessage(content="", tool_calls=tool_calls)
+        return AIMessage(content=script.get("answer", DEFAULT_ANSWER))
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ):
+        """Stream the answer in small chunks so the event stream carries token events."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = self._next_message(messages)
+        if message.tool_calls:
+            tool_call_chunks = [
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                for index, call in enumerate(message.tool_calls)
+            ]
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=tool_call_chunks))
+            return
+        content = message.content
+        for start in range(0, len(content), self.chunk_size):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=content[start:start + self.chunk_size]))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,122 @@
+"""
+Import-time profile of the application entry point.
+
+Imports a module (chainlit_app by default) in a fresh interpreter with
+``-X importtime`` and reports wall time, the slowest direct imports of that
+module and the cumulative time of every project module, so cold start can
+be tracked and kept within a budget.
+
+Usage:
+    python -m benchmarks.import_profile --top 15 --budget-ms 3000 --output imports.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).parent.parent
+
+# Modules belonging to this project
+PROJECT_PREFIXES = ("src", "chainlit_app", "asgi")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_import(module: str, python: str = sys.executable) -> dict:
+    """
+    Import a module in a fresh interpreter and parse the importtime report.
+
+    Returns:
+        Wall time plus self/cumulative microseconds and nesting depth per module
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall_time = time.perf_counter() - start
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(errors[-20:]))
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": len(indent) // 2,
+            })
+    return {"wall_time_ms": round(wall_time * 1000, 1), "modules": modules}
+
+
+def is_project_module(name: str) -> bool:
+    return any(name == prefix or name.startswith(prefix + ".") for prefix in PROJECT_PREFIXES)
+
+
+def summarize_profile(profile: dict, top: int = 15) -> dict:
+    """Slowest direct imports of the profiled module and the project's own modules."""
+    modules = profile["modules"]
+    direct = sorted((m for m in modules if m["depth"] == 1), key=lambda m: m["cumulative_ms"], reverse=True)
+    project = sorted((m for m in modules if is_project_module(m["module"])), key=lambda m: m["cumulative_ms"], reverse=True)
+    return {
+        "wall_time_ms": profile["wall_time_ms"],
+        "import_total_ms": round(sum(m["cumulative_ms"] for m in modules if m["depth"] == 0), 1),
+        "modules_imported": len(modules),
+        "direct_imports": [{"module": m["module"], "cumulative_ms": round(m["cumulative_ms"], 1)} for m in direct[:top]],
+        "project": [
+            {"module": m["module"], "self_ms": round(m["self_ms"], 1), "cumulative_ms": round(m["cumulative_ms"], 1)}
+            for m in project[:top]
+        ],
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Profile application import time")
+    parser.add_argument("--module", default="chainlit_app", help="Module to import")
+    parser.add_argument("--top", type=int, default=15, help="Modules listed per section")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs; the fastest is reported")
+    parser.add_argument("--budget-ms", type=float, help="Fail if the import takes longer than this")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    # The first run also pays for bytecode compilation and a cold page cache
+    profiles = [profile_import(args.module) for _ in range(max(1, args.repeat))]
+    best = min(profiles, key=lambda p: p["wall_time_ms"])
+    summary = summarize_profile(best, top=args.top)
+
+    report = {
+        "benchmark": "import",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": {"module": args.module, "repeat": args.repeat, "budget_ms": args.budget_ms},
+        "runs_ms": [p["wall_time_ms"] for p in profiles],
+        **summary,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.budget_ms is not None and summary["import_total_ms"] > args.budget_ms:
+        print(f"Import took {summary['import_total_ms']:.0f}ms, over the {args.budget_ms:.0f}ms budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
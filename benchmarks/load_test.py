@@ -0,0 +1,250 @@
+"""
+Load test for the multi-worker deployment mode.
+
+Starts N worker processes that each build the agent workflow exactly as an
+app worker does (SQLite checkpointer and result cache in shared mode, see
+asgi.py), then drives multi-turn conversations through them with the scripted
+fake model and reports throughput for every worker count.
+
+Routing:
+    stateless   turn k of conversation j goes to worker (j + k) % N, so every
+                follow-up question continues a conversation another worker
+                started; the report counts turns whose history was incomplete
+    sticky      conversation j always goes to worker j % N
+
+Usage:
+    python -m benchmarks.load_test --workers 1,2,4 --conversations 32 --turns 3 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from benchmarks.agent_bench import CORPUS_PATH, load_corpus, summarize
+
+
+# ================================================================================
+# Worker Process
+# ================================================================================
+
+def worker_main(index: int, jobs, results, corpus_path: str, llm_latency: float, concurrency: int):
+    """Entry point of one worker process: serve job batches until None arrives."""
+    asyncio.run(_serve(index, jobs, results, Path(corpus_path), llm_latency, concurrency))
+
+
+async def _serve(index: int, jobs, results, corpus_path: Path, llm_latency: float, concurrency: int):
+    # Imported in the worker so the shared-state environment is already set
+    from langchain_core.messages import HumanMessage
+    from benchmarks.agent_bench import install_fake_model
+    from src.services.data_analyst_agent import create_data_analyst_workflow
+
+    model_name = install_fake_model(load_corpus(corpus_path), latency=llm_latency)
+    workflow = create_data_analyst_workflow()
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def run(job: dict) -> dict:
+        config = {"configurable": {"model_name": model_name, "thread_id": job["thread_id"]}}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                state = await workflow.ainvoke({"messages": [HumanMessage(content=job["question"])]}, config=config)
+            except Exception as e:
+                return {**job, "worker": index, "elapsed": time.perf_counter() - start, "error": repr(e)}
+            elapsed = time.perf_counter() - start
+        questions = sum(isinstance(message, HumanMessage) for message in state["messages"])
+        return {**job, "worker": index, "elapsed": elapsed, "questions": questions, "error": None}
+
+    results.put((index, "ready", []))
+    while True:
+        batch = await loop.run_in_executor(None, jobs.get)
+        if batch is None:
+            break
+        outcomes = await asyncio.gather(*(run(job) for job in batch))
+        results.put((index, "done", outcomes))
+
+
+# ================================================================================
+# Driver
+# ================================================================================
+
+def _dispatch(job_queues: list, results, batches: list[list[dict]]) -> list[dict]:
+    """Send one batch per worker and wait for all of them."""
+    pending = 0
+    for queue, batch in zip(job_queues, batches):
+        if batch:
+            queue.put(batch)
+            pending += 1
+    outcomes = []
+    for _ in range(pending):
+        _, _, batch_outcomes = results.get()
+        outcomes.extend(batch_outcomes)
+    return outcomes
+
+
+def run_load(
+    workers: int,
+    corpus: list[dict],
+    conversations: int = 32,
+    turns: int = 3,
+    concurrency: int = 8,
+    llm_latency: float = 0.0,
+    routing: str = "stateless",
+    corpus_path: Path = CORPUS_PATH
+) -> dict:
+    """
+    Drive the conversations through a fresh set of worker processes.
+
+    Every run gets its own checkpoint and shared-state files, so worker
+    counts are measured from the same starting point.
+
+    Returns:
+        Report for this worker count
+    """
+    state_dir = Path(tempfile.mkdtemp(prefix="agent-load-"))
+    os.environ.update({
+        "WEB_CONCURRENCY": str(workers),
+        "SHARED_STATE": "on",
+        "SHARED_STATE_PATH": str(state_dir / "shared_state.sqlite"),
+        "CHECKPOINT_DB_PATH": str(state_dir / "checkpoints.sqlite"),
+    })
+
+    context = mp.get_context("spawn")
+    job_queues = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=worker_main,
+            args=(index, job_queues[index], results, str(corpus_path), llm_latency, concurrency),
+            name=f"agent-worker-{index}"
+        )
+        for index in range(workers)
+    ]
+    try:
+        startup = time.perf_counter()
+        for process in processes:
+            process.start()
+        for _ in processes:
+            results.get()
+        startup = time.perf_counter() - startup
+
+        # One untimed question per worker warms imports, the model registry and the pools
+        _dispatch(job_queues, results, [
+            [{"thread_id": f"warmup-{index}", "question": corpus[0]["question"], "turn": 0}]
+            for index in range(workers)
+        ])
+
+        threads = [f"load-{uuid.uuid4().hex}" for _ in range(conversations)]
+        outcomes = []
+        start = time.perf_counter()
+        for turn in range(turns):
+            batches = [[] for _ in range(workers)]
+            for number, thread_id in enumerate(threads):
+                worker = (number + turn) % workers if routing == "stateless" else number % workers
+                question = corpus[(number + turn) % len(corpus)]["question"]
+                batches[worker].append({"thread_id": thread_id, "question": question, "turn": turn})
+            outcomes.extend(_dispatch(job_queues, results, batches))
+        wall_time = time.perf_counter() - start
+    finally:
+        for queue in job_queues:
+            queue.put(None)
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    failures = [outcome for outcome in outcomes if outcome["error"]]
+    # A turn saw another worker's history only if every earlier question is in the state
+    lost_history = [
+        outcome for outcome in outcomes
+        if not outcome["error"] and outcome["questions"] != outcome["turn"] + 1
+    ]
+    per_worker = {}
+    for outcome in outcomes:
+        per_worker[outcome["worker"]] = per_worker.get(outcome["worker"], 0) + 1
+
+    return {
+        "workers": workers,
+        "runs": len(outcomes),
+        "failures": len(failures),
+        "lost_history": len(lost_history),
+        "startup_s": round(startup, 3),
+        "wall_time_s": round(wall_time, 3),
+        "throughput_qps": round(len(outcomes) / wall_time, 3) if wall_time else 0.0,
+        "runs_per_worker": dict(sorted(per_worker.items())),
+        "latency": summarize([outcome["elapsed"] for outcome in outcomes]),
+        "errors": [outcome["error"] for outcome in failures[:5]],
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure agent throughput across worker processes")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to measure")
+    parser.add_argument("--conversations", type=int, default=32, help="Concurrent conversations")
+    parser.add_argument("--turns", type=int, default=3, help="Questions per conversation")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions in flight per worker")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated model latency per call")
+    parser.add_argument("--routing", choices=("stateless", "sticky"), default="stateless",
+                        help="How conversation turns are assigned to workers")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_PATH, help="Question corpus JSON file")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    worker_counts = [int(count) for count in args.workers.split(",") if count.strip()]
+    runs = []
+    for workers in worker_counts:
+        print(f"Running with {workers} worker(s)...", file=sys.stderr)
+        runs.append(run_load(
+            workers,
+            corpus,
+            conversations=args.conversations,
+            turns=args.turns,
+            concurrency=args.concurrency,
+            llm_latency=args.llm_latency_ms / 1000,
+            routing=args.routing,
+            corpus_path=args.corpus
+        ))
+
+    baseline = runs[0]["throughput_qps"] if runs else 0.0
+    for run in runs:
+        run["speedup"] = round(run["throughput_qps"] / baseline, 2) if baseline else 0.0
+
+    report = {
+        "benchmark": "load",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "conversations": args.conversations,
+            "turns": args.turns,
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.llm_latency_ms,
+            "routing": args.routing,
+        },
+        "runs": runs,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 1 if any(run["failures"] or run["lost_history"] for run in runs) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Token counts of query results in every result encoding.
+
+Each query runs once; its rows are encoded as tsv, columns and the
+original tuple reprs, and the tokens of each encoding are reported along
+with how many rows fit the result budget of a small and a large model.
+
+Usage:
+    python -m benchmarks.result_encoding_bench --rows 50 --output encoding.json
+"""
+import argparse
+import json
+import platform
+from pathlib import Path
+
+from benchmarks.columnar_bench import QUERIES as AGGREGATE_QUERIES
+from src.services.sql_engine import DB_PATH, SQLEngine
+from src.utils.result_encoding import RESULT_FORMATS, encode_result, measure_formats, result_token_budget
+
+# Row-level queries with long floats and text, where the encoding matters most
+ROW_QUERIES = {
+    "geolocation_rows": """
+        SELECT geolocation_zip_code_prefix, geolocation_lat, geolocation_lng, geolocation_city, geolocation_state
+        FROM geolocation
+    """,
+    "recent_orders": """
+        SELECT o.order_id, o.order_status, o.order_purchase_timestamp, p.payment_type, p.payment_value
+        FROM orders o JOIN order_payments p ON p.order_id = o.order_id
+        ORDER BY o.order_purchase_timestamp DESC
+    """,
+    "review_comments": """
+        SELECT review_score, review_comment_title, review_comment_message FROM order_reviews
+        WHERE review_comment_message IS NOT NULL
+    """,
+}
+
+MODELS = ("ollama:llama3.1:8b", "anthropic:claude-sonnet-4-5")
+
+
+def run(db_path: Path, max_rows: int) -> dict:
+    engine = SQLEngine(db_path)
+    report = {"queries": {}, "totals": {fmt: 0 for fmt in RESULT_FORMATS}}
+    for name, query in {**AGGREGATE_QUERIES, **ROW_QUERIES}.items():
+        result = engine.execute(query, max_rows=max_rows, use_cache=False)
+        tokens = measure_formats(result.columns, result.rows)
+        for fmt, count in tokens.items():
+            report["totals"][fmt] += count
+        report["queries"][name] = {
+            "rows": len(result.rows),
+            "tokens": tokens,
+            "rows_shown": {
+                model: encode_result(result.columns, result.rows, result_token_budget(model))[1]
+                for model in MODELS
+            },
+        }
+    engine.shutdown()
+
+    baseline = report["totals"]["tuples"]
+    report["savings_vs_tuples"] = {
+        fmt: round(1 - count / baseline, 3) if baseline else None for fmt, count in report["totals"].items()
+    }
+    report["budgets"] = {model: result_token_budget(model) for model in MODELS}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token counts per query result encoding")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    report = run(args.db, args.rows)
+    report["environment"] = {"python": platform.python_version(), "platform": platform.platform()}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
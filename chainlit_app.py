@@ -1,17 +1,50 @@
 """
 Chainlit Application - Data Analyst Chat Interface
+
+Only what the handlers need is imported here; the agent (LangGraph, the
+prompts, Plotly) is loaded by the startup warm-up once the server is
+listening (see src/services/startup.py).
 """
 import os
 import tempfile
 import uuid
+from typing import Optional
 import chainlit as cl
-from src.services.data_analyst_agent import run_data_analyst
+from chainlit.config import config
+from chainlit.server import app as chainlit_server
+from src.services.startup import begin_warm_up, register_readiness_route, wait_until_ready
+from src.services.streaming_transcriber import STREAMING_TRANSCRIPTION, StreamingTranscriber
+from src.services.transcription_pool import TranscriptionQueueFull
 from src.services.voice_service import get_voice_service
+from src.utils.audio_utils import pcm16_to_float32, resample
+from src.utils.model_registry import get_model_registry
 from src.logger import setup_application_logger
 
 logger = setup_application_logger(__name__)
 
 
+# ===============================
+# Startup
+# ===============================
+
+register_readiness_route(chainlit_server)
+
+
+@cl.on_app_startup
+def on_app_startup():
+    """Warm up the agent in the background so the server starts listening right away."""
+    begin_warm_up()
+
+
+async def run_data_analyst(question: str, model_name: str, thread_id: str):
+    """Stream the agent's answer, waiting for the startup warm-up to load it first."""
+    await wait_until_ready()
+    from src.services.data_analyst_agent import run_data_analyst as run_agent
+
+    async for chunk in run_agent(question=question, model_name=model_name, thread_id=thread_id):
+        yield chunk
+
+
 # ===============================
 # Chat Settings
 # ===============================
@@ -21,6 +54,8 @@ async def on_chat_start():
     """Initialize chat session with settings."""
     try:
         logger.info("Starting chat session")
+        # No-op once on_app_startup (or the asgi.py lifespan) has started it
+        begin_warm_up()
 
         # Create settings for model selection
         settings = await cl.ChatSettings([
@@ -55,6 +90,7 @@ async def on_chat_start():
         # Store in session
         cl.user_session.set("model_name", full_model_name)
         cl.user_session.set("thread_id", thread_id)
+        get_model_registry().retain(full_model_name)
 
         # Welcome message
         welcome_message = f"""# Welcome to the Olist Data Analyst! 📊
@@ -97,8 +133,16 @@ async def on_settings_update(settings):
         provider = settings.get("model_provider", "ollama")
         model = settings.get("custom_model") or settings.get("model_name", "llama3.1:8b")
         full_model_name = f"{provider}:{model}"
+        previous_model_name = cl.user_session.get("model_name")
         cl.user_session.set("model_name", full_model_name)
         
+        # Drop cached clients for the old model once no session uses it
+        if previous_model_name != full_model_name:
+            registry = get_model_registry()
+            registry.retain(full_model_name)
+            if previous_model_name:
+                registry.release(previous_model_name)
+        
         await cl.Message(content=f"✅ Model updated to: `{full_model_name}`").send()
         logger.info(f"Model updated to: {full_model_name}")
         
@@ -107,6 +151,18 @@ async def on_settings_update(settings):
         raise
 
 
+@cl.on_chat_end
+async def on_chat_end():
+    """Release the session's model from the registry."""
+    model_name = cl.user_session.get("model_name")
+    if model_name:
+        get_model_registry().release(model_name)
+    streamer = cl.user_session.get("audio_streamer")
+    if streamer is not None:
+        streamer.cancel()
+    logger.info("Chat session ended")
+
+
 # ===============================
 # Message Handler
 # ===============================
@@ -150,21 +206,62 @@ async def on_message(message: cl.Message):
 async def on_audio_start():
     """Initialize audio buffer when recording starts."""
     cl.user_session.set("audio_buffer", bytearray())
+    cl.user_session.set("audio_streamer", None)
     logger.info("Audio recording session started")
     return True
 
 
 @cl.on_audio_chunk
 async def on_audio_chunk(chunk: cl.InputAudioChunk):
-    """Handle incoming audio chunks and append to buffer."""
+    """Handle incoming audio chunks: buffer them and feed the streaming transcriber."""
+    if chunk.isStart:
+        cl.user_session.set("audio_mime_type", chunk.mimeType)
+        logger.info(f"First audio chunk received, mime type: {chunk.mimeType}")
+        if chunk.mimeType == "pcm16" and STREAMING_TRANSCRIPTION:
+            cl.user_session.set("audio_streamer", StreamingTranscriber(sample_rate=config.features.audio.sample_rate))
+
     buffer = cl.user_session.get("audio_buffer")
     if buffer is not None:
         buffer.extend(chunk.data)
         cl.user_session.set("audio_buffer", buffer)
+
+    streamer = cl.user_session.get("audio_streamer")
+    if streamer is not None:
+        streamer.feed(chunk.data)
+
+
+async def transcribe_recording(audio_buffer: bytearray, mime_type: str) -> Optional[str]:
+    """
+    Transcribe a complete recording in one pass.
+
+    PCM16 is converted and resampled in memory and handed to Whisper as an
+    array; only compressed formats go through a temp file and ffmpeg.
+
+    Raises:
+        TranscriptionQueueFull: If too many transcriptions are already pending
+    """
+    voice_service = get_voice_service(model_size="base")
+    if mime_type == "pcm16":
+        audio = resample(pcm16_to_float32(audio_buffer), config.features.audio.sample_rate)
+        return await voice_service.transcribe(audio)
+
+    # Save compressed audio to temp file
+    ext_map = {"webm": ".webm", "wav": ".wav", "mp3": ".mp3"}
+    ext = next((v for k, v in ext_map.items() if k in mime_type), ".webm")
     
-    if chunk.isStart:
-        cl.user_session.set("audio_mime_type", chunk.mimeType)
-        logger.info(f"First audio chunk received, mime type: {chunk.mimeType}")
+    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as f:
+        f.write(audio_buffer)
+        audio_path = f.name
+    
+    logger.info(f"Saved audio to: {audio_path}")
+    
+    try:
+        return await voice_service.transcribe(audio_path)
+    finally:
+        # Cleanup temp file
+        if os.path.exists(audio_path):
+            os.unlink(audio_path)
+            logger.info(f"Cleaned up temp audio file: {audio_path}")
 
 
 @cl.on_audio_end
@@ -174,83 +271,66 @@ async def on_audio_end():
         # Get the audio buffer
         audio_buffer = cl.user_session.get("audio_buffer")
         mime_type = cl.user_session.get("audio_mime_type", "audio/webm")
+        streamer = cl.user_session.get("audio_streamer")
+        cl.user_session.set("audio_buffer", None)
+        cl.user_session.set("audio_streamer", None)
         
         if not audio_buffer or len(audio_buffer) == 0:
+            if streamer is not None:
+                streamer.cancel()
             await cl.Message(content="❌ No audio received. Please try again.").send()
             return
         
         logger.info(f"Audio recording complete. Size: {len(audio_buffer)} bytes, Type: {mime_type}")
         
-        # Save audio to temp file
-        if mime_type == "pcm16":
-            # For pcm16, wrap in WAV header
-            import wave
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-                audio_path = f.name
-                with wave.open(f.name, 'wb') as wav_file:
-                    wav_file.setnchannels(1)
-                    wav_file.setsampwidth(2)
-                    wav_file.setframerate(24000)
-                    wav_file.writeframes(audio_buffer)
-        else:
-            # Determine file extension from mime type
-            ext_map = {"webm": ".webm", "wav": ".wav", "mp3": ".mp3"}
-            ext = next((v for k, v in ext_map.items() if k in mime_type), ".webm")
-            
-            with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as f:
-                f.write(audio_buffer)
-                audio_path = f.name
-        
-        logger.info(f"Saved audio to: {audio_path}")
-        
         # Show transcribing message
         transcribing_msg = cl.Message(content="🎤 Transcribing your audio...")
         await transcribing_msg.send()
         
+        transcription = None
         try:
-            # Get voice service and transcribe
-            voice_service = get_voice_service(model_size="base")
-            transcription = await voice_service.transcribe(audio_path)
+            if streamer is not None:
+                # Segments closed while recording are already transcribed; only the tail is left
+                try:
+                    transcription = await streamer.finish()
+                except Exception as e:
+                    logger.warning(f"Streaming transcription failed, transcribing the full recording: {str(e)}")
+            if transcription is None:
+                transcription = await transcribe_recording(audio_buffer, mime_type)
+        except TranscriptionQueueFull:
+            await transcribing_msg.remove()
+            await cl.Message(content="⏳ Too many voice messages are being transcribed right now. Please try again in a moment.").send()
+            return
+        
+        if transcription and transcription.strip():
+            # Update message to show transcription
+            await transcribing_msg.remove()
+            await cl.Message(content=f"📝 **You said:** {transcription}").send()
             
-            if transcription and transcription.strip():
-                # Update message to show transcription
-                await transcribing_msg.remove()
-                await cl.Message(content=f"📝 **You said:** {transcription}").send()
-                
-                # Process transcription through data analyst
-                model_name = cl.user_session.get("model_name", "ollama:llama3.1:8b")
-                thread_id = cl.user_session.get("thread_id", "default")
-                
-                logger.info(f"Processing voice query: {transcription[:100]}...")
-                
-                # Create response message for streaming
-                response_message = cl.Message(content="")
-                await response_message.send()
-
-                async for chunk in run_data_analyst(
-                    question=transcription,
-                    model_name=model_name,
-                    thread_id=thread_id
-                ):
-                    if chunk:
-                        await response_message.stream_token(chunk)
-
-                await response_message.update()
-                    
-            else:
-                await transcribing_msg.remove()
-                await cl.Message(content="❌ Could not transcribe audio. Please speak clearly and try again.").send()
+            # Process transcription through data analyst
+            model_name = cl.user_session.get("model_name", "ollama:llama3.1:8b")
+            thread_id = cl.user_session.get("thread_id", "default")
+            
+            logger.info(f"Processing voice query: {transcription[:100]}...")
+            
+            # Create response message for streaming
+            response_message = cl.Message(content="")
+            await response_message.send()
+
+            async for chunk in run_data_analyst(
+                question=transcription,
+                model_name=model_name,
+                thread_id=thread_id
+            ):
+                if chunk:
+                    await response_message.stream_token(chunk)
+
+            await response_message.update()
                 
-        finally:
-            # Cleanup temp file
-            if os.path.exists(audio_path):
-                os.unlink(audio_path)
-                logger.info(f"Cleaned up temp audio file: {audio_path}")
-        
-        # Clear audio buffer
-        cl.user_session.set("audio_buffer", None)
+        else:
+            await transcribing_msg.remove()
+            await cl.Message(content="❌ Could not transcribe audio. Please speak clearly and try again.").send()
         
     except Exception as e:
         logger.error(f"Voice processing failed: {str(e)}")
         await cl.Message(content=f"❌ Voice processing error: {str(e)}").send()
-
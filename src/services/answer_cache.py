@@ -0,0 +1,233 @@
+"""
+Whole-turn answer cache for repeated questions.
+
+Dashboard-style questions come back in slightly different words ("Top 10
+cities by number of orders?" / "show me the top 10 cities by orders number").
+A finished answer (streamed text, charts and the messages the turn added
+to the conversation) is cached and replayed for any later question that is
+equivalent under a normalized-token similarity index:
+
+- slot values (years, numbers, state codes, see sql_templates) must be equal,
+- words that flip the meaning (top/bottom, highest/lowest, not, ...) must be equal,
+- dimension and entity words (city, state, seller, category, month, ...) must be equal,
+- the Jaccard similarity of the remaining stemmed words must reach THRESHOLD.
+
+Entries are bucketed by model name and the database fingerprint, expire
+after a TTL and are evicted least recently used beyond MAX_ENTRIES.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Hashable, Optional
+from src.services.sql_templates import normalize_question
+from src.utils.query_cache import CacheStats, database_fingerprint
+from src.utils.schema_retriever import tokenize_text
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# ===============================
+# Cache Configuration
+# ===============================
+
+# Set to 0 to always answer from scratch
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE", "1") != "0"
+
+MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "256"))
+
+# Answers older than this are not replayed (seconds)
+ANSWER_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "900"))
+
+# Minimum Jaccard similarity of the content words
+THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.8"))
+
+# Function words ignored when comparing questions
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "give",
+    "how", "i", "in", "is", "it", "me", "of", "on", "or", "our", "per", "please", "show", "tell",
+    "that", "the", "there", "to", "us", "want", "we", "what", "which", "with", "you",
+    "database", "data", "olist",
+})
+
+# Words that change the answer; two questions only match if they use the same ones
+POLARITY_WORDS = frozenset({
+    "top", "bottom", "highest", "lowest", "most", "least", "best", "worst", "max", "min",
+    "maximum", "minimum", "first", "last", "largest", "smallest", "biggest", "not", "no",
+    "without", "except", "exclude", "excluding", "ascending", "descending", "increase",
+    "decrease", "average", "mean", "median", "total", "sum", "count", "percentage", "share",
+})
+
+# Dimensions and entities a question groups or filters by (stemmed); "by city" and
+# "by state" ask for different answers however similar the rest of the question is
+DIMENSION_WORDS = frozenset({
+    "city", "state", "zip", "region", "location", "geolocation", "customer", "seller", "product",
+    "category", "order", "item", "status", "payment", "installment", "review", "score", "rating",
+    "freight", "delivery", "lead", "day", "daily", "week", "weekly", "month", "monthly", "quarter",
+    "quarterly", "year", "yearly", "annual",
+})
+
+_SLOT_MARKER = re.compile(r"\{\w+\}")
+
+
+@dataclass(frozen=True)
+class QuestionSignature:
+    """What two questions must share (key) and what they are compared on (words)."""
+    key: tuple
+    words: frozenset
+
+
+@dataclass
+class CachedAnswer:
+    """A cached turn and what it is indexed by."""
+    question: str
+    signature: QuestionSignature
+    value: Any
+    stored_at: float = field(default_factory=time.monotonic)
+
+
+def question_signature(question: str) -> QuestionSignature:
+    """Split a question into its exact-match key (slot values, polarity and dimension words) and content words."""
+    normalized = normalize_question(question)
+    words = {
+        word for word in tokenize_text(_SLOT_MARKER.sub(" ", normalized.pattern))
+        if word not in STOPWORDS
+    }
+    polarity = frozenset(words & POLARITY_WORDS)
+    dimensions = frozenset(words & DIMENSION_WORDS)
+    slots = tuple(sorted(normalized.params.items()))
+    return QuestionSignature(key=(slots, polarity, dimensions), words=frozenset(words - polarity - dimensions))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of agent answers looked up by question similarity.
+
+    Candidates come from an inverted index (bucket, exact key, word) -> entry
+    keys, so a lookup only scores entries sharing at least one content word.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_entries: int = MAX_ENTRIES,
+        ttl: float = ANSWER_TTL,
+        threshold: float = THRESHOLD
+    ):
+        """
+        Args:
+            db_path: Database file whose fingerprint is part of every key
+            max_entries: Maximum number of cached answers
+            ttl: Seconds an answer can be replayed
+            threshold: Minimum content-word similarity for a match
+        """
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, CachedAnswer] = OrderedDict()
+        self._index: defaultdict[Hashable, set] = defaultdict(set)
+        self._stats = CacheStats()
+
+    def _bucket(self, model_name: str) -> tuple:
+        return (model_name, database_fingerprint(self.db_path))
+
+    def _index_keys(self, bucket: tuple, entry: CachedAnswer) -> list[Hashable]:
+        words = entry.signature.words or {""}
+        return [(bucket, entry.signature.key, word) for word in words]
+
+    def _remove(self, entry_key: Hashable, entry: CachedAnswer):
+        """Drop an entry and its index postings. Caller holds the lock."""
+        self._entries.pop(entry_key, None)
+        for index_key in self._index_keys(entry_key[0], entry):
+            postings = self._index.get(index_key)
+            if postings is not None:
+                postings.discard(entry_key)
+                if not postings:
+                    del self._index[index_key]
+
+    def get(self, question: str, model_name: str) -> Optional[CachedAnswer]:
+        """Return the most similar cached answer above the threshold, or None."""
+        signature = question_signature(question)
+        bucket = self._bucket(model_name)
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for word in signature.words or {""}:
+                candidates |= self._index.get((bucket, signature.key, word), set())
+
+            best_key, best_score = None, 0.0
+            for entry_key in candidates:
+                entry = self._entries[entry_key]
+                if now - entry.stored_at > self.ttl:
+                    self._remove(entry_key, entry)
+                    self._stats.expirations += 1
+                    continue
+                score = jaccard(signature.words, entry.signature.words)
+                if score > best_score:
+                    best_key, best_score = entry_key, score
+
+            if best_key is None or best_score < self.threshold:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._stats.hits += 1
+            entry = self._entries[best_key]
+        logger.info(f"Answer cache hit ({best_score:.2f}): '{question[:60]}' ~ '{entry.question[:60]}'")
+        return entry
+
+    def put(self, question: str, model_name: str, value: Any):
+        """Cache the answer to a question, evicting the least recently used beyond the cap."""
+        signature = question_signature(question)
+        bucket = self._bucket(model_name)
+        entry_key = (bucket, signature.key, signature.words)
+        entry = CachedAnswer(question=question, signature=signature, value=value)
+        with self._lock:
+            previous = self._entries.get(entry_key)
+            if previous is not None:
+                self._remove(entry_key, previous)
+            self._entries[entry_key] = entry
+            for index_key in self._index_keys(bucket, entry):
+                self._index[index_key].add(entry_key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, evicted = next(iter(self._entries.items()))
+                self._remove(evicted_key, evicted)
+                self._stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._stats.invalidations += 1
+
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            snapshot = CacheStats(**vars(self._stats))
+            snapshot.entries = len(self._entries)
+            return snapshot
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache(db_path: Path) -> AnswerCache:
+    """Get or create the answer cache for this process."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache(db_path)
+    return _cache
@@ -0,0 +1,384 @@
+"""
+Server-side chart building for the Data Analyst Agent.
+
+Charts are built from full query results with NumPy: optional per-x
+aggregation, LTTB (lines) or min-max (scatter) downsampling to a point
+budget, top-N folding for bar/pie categories, and WebGL traces for large
+scatter series. Static PNG/SVG renders go through kaleido and are cached per
+chart.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Sequence
+import numpy as np
+from src.services.chart_store import get_chart_store
+from src.logger import setup_application_logger
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+logger = setup_application_logger(__name__)
+
+# Points drawn per line/scatter trace after downsampling
+DEFAULT_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "2000"))
+
+# Scatter traces with more points than this use WebGL (scattergl)
+SCATTERGL_THRESHOLD = int(os.environ.get("CHART_SCATTERGL_THRESHOLD", "1000"))
+
+# Bars / pie slices shown before the rest is folded into "Other"
+MAX_CATEGORIES = int(os.environ.get("CHART_MAX_CATEGORIES", "50"))
+
+# Rows loaded from a result handle
+CHART_MAX_ROWS = int(os.environ.get("CHART_MAX_ROWS", "500000"))
+
+# Cached static renders
+STATIC_CACHE_SIZE = 64
+
+PRIMARY_COLOR = "#2E86AB"
+
+AGGREGATIONS = ("sum", "mean", "count", "min", "max")
+CHART_TYPES = ("bar", "line", "scatter", "pie")
+
+
+@dataclass
+class ChartSeries:
+    """Numeric-ready x/y arrays and how they were reduced."""
+    x: np.ndarray
+    y: np.ndarray
+    x_kind: str
+    source_points: int
+    method: str = "none"
+
+
+# ================================================================================
+# Array Conversion
+# ================================================================================
+
+def to_numeric(values: Sequence) -> np.ndarray:
+    """Convert values to float64 (None becomes NaN). Raises ValueError for text."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("column is not numeric")
+
+
+def to_axis(values: Sequence) -> tuple[np.ndarray, str]:
+    """
+    Convert x values to an array and classify them.
+
+    Returns:
+        (array, kind) where kind is "numeric", "datetime" or "category"
+    """
+    try:
+        return to_numeric(values), "numeric"
+    except ValueError:
+        pass
+    try:
+        return np.asarray(values, dtype="datetime64[s]"), "datetime"
+    except (TypeError, ValueError):
+        pass
+    return np.asarray(["" if v is None else str(v) for v in values], dtype=object), "category"
+
+
+def _sortable(x: np.ndarray, kind: str) -> np.ndarray:
+    """Numeric view of the x axis for ordering and downsampling."""
+    if kind == "datetime":
+        return x.astype("int64").astype(np.float64)
+    return x
+
+
+# ================================================================================
+# Reduction
+# ================================================================================
+
+def aggregate_by_x(x: np.ndarray, y: np.ndarray, how: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Group y by distinct x values with a single vectorized pass.
+
+    Args:
+        x: x values (any sortable dtype)
+        y: float y values (NaN ignored)
+        how: sum, mean, count, min or max
+
+    Returns:
+        (unique x sorted, aggregated y)
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{how}'. Use one of: {', '.join(AGGREGATIONS)}")
+    keys, inverse = np.unique(x, return_inverse=True)
+    valid = ~np.isnan(y)
+    counts = np.bincount(inverse, weights=valid, minlength=len(keys))
+    if how == "count":
+        return keys, counts
+    if how in ("sum", "mean"):
+        sums = np.bincount(inverse, weights=np.where(valid, y, 0.0), minlength=len(keys))
+        if how == "sum":
+            return keys, sums
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return keys, sums / counts
+    result = np.full(len(keys), np.nan)
+    ufunc = np.fmin if how == "min" else np.fmax
+    ufunc.at(result, inverse, y)
+    return keys, result
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling for line charts.
+
+    Keeps the visual shape of a series by picking, per bucket, the point that
+    forms the largest triangle with the previous pick and the next bucket's
+    average.
+
+    Args:
+        x: Sorted numeric x values
+        y: y values
+        threshold: Number of points to keep
+
+    Returns:
+        Indices of the kept points
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs(
+            (x[previous] - avg_x) * (bucket_y - y[previous])
+            - (x[previous] - bucket_x) * (avg_y - y[previous])
+        )
+        previous = start + int(np.nanargmax(areas)) if np.isfinite(areas).any() else start
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_downsample(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Keep the minimum and maximum of each bucket (for scatter plots, where
+    outliers matter more than the average shape).
+
+    Returns:
+        Sorted indices of the kept points
+    """
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    buckets = max(threshold // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    filled = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        segment = filled[start:end]
+        keep.append(start + int(segment.argmin()))
+        keep.append(start + int(segment.argmax()))
+    return np.unique(np.asarray(keep, dtype=np.int64))
+
+
+def fold_categories(x: np.ndarray, y: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+    """Keep the largest `limit - 1` categories and sum the rest into "Other"."""
+    if len(x) <= limit:
+        return x, y
+    order = np.argsort(np.nan_to_num(y, nan=-np.inf))[::-1]
+    top, rest = order[:limit - 1], order[limit - 1:]
+    labels = np.append(np.asarray(x, dtype=object)[top], "Other")
+    values = np.append(y[top], np.nansum(y[rest]))
+    return labels, values
+
+
+def prepare_series(
+    x_values: Sequence,
+    y_values: Sequence,
+    chart_type: str,
+    aggregate: str = "",
+    max_points: int = DEFAULT_MAX_POINTS,
+    max_categories: int = MAX_CATEGORIES
+) -> ChartSeries:
+    """
+    Convert raw values to arrays and reduce them to the point budget.
+
+    Args:
+        x_values: x-axis values (or pie labels)
+        y_values: y-axis values (or pie values)
+        chart_type: bar, line, scatter or pie
+        aggregate: Optional per-x aggregation (sum, mean, count, min, max)
+        max_points: Point budget for line and scatter charts
+        max_categories: Category budget for bar and pie charts
+
+    Returns:
+        The reduced series
+    """
+    if len(x_values) != len(y_values):
+        raise ValueError(f"x has {len(x_values)} values but y has {len(y_values)}")
+    x, kind = to_axis(x_values)
+    y = np.ones(len(x)) if aggregate == "count" else to_numeric(y_values)
+    source_points = len(x)
+    methods = []
+
+    if aggregate:
+        x, y = aggregate_by_x(x, y, aggregate)
+        methods.append(aggregate)
+    elif chart_type in ("line", "scatter") and kind != "category" and len(x) > 1:
+        order = np.argsort(_sortable(x, kind), kind="stable")
+        x, y = x[order], y[order]
+
+    if chart_type in ("bar", "pie") and len(x) > max_categories and (kind == "category" or chart_type == "pie"):
+        x, y = fold_categories(x, y, max_categories)
+        methods.append(f"top {max_categories - 1} + other")
+    elif chart_type == "line" and len(x) > max_points:
+        keep = lttb(_sortable(x, kind) if kind != "category" else np.arange(len(x), dtype=np.float64), y, max_points)
+        x, y = x[keep], y[keep]
+        methods.append("lttb")
+    elif chart_type in ("scatter", "bar") and len(x) > max_points:
+        keep = minmax_downsample(y, max_points)
+        x, y = x[keep], y[keep]
+        methods.append("min-max")
+
+    return ChartSeries(x=x, y=y, x_kind=kind, source_points=source_points, method="+".join(methods) or "none")
+
+
+# ================================================================================
+# Figures
+# ================================================================================
+
+def apply_layout(fig: "go.Figure", title: str, x_label: str, y_label: str) -> "go.Figure":
+    """Apply the standard chart layout."""
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=18)),
+        xaxis_title=x_label,
+        yaxis_title=y_label,
+        template="plotly_white",
+        margin=dict(l=60, r=40, t=80, b=60)
+    )
+    return fig
+
+
+def build_figure(
+    chart_type: str,
+    series: ChartSeries,
+    title: str,
+    x_label: str = "X",
+    y_label: str = "Y"
+) -> "go.Figure":
+    """Build a Plotly figure from a prepared series."""
+    # Imported on first use: plotly adds noticeably to startup
+    import plotly.graph_objects as go
+
+    chart_type = chart_type.lower()
+    x = series.x.tolist() if series.x_kind != "datetime" else series.x.astype(str).tolist()
+    y = series.y
+
+    if chart_type == "line":
+        mode = "lines+markers" if len(y) <= 200 else "lines"
+        trace = go.Scatter(x=x, y=y, mode=mode, line=dict(color=PRIMARY_COLOR, width=2))
+    elif chart_type == "scatter":
+        trace_type = go.Scattergl if len(y) > SCATTERGL_THRESHOLD else go.Scatter
+        size = 10 if len(y) <= 200 else 4
+        trace = trace_type(x=x, y=y, mode="markers", marker=dict(color=PRIMARY_COLOR, size=size))
+    elif chart_type == "pie":
+        trace = go.Pie(labels=x, values=y)
+    else:
+        trace = go.Bar(x=x, y=y, marker_color=PRIMARY_COLOR)
+
+    return apply_layout(go.Figure(data=[trace]), title, x_label, y_label)
+
+
+def describe_chart(chart_type: str, series: ChartSeries, title: str, x_label: str, y_label: str) -> str:
+    """One-line summary of a chart for the model (no data points)."""
+    summary = f"{chart_type.lower()} chart \"{title}\" with {len(series.y)} points (x: {x_label}, y: {y_label})"
+    if series.method != "none":
+        summary += f", reduced from {series.source_points} rows by {series.method}"
+    finite = series.y[np.isfinite(series.y)] if len(series.y) else series.y
+    if len(finite):
+        summary += f", y range {finite.min():.6g} to {finite.max():.6g}"
+    return summary + " is displayed to the user."
+
+
+def create_chart(
+    chart_type: str,
+    x_values: Sequence,
+    y_values: Sequence,
+    title: str,
+    x_label: str = "X",
+    y_label: str = "Y",
+    aggregate: str = "",
+    max_points: int = DEFAULT_MAX_POINTS
+) -> tuple[str, str]:
+    """
+    Build a chart, store it in the chart store and describe it.
+
+    Returns:
+        (chart handle, summary for the model)
+    """
+    chart_type = chart_type.lower() if chart_type.lower() in CHART_TYPES else "bar"
+    aggregate = aggregate.lower().strip()
+    series = prepare_series(x_values, y_values, chart_type, aggregate=aggregate, max_points=max_points)
+    fig = build_figure(chart_type, series, title, x_label, y_label)
+    summary = describe_chart(chart_type, series, title, x_label, y_label)
+    handle = get_chart_store().put(fig, summary)
+    logger.info(
+        f"Chart {handle}: {chart_type}, {series.source_points} rows -> {len(series.y)} points ({series.method})"
+    )
+    return handle, summary
+
+
+def column_values(columns: Sequence[str], rows: Sequence[tuple], name: str) -> list:
+    """Extract one column from result rows, matching the name case-insensitively."""
+    lookup = {column.lower(): index for index, column in enumerate(columns)}
+    index = lookup.get(name.strip().lower())
+    if index is None:
+        raise ValueError(f"Column '{name}' not in result. Available columns: {', '.join(columns)}")
+    return [row[index] for row in rows]
+
+
+# ================================================================================
+# Static Rendering
+# ================================================================================
+
+_static_cache: OrderedDict[tuple, bytes] = OrderedDict()
+_static_lock = threading.Lock()
+
+
+def render_static(handle: str, fmt: str = "png", width: int = 900, height: int = 500) -> bytes:
+    """
+    Render a stored chart to PNG or SVG with kaleido, caching the bytes.
+
+    Raises:
+        KeyError: If the chart handle is unknown or expired
+        RuntimeError: If kaleido is not available
+    """
+    key = (handle, fmt, width, height)
+    with _static_lock:
+        cached = _static_cache.get(key)
+        if cached is not None:
+            _static_cache.move_to_end(key)
+            return cached
+
+    chart = get_chart_store().get(handle)
+    if chart is None:
+        raise KeyError(f"Chart {handle} is not available")
+    try:
+        image = chart.figure.to_image(format=fmt, width=width, height=height)
+    except (ImportError, ValueError) as e:
+        raise RuntimeError(f"Static chart rendering unavailable: {str(e)}") from e
+
+    with _static_lock:
+        _static_cache[key] = image
+        while len(_static_cache) > STATIC_CACHE_SIZE:
+            _static_cache.popitem(last=False)
+    return image
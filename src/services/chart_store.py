@@ -0,0 +1,106 @@
+"""
+Out-of-band store for chart figures.
+
+draw_chart_tool keeps the Plotly figure here and returns only a short handle
+plus a one-line summary, so the figure JSON never enters the message history
+(and is never resent to the model). The UI resolves the handle to the figure
+and serializes it once when displaying it.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# Marker the UI layer looks for in draw_chart_tool output
+CHART_MARKER = "CHART_CREATED::"
+
+MAX_CHARTS = int(os.environ.get("CHART_STORE_MAX_CHARTS", "256"))
+CHART_TTL = float(os.environ.get("CHART_STORE_TTL", "3600"))
+
+_HANDLE_PATTERN = re.compile(re.escape(CHART_MARKER) + r"(chart_[0-9a-f]+)")
+
+
+@dataclass
+class ChartArtifact:
+    """A stored figure and the summary the model saw."""
+    handle: str
+    figure: Any
+    summary: str
+    created: float = field(default_factory=time.monotonic)
+
+
+def format_chart_marker(handle: str, summary: str) -> str:
+    """Tool output for a created chart: marker, handle and a compact summary."""
+    return f"{CHART_MARKER}{handle}\n{summary}"
+
+
+def parse_chart_handle(tool_output: Any) -> Optional[str]:
+    """Extract the chart handle from draw_chart_tool output, if any."""
+    match = _HANDLE_PATTERN.search(str(tool_output))
+    return match.group(1) if match else None
+
+
+class ChartStore:
+    """Bounded LRU of chart figures keyed by handle, with a TTL."""
+
+    def __init__(self, max_charts: int = MAX_CHARTS, ttl: float = CHART_TTL):
+        """
+        Args:
+            max_charts: Maximum figures kept
+            ttl: Seconds a figure stays resolvable
+        """
+        self.max_charts = max_charts
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._charts: OrderedDict[str, ChartArtifact] = OrderedDict()
+
+    def put(self, figure: Any, summary: str) -> str:
+        """Store a figure and return its handle."""
+        handle = f"chart_{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self._charts[handle] = ChartArtifact(handle=handle, figure=figure, summary=summary)
+            while len(self._charts) > self.max_charts:
+                evicted, _ = self._charts.popitem(last=False)
+                logger.debug(f"Evicted chart {evicted} from store")
+        return handle
+
+    def get(self, handle: str) -> Optional[ChartArtifact]:
+        """Return the stored chart, or None if unknown or expired."""
+        with self._lock:
+            artifact = self._charts.get(handle)
+            if artifact is None:
+                return None
+            if time.monotonic() - artifact.created > self.ttl:
+                del self._charts[handle]
+                return None
+            self._charts.move_to_end(handle)
+            return artifact
+
+    def resolve(self, tool_output: Any) -> Optional[ChartArtifact]:
+        """Resolve draw_chart_tool output to its stored chart."""
+        handle = parse_chart_handle(tool_output)
+        return self.get(handle) if handle else None
+
+    def __len__(self) -> int:
+        return len(self._charts)
+
+
+_store: Optional[ChartStore] = None
+_store_lock = threading.Lock()
+
+
+def get_chart_store() -> ChartStore:
+    """Get or create the chart store singleton."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChartStore()
+    return _store
@@ -0,0 +1,1308 @@
+"""
+Columnar mirror of olist.sqlite for aggregate queries.
+
+The tables of data/olist.sqlite are copied once into NumPy arrays under
+data/columnar (integers and reals as int64/float64 plus a validity mask,
+strings dictionary-encoded as int32 codes into a sorted dictionary) and
+memory-mapped at startup. Aggregate queries in the sql_parser subset (joins
+on one column equality, conjunctive WHERE, GROUP BY, ORDER BY, LIMIT) are
+answered with vectorized group-by kernels; anything else falls back to
+SQLite.
+
+Results are identical to SQLite or the query falls back:
+
+- SUM/AVG/TOTAL over REAL columns depend on SQLite's summation order, so
+  they are only served under ROUND() when the exact sum is provably more
+  than the worst-case summation error away from a rounding tie.
+- SQLite orders rows with equal ORDER BY keys by its query plan, so a
+  result whose kept rows tie on the ORDER BY keys falls back, as does a
+  multi-column GROUP BY without ORDER BY over indexed columns.
+- Scalar functions (strftime, date, upper, ...) of one column are evaluated
+  by SQLite itself, once per distinct value of that column.
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cmp_to_key
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from src.services.sql_engine import DB_PATH, DEFAULT_COUNT_LIMIT, QueryResult
+from src.utils.query_cache import database_fingerprint
+from src.utils.result_stats import ResultSummarizer
+from src.utils.sql_parser import (
+    BinOp, Column, Expr, Func, Literal, Predicate, SQLParseError, SelectQuery, Star,
+    columns_in, contains_aggregate, parse_select, render_expr,
+)
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# ===============================
+# Columnar Configuration
+# ===============================
+
+# Set to 1 to answer eligible aggregate queries from the columnar mirror
+COLUMNAR_ENGINE_ENABLED = os.environ.get("COLUMNAR_ENGINE", "0") == "1"
+
+COLUMNAR_DIR = Path(os.environ.get("COLUMNAR_DIR", DB_PATH.with_name("columnar")))
+
+# Rebuild a stale mirror in the background when the source database changes
+COLUMNAR_AUTO_REFRESH = os.environ.get("COLUMNAR_AUTO_REFRESH", "1") == "1"
+
+# Seconds a superseded build is kept for processes still reading it
+COLUMNAR_BUILD_GRACE = float(os.environ.get("COLUMNAR_BUILD_GRACE", "3600"))
+
+# Bumped whenever the on-disk layout changes, so old mirrors are rebuilt
+FORMAT_VERSION = 1
+
+# Deterministic scalar functions that may be evaluated per distinct column value
+SCALAR_FUNCTIONS = frozenset({
+    "strftime", "date", "time", "datetime", "julianday", "unixepoch", "upper", "lower",
+    "substr", "substring", "trim", "ltrim", "rtrim", "length", "replace", "instr",
+    "abs", "round", "coalesce", "ifnull", "nullif",
+})
+
+# Unit roundoff of IEEE doubles
+_EPS = 2.0 ** -53
+
+# Largest magnitude for which every integer is an exact double
+_EXACT_INT = 2.0 ** 52
+
+
+class ColumnarUnsupported(Exception):
+    """Raised when a query cannot be answered from the mirror with SQLite-identical results."""
+
+
+# ================================================================================
+# Build
+# ================================================================================
+
+def _affinity(declared_type: str) -> str:
+    """Column affinity of a declared type, per the SQLite rules."""
+    declared = (declared_type or "").upper()
+    if "INT" in declared:
+        return "integer"
+    if any(word in declared for word in ("CHAR", "CLOB", "TEXT")):
+        return "text"
+    if "BLOB" in declared or not declared:
+        return "blob"
+    if any(word in declared for word in ("REAL", "FLOA", "DOUB")):
+        return "real"
+    return "numeric"
+
+
+def _column_arrays(values: list, affinity: str) -> Optional[tuple[str, dict[str, np.ndarray]]]:
+    """Encode one column, or return None if it cannot be mirrored exactly."""
+    types = {type(value) for value in values if value is not None}
+    valid = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+
+    if types <= {int} or types == {float}:
+        kind = "float" if types == {float} else "int"
+        dtype = np.float64 if kind == "float" else np.int64
+        data = np.fromiter((0 if value is None else value for value in values), dtype=dtype, count=len(values))
+        arrays = {"values": data}
+        if not valid.all():
+            arrays["valid"] = valid
+        return kind, arrays
+
+    if types == {str} and affinity in ("text", "blob"):
+        strings = [value for value in values if value is not None]
+        if any(value.endswith("\x00") for value in strings):
+            return None
+        dictionary, inverse = np.unique(np.array(strings, dtype=str), return_inverse=True)
+        codes = np.full(len(values), -1, dtype=np.int32)
+        codes[valid] = inverse
+        return "text", {"codes": codes, "dictionary": dictionary}
+
+    return None
+
+
+@contextmanager
+def _build_lock(root: Path):
+    """Hold an exclusive lock on root/build.lock, so one process builds at a time."""
+    with open(root / "build.lock", "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _published_build(root: Path) -> Optional[str]:
+    try:
+        return json.loads((root / "current.json").read_text())["build"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _remove_old_builds(root: Path, current: str, grace: float = COLUMNAR_BUILD_GRACE):
+    """
+    Delete builds superseded (or abandoned) more than grace seconds ago.
+
+    Columns are memory-mapped lazily, so a process that loaded a build
+    before it was superseded may still open its files for a while.
+    """
+    cutoff = time.time() - grace
+    for old in root.glob("build-*"):
+        if old.name == current:
+            continue
+        marker = old / "superseded"
+        try:
+            changed = (marker if marker.exists() else old).stat().st_mtime
+        except OSError:
+            continue
+        if changed < cutoff:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def build_columnar_mirror(source_path: Path = DB_PATH, root: Path = COLUMNAR_DIR, force: bool = False) -> Path:
+    """
+    Copy every table of the source database into a new columnar build.
+
+    The build is written to its own directory and published by replacing
+    current.json, so running processes keep reading the previous build;
+    superseded builds are deleted after COLUMNAR_BUILD_GRACE seconds.
+    Builds are serialized across processes by a lock file, and a process
+    that waited for another's build of the same database reuses it.
+
+    Args:
+        source_path: Database to mirror
+        root: Directory holding the builds
+        force: Build even if the published build matches the database
+
+    Returns:
+        The directory of the new (or reused) build
+    """
+    source_path = Path(source_path)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    with _build_lock(root):
+        fingerprint = database_fingerprint(source_path)
+        previous = _published_build(root)
+        if previous is not None and not force:
+            try:
+                meta = json.loads((root / previous / "meta.json").read_text())
+                if meta.get("format") == FORMAT_VERSION and meta.get("source") == list(fingerprint):
+                    logger.info(f"Columnar mirror {previous} is current, not rebuilding")
+                    return root / previous
+            except (OSError, ValueError):
+                pass
+        build_dir = _write_build(source_path, root, fingerprint)
+
+        pointer = root / "current.json"
+        temporary = root / f"current.{uuid.uuid4().hex[:8]}.tmp"
+        temporary.write_text(json.dumps({"build": build_dir.name}))
+        os.replace(temporary, pointer)
+        if previous is not None and (root / previous).is_dir():
+            (root / previous / "superseded").touch()
+        _remove_old_builds(root, build_dir.name)
+    return build_dir
+
+
+def _write_build(source_path: Path, root: Path, fingerprint: tuple) -> Path:
+    """Write a build directory with every table's columns and meta.json."""
+    start = time.perf_counter()
+    build_dir = root / f"build-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    build_dir.mkdir(parents=True)
+    meta = {"format": FORMAT_VERSION, "source": list(fingerprint), "tables": {}, "indexed": {}}
+
+    conn = sqlite3.connect(f"{source_path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        tables = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+        for table, create_sql in tables:
+            if re.search(r"\bCOLLATE\b|WITHOUT\s+ROWID|^\s*CREATE\s+VIRTUAL", create_sql or "", re.I):
+                logger.info(f"Not mirroring {table}: collations, WITHOUT ROWID and virtual tables are not supported")
+                continue
+            table_key = table.lower()
+            table_meta = {"name": table, "rows": 0, "all_columns": [], "columns": {}}
+            quoted_table = '"' + table.replace('"', '""') + '"'
+            for _, name, declared_type, *_ in conn.execute(f"PRAGMA table_info({quoted_table})"):
+                table_meta["all_columns"].append(name.lower())
+                quoted = '"' + name.replace('"', '""') + '"'
+                values = [row[0] for row in conn.execute(f"SELECT {quoted} FROM {quoted_table} ORDER BY rowid")]
+                table_meta["rows"] = len(values)
+                encoded = _column_arrays(values, _affinity(declared_type))
+                if encoded is None:
+                    logger.info(f"Not mirroring {table}.{name}: mixed or unsupported value types")
+                    continue
+                kind, arrays = encoded
+                for part, array in arrays.items():
+                    np.save(build_dir / f"{table_key}.{name.lower()}.{part}.npy", array, allow_pickle=False)
+                table_meta["columns"][name.lower()] = {"kind": kind, "parts": sorted(arrays)}
+            meta["tables"][table_key] = table_meta
+
+        for table, index in conn.execute(
+            "SELECT tbl_name, name FROM sqlite_master WHERE type = 'index'"
+        ).fetchall():
+            quoted_index = '"' + index.replace('"', '""') + '"'
+            columns = {row[2].lower() for row in conn.execute(f"PRAGMA index_info({quoted_index})") if row[2]}
+            indexed = set(meta["indexed"].get(table.lower(), [])) | columns
+            meta["indexed"][table.lower()] = sorted(indexed)
+    finally:
+        conn.close()
+
+    (build_dir / "meta.json").write_text(json.dumps(meta))
+    logger.info(f"Columnar mirror built in {time.perf_counter() - start:.2f}s at {build_dir}")
+    return build_dir
+
+
+# ================================================================================
+# Mirror
+# ================================================================================
+
+@dataclass
+class _Vector:
+    """
+    One value per row.
+
+    Text is stored as int32 codes into a sorted dictionary (-1 for NULL);
+    integers and reals as int64/float64 values with an optional validity mask.
+    """
+    kind: str
+    values: np.ndarray
+    valid: Optional[np.ndarray] = None
+    dictionary: Optional[np.ndarray] = None
+
+    @property
+    def valid_mask(self) -> np.ndarray:
+        if self.kind == "text":
+            return self.values >= 0
+        if self.valid is None:
+            return np.ones(len(self.values), dtype=bool)
+        return self.valid
+
+    def take(self, rows: np.ndarray) -> "_Vector":
+        """Gather rows; -1 selects a NULL (the missing side of a LEFT JOIN)."""
+        missing = rows < 0
+        has_missing = bool(missing.any())
+        safe = np.where(missing, 0, rows) if has_missing else rows
+        if self.kind == "text":
+            codes = self.values[safe] if len(self.values) else np.full(len(rows), -1, dtype=np.int32)
+            if has_missing:
+                codes = np.where(missing, -1, codes)
+            return _Vector("text", codes, dictionary=self.dictionary)
+        values = self.values[safe] if len(self.values) else np.zeros(len(rows), dtype=self.values.dtype)
+        valid = self.valid[safe] if self.valid is not None and len(self.values) else None
+        if has_missing:
+            valid = ~missing if valid is None else valid & ~missing
+        return _Vector(self.kind, values, valid)
+
+
+class ColumnarMirror:
+    """A loaded columnar build: memory-mapped columns plus derived columns computed on demand."""
+
+    def __init__(self, build_dir: Path):
+        self.build_dir = Path(build_dir)
+        self.meta = json.loads((self.build_dir / "meta.json").read_text())
+        self.source = self.meta["source"]
+        self._lock = threading.Lock()
+        self._columns: dict[tuple, _Vector] = {}
+        self._derived: dict[tuple, _Vector] = {}
+        self._distinct: dict[tuple, tuple] = {}
+
+    @classmethod
+    def load(cls, root: Path = COLUMNAR_DIR) -> Optional["ColumnarMirror"]:
+        """Open the current build under root, or return None if there is none."""
+        try:
+            pointer = json.loads((Path(root) / "current.json").read_text())
+            mirror = cls(Path(root) / pointer["build"])
+        except (OSError, ValueError, KeyError):
+            return None
+        if mirror.meta.get("format") != FORMAT_VERSION:
+            return None
+        return mirror
+
+    def table(self, table: str) -> dict:
+        meta = self.meta["tables"].get(table)
+        if meta is None:
+            raise ColumnarUnsupported(f"Table {table} is not mirrored")
+        return meta
+
+    def indexed(self, table: str) -> set[str]:
+        return set(self.meta["indexed"].get(table, []))
+
+    def column(self, table: str, name: str) -> _Vector:
+        key = (table, name)
+        vector = self._columns.get(key)
+        if vector is not None:
+            return vector
+        column_meta = self.table(table)["columns"].get(name)
+        if column_meta is None:
+            raise ColumnarUnsupported(f"Column {table}.{name} is not mirrored")
+
+        def part(suffix: str) -> np.ndarray:
+            return np.load(self.build_dir / f"{table}.{name}.{suffix}.npy", mmap_mode="r", allow_pickle=False)
+
+        if column_meta["kind"] == "text":
+            vector = _Vector("text", part("codes"), dictionary=part("dictionary"))
+        else:
+            valid = part("valid") if "valid" in column_meta["parts"] else None
+            vector = _Vector(column_meta["kind"], part("values"), valid)
+        with self._lock:
+            self._columns[key] = vector
+        return vector
+
+    def distinct(self, table: str, name: str) -> tuple[np.ndarray, list]:
+        """Per-row codes (-1 for NULL) into the list of distinct values of a column."""
+        key = (table, name)
+        cached = self._distinct.get(key)
+        if cached is not None:
+            return cached
+        vector = self.column(table, name)
+        if vector.kind == "text":
+            result = (np.asarray(vector.values), [str(value) for value in vector.dictionary])
+        else:
+            valid = vector.valid_mask
+            uniques, inverse = np.unique(np.asarray(vector.values)[valid], return_inverse=True)
+            codes = np.full(len(vector.values), -1, dtype=np.int64)
+            codes[valid] = inverse
+            result = (codes, uniques.tolist())
+        with self._lock:
+            self._distinct[key] = result
+        return result
+
+    def derived(self, table: str, name: str, expr: Expr) -> _Vector:
+        """
+        Evaluate a scalar expression of one column with SQLite, once per distinct value.
+
+        The expression is rendered with the column replaced by a placeholder
+        and run over a temporary table holding the column's distinct values
+        (plus NULL), so function semantics are SQLite's own.
+        """
+        sql_expr = render_expr(_replace_column(expr, Column(None, "v")))
+        key = (table, name, sql_expr)
+        cached = self._derived.get(key)
+        if cached is not None:
+            return cached
+
+        codes, values = self.distinct(table, name)
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("CREATE TABLE d (v)")
+            conn.executemany("INSERT INTO d (v) VALUES (?)", [(None,)] + [(value,) for value in values])
+            results = [row[0] for row in conn.execute(f"SELECT {sql_expr} FROM d ORDER BY rowid")]
+        except sqlite3.Error as e:
+            raise ColumnarUnsupported(f"Cannot evaluate {sql_expr}: {str(e)}") from e
+        finally:
+            conn.close()
+
+        encoded = _column_arrays(results, "blob")
+        if encoded is None:
+            raise ColumnarUnsupported(f"{sql_expr} returns mixed value types")
+        kind, arrays = encoded
+        # Position 0 holds f(NULL), position i + 1 holds f(values[i])
+        lookup = codes.astype(np.int64) + 1
+        if kind == "text":
+            vector = _Vector("text", arrays["codes"][lookup], dictionary=arrays["dictionary"])
+        else:
+            valid = arrays.get("valid")
+            vector = _Vector(kind, arrays["values"][lookup], None if valid is None else valid[lookup])
+        with self._lock:
+            self._derived[key] = vector
+        return vector
+
+
+def _replace_column(expr: Expr, replacement: Column) -> Expr:
+    if isinstance(expr, Column):
+        return replacement
+    if isinstance(expr, Func):
+        return Func(expr.name, tuple(_replace_column(arg, replacement) for arg in expr.args), expr.distinct)
+    if isinstance(expr, BinOp):
+        return BinOp(expr.op, _replace_column(expr.left, replacement), _replace_column(expr.right, replacement))
+    return expr
+
+
+def _is_deterministic(expr: Expr) -> bool:
+    """Whitelisted scalar functions only, and no 'now' time values."""
+    if isinstance(expr, Func):
+        return (
+            expr.name in SCALAR_FUNCTIONS and not expr.distinct
+            and all(_is_deterministic(arg) for arg in expr.args)
+        )
+    if isinstance(expr, BinOp):
+        return _is_deterministic(expr.left) and _is_deterministic(expr.right)
+    if isinstance(expr, Literal):
+        return not (isinstance(expr.value, str) and expr.value.strip().lower() == "now")
+    return isinstance(expr, Column)
+
+
+# ================================================================================
+# Group-level Values
+# ================================================================================
+
+@dataclass
+class _Series:
+    """
+    One value per group.
+
+    ``approx`` series are REAL sums whose exact SQLite value depends on the
+    summation order: ``values`` holds an estimate and ``error`` a bound on
+    the distance of both the estimate and SQLite's result from the exact sum.
+    """
+    kind: str
+    values: np.ndarray
+    null: np.ndarray
+    error: Optional[np.ndarray] = None
+
+    def python_values(self) -> list:
+        if self.kind == "approx":
+            raise ColumnarUnsupported("Unrounded REAL sums depend on SQLite's summation order")
+        return [None if null else value for value, null in zip(self.values.tolist(), self.null.tolist())]
+
+
+def _literal_series(value: Any, size: int) -> _Series:
+    if isinstance(value, bool) or value is None:
+        raise ColumnarUnsupported("Unsupported literal")
+    if isinstance(value, int):
+        return _Series("int", np.full(size, value, dtype=np.int64), np.zeros(size, dtype=bool))
+    if isinstance(value, float):
+        return _Series("float", np.full(size, value, dtype=np.float64), np.zeros(size, dtype=bool))
+    return _Series("text", np.array([value] * size, dtype=object), np.zeros(size, dtype=bool))
+
+
+def _check_int_range(values: np.ndarray, limit: float = _EXACT_INT):
+    if len(values) and float(np.max(np.abs(values))) >= limit:
+        raise ColumnarUnsupported("Integer result too large to reproduce exactly")
+
+
+def _int_divide(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Integer division truncating toward zero, like SQLite."""
+    safe = np.where(right == 0, 1, right)
+    quotient = np.abs(left) // np.abs(safe)
+    return np.where((left < 0) != (safe < 0), -quotient, quotient)
+
+
+def _arithmetic(op: str, left: _Series, right: _Series) -> _Series:
+    """Apply + - * / to two group-level series with SQLite's typing rules."""
+    if "text" in (left.kind, right.kind):
+        raise ColumnarUnsupported("Arithmetic on text")
+    null = left.null | right.null
+
+    if "approx" in (left.kind, right.kind):
+        a, b = left.values.astype(np.float64), right.values.astype(np.float64)
+        error_a = left.error if left.error is not None else np.zeros(len(a))
+        error_b = right.error if right.error is not None else np.zeros(len(b))
+        if left.kind == "int":
+            _check_int_range(left.values)
+        if right.kind == "int":
+            _check_int_range(right.values)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            if op in ("+", "-"):
+                values = a + b if op == "+" else a - b
+                error = error_a + error_b
+            elif op == "*":
+                values = a * b
+                error = np.abs(a) * error_b + np.abs(b) * error_a + error_a * error_b
+            else:
+                # |a/b - a'/b'| <= (error_a + |a/b| * error_b) / (|b| - error_b)
+                if ((np.abs(b) <= error_b) & (error_b > 0) & ~null).any():
+                    raise ColumnarUnsupported("Divisor too close to zero")
+                null = null | (b == 0)
+                divisor = np.where(b == 0, 1.0, b)
+                values = np.where(b == 0, 0.0, a / divisor)
+                error = (error_a + np.abs(values) * error_b) / np.maximum(np.abs(divisor) - error_b, _EPS)
+        error = error + 4 * _EPS * (np.abs(values) + error)
+        if not np.isfinite(values[~null]).all():
+            raise ColumnarUnsupported("Non-finite intermediate value")
+        return _Series("approx", values, null, error)
+
+    if left.kind == "int" and right.kind == "int":
+        a, b = left.values, right.values
+        if op == "/":
+            null = null | (b == 0)
+            return _Series("int", _int_divide(a, b), null)
+        estimate = {"+": np.add, "-": np.subtract, "*": np.multiply}[op](a.astype(np.float64), b.astype(np.float64))
+        _check_int_range(estimate[~null], 2.0 ** 62)
+        return _Series("int", {"+": np.add, "-": np.subtract, "*": np.multiply}[op](a, b), null)
+
+    a, b = left.values.astype(np.float64), right.values.astype(np.float64)
+    if left.kind == "int":
+        _check_int_range(left.values)
+    if right.kind == "int":
+        _check_int_range(right.values)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        if op == "/":
+            null = null | (b == 0)
+            values = a / np.where(b == 0, 1.0, b)
+        else:
+            values = {"+": np.add, "-": np.subtract, "*": np.multiply}[op](a, b)
+    return _Series("float", values, null)
+
+
+def _round(series: _Series, digits: int) -> _Series:
+    """
+    ROUND(x, digits) with SQLite's result (half away from zero, as a REAL).
+
+    Raises ColumnarUnsupported if any value lies too close to a rounding tie
+    for the result to be certain.
+    """
+    if series.kind == "text":
+        raise ColumnarUnsupported("ROUND of text")
+    digits = max(digits, 0)
+    if digits > 15:
+        raise ColumnarUnsupported("ROUND precision too large")
+    if series.kind == "int":
+        _check_int_range(series.values)
+        return _Series("float", series.values.astype(np.float64), series.null)
+
+    values = np.where(series.null, 0.0, series.values.astype(np.float64))
+    error = np.zeros(len(values)) if series.error is None else np.where(series.null, 0.0, series.error)
+    scale = 10.0 ** digits
+    scaled = np.abs(values) * scale
+    if len(scaled) and float(scaled.max()) >= 2.0 ** 51:
+        raise ColumnarUnsupported("ROUND argument too large")
+    whole = np.floor(scaled)
+    fraction = scaled - whole
+    margin = error * scale + 2.0 ** -44 * (scaled + 1.0)
+    if (np.abs(fraction - 0.5) <= margin).any():
+        raise ColumnarUnsupported("Value too close to a rounding tie")
+    rounded = (whole + (fraction > 0.5)) / scale
+    if digits == 0:
+        result = np.where(values < 0, -rounded, rounded) + 0.0
+    else:
+        result = np.where(values < 0, -rounded, rounded)
+    return _Series("float", result, series.null)
+
+
+def _sort_key(kind: str, value: Any) -> tuple:
+    """SQLite ordering: NULL, then numbers, then text (BINARY collation)."""
+    if value is None:
+        return (0, 0)
+    return (2, value) if kind == "text" else (1, value)
+
+
+# ================================================================================
+# Query Execution
+# ================================================================================
+
+@dataclass
+class _GroupContext:
+    """Row set and grouping shared by the group-level expressions of one query."""
+    rows: dict
+    groups: np.ndarray
+    group_count: int
+    key_exprs: list
+    key_series: list
+    aggregates: dict = field(default_factory=dict)
+
+
+class _Executor:
+    """Evaluates one parsed aggregate query against a mirror."""
+
+    def __init__(self, mirror: ColumnarMirror, query: SelectQuery, cancel_event: Optional[threading.Event] = None):
+        self.mirror = mirror
+        self.query = query
+        self.cancel_event = cancel_event
+        self.sources: dict[str, str] = {}
+        self._add_source(query.table, query.alias)
+        for join in query.joins:
+            self._add_source(join.table, join.alias)
+        self.item_names = {item.alias.lower(): item for item in query.items if item.alias}
+
+    def check_cancelled(self):
+        """Stop between stages once the caller has given up on the query."""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ColumnarUnsupported("Query cancelled")
+
+    def _add_source(self, table: str, alias: Optional[str]):
+        key = alias or table
+        if key in self.sources:
+            raise ColumnarUnsupported(f"Duplicate table reference {key}")
+        self.mirror.table(table)
+        self.sources[key] = table
+
+    # Name resolution
+
+    def resolve(self, column: Column) -> Column:
+        """Qualify a column with the FROM/JOIN entry it belongs to."""
+        if column.table is not None:
+            if column.table not in self.sources:
+                raise ColumnarUnsupported(f"Unknown table {column.table}")
+            source = column.table
+        else:
+            owners = [
+                key for key, table in self.sources.items()
+                if column.name in self.mirror.table(table)["all_columns"]
+            ]
+            if len(owners) != 1:
+                raise ColumnarUnsupported(f"Cannot resolve column {column.name}")
+            source = owners[0]
+        if column.name not in self.mirror.table(self.sources[source])["all_columns"]:
+            raise ColumnarUnsupported(f"No column {column.name} in {source}")
+        return Column(source, column.name)
+
+    def is_column(self, column: Column) -> bool:
+        try:
+            self.resolve(column)
+            return True
+        except ColumnarUnsupported:
+            return False
+
+    def canonical(self, expr: Expr) -> Expr:
+        if isinstance(expr, Column):
+            return self.resolve(expr)
+        if isinstance(expr, Func):
+            return Func(expr.name, tuple(self.canonical(arg) for arg in expr.args), expr.distinct)
+        if isinstance(expr, BinOp):
+            return BinOp(expr.op, self.canonical(expr.left), self.canonical(expr.right))
+        return expr
+
+    # Row-level evaluation
+
+    def vector(self, expr: Expr, rows: dict[str, np.ndarray]) -> _Vector:
+        """Evaluate a canonical row-level expression over the current row set."""
+        if isinstance(expr, Column):
+            return self.mirror.column(self.sources[expr.table], expr.name).take(rows[expr.table])
+        if isinstance(expr, BinOp) and expr.op in "+-*/":
+            operands = []
+            for side in (expr.left, expr.right):
+                if isinstance(side, Literal) and isinstance(side.value, (int, float)) and not isinstance(side.value, bool):
+                    operands.append(side.value)
+                elif isinstance(side, Literal):
+                    break
+                else:
+                    operand = self.vector(side, rows)
+                    if operand.kind == "text":
+                        break
+                    operands.append(operand)
+            else:
+                return self._row_arithmetic(expr.op, *operands)
+        columns = set(columns_in(expr))
+        if len(columns) == 1 and _is_deterministic(expr):
+            column = columns.pop()
+            derived = self.mirror.derived(self.sources[column.table], column.name, expr)
+            return derived.take(rows[column.table])
+        raise ColumnarUnsupported("Unsupported row expression")
+
+    def _row_arithmetic(self, op: str, left: Any, right: Any) -> _Vector:
+        size = len(left.values) if isinstance(left, _Vector) else len(right.values)
+
+        def parts(operand) -> tuple[str, np.ndarray, np.ndarray]:
+            if isinstance(operand, _Vector):
+                return operand.kind, np.asarray(operand.values), operand.valid_mask
+            kind = "int" if isinstance(operand, int) else "float"
+            return kind, np.full(size, operand, dtype=np.int64 if kind == "int" else np.float64), np.ones(size, dtype=bool)
+
+        left_kind, a, left_valid = parts(left)
+        right_kind, b, right_valid = parts(right)
+        series = _arithmetic(
+            op,
+            _Series(left_kind, np.where(left_valid, a, 0), ~left_valid),
+            _Series(right_kind, np.where(right_valid, b, 0), ~right_valid),
+        )
+        return _Vector(series.kind, series.values, ~series.null)
+
+    def filter(self, predicate, rows: dict[str, np.ndarray]) -> np.ndarray:
+        """Boolean mask of the rows satisfying one WHERE predicate."""
+        vector = self.vector(predicate.expr, rows)
+        valid = vector.valid_mask
+        op = predicate.op
+        if op == "is null":
+            return ~valid
+        if op == "is not null":
+            return valid
+
+        values = predicate.values
+        if any(value is None or isinstance(value, bool) for value in values):
+            raise ColumnarUnsupported("NULL comparisons")
+        if vector.kind == "text":
+            if not all(isinstance(value, str) for value in values):
+                raise ColumnarUnsupported("Text compared with a number")
+            codes = vector.values
+            dictionary = vector.dictionary
+
+            def bounds(value: str) -> tuple[int, int]:
+                return (
+                    int(np.searchsorted(dictionary, value, side="left")),
+                    int(np.searchsorted(dictionary, value, side="right")),
+                )
+
+            def compare(comparison: str, value: str) -> np.ndarray:
+                low, high = bounds(value)
+                if comparison == "=":
+                    return (codes >= low) & (codes < high)
+                if comparison == "!=":
+                    return valid & ~((codes >= low) & (codes < high))
+                if comparison == "<":
+                    return valid & (codes < low)
+                if comparison == "<=":
+                    return valid & (codes < high)
+                if comparison == ">":
+                    return codes >= high
+                return codes >= low
+        else:
+            if not all(isinstance(value, (int, float)) for value in values):
+                raise ColumnarUnsupported("Number compared with text")
+            data = np.asarray(vector.values)
+
+            def compare(comparison: str, value: float) -> np.ndarray:
+                result = {
+                    "=": np.equal, "!=": np.not_equal, "<": np.less,
+                    "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+                }[comparison](data, value)
+                return valid & result
+
+        if op in ("in", "not in"):
+            matched = np.zeros(len(valid), dtype=bool)
+            for value in values:
+                matched |= compare("=", value)
+            return matched if op == "in" else valid & ~matched
+        if op in ("between", "not between"):
+            low, high = values
+            within = compare(">=", low) & compare("<=", high)
+            return within if op == "between" else valid & ~within
+        return compare(op, values[0])
+
+    # Joins
+
+    def join_rows(self, rows: dict[str, np.ndarray], join, allowed: Optional[np.ndarray]) -> dict[str, np.ndarray]:
+        """Equi-join the row set with one more table (inner or left)."""
+        if len(join.on) != 1:
+            raise ColumnarUnsupported("Joins must use a single column equality")
+        key = join.alias or join.table
+        left, right = (self.resolve(column) for column in join.on[0])
+        if right.table != key:
+            left, right = right, left
+        if right.table != key or left.table == key or left.table not in rows:
+            raise ColumnarUnsupported("Join condition must link the joined table to an earlier one")
+
+        outer = self.vector(left, rows)
+        inner = self.mirror.column(join.table, right.name)
+        if (outer.kind == "text") != (inner.kind == "text"):
+            raise ColumnarUnsupported("Join compares text with numbers")
+
+        inner_valid = inner.valid_mask
+        if outer.kind == "text":
+            # Translate outer codes into the inner dictionary; the extra last slot maps NULL (-1)
+            inner_keys = np.asarray(inner.values).astype(np.int64)
+            translation = np.full(len(outer.dictionary) + 1, -1, dtype=np.int64)
+            if len(inner.dictionary):
+                mapped = np.minimum(np.searchsorted(inner.dictionary, outer.dictionary), len(inner.dictionary) - 1)
+                found = inner.dictionary[mapped] == outer.dictionary
+                translation[:-1] = np.where(found, mapped, -1)
+            outer_keys = translation[outer.values]
+            outer_valid = outer_keys >= 0
+        else:
+            as_float = outer.kind == "float" or inner.kind == "float"
+            dtype = np.float64 if as_float else np.int64
+            inner_keys = np.asarray(inner.values).astype(dtype)
+            outer_keys = np.asarray(outer.values).astype(dtype)
+            outer_valid = outer.valid_mask
+
+        candidates = np.flatnonzero(inner_valid if allowed is None else inner_valid & allowed)
+        order = candidates[np.argsort(inner_keys[candidates], kind="stable")]
+        sorted_keys = inner_keys[order]
+        start = np.searchsorted(sorted_keys, outer_keys, side="left")
+        end = np.searchsorted(sorted_keys, outer_keys, side="right")
+        counts = np.where(outer_valid, end - start, 0)
+
+        if join.kind == "left":
+            emitted = np.maximum(counts, 1)
+        else:
+            emitted = counts
+        total = int(emitted.sum())
+        outer_rows = np.repeat(np.arange(len(counts)), emitted)
+        offsets = np.arange(total) - np.repeat(np.cumsum(emitted) - emitted, emitted)
+        positions = np.repeat(start, emitted) + offsets
+        matched = np.repeat(counts > 0, emitted)
+        inner_rows = np.full(total, -1, dtype=np.int64)
+        inner_rows[matched] = order[positions[matched]]
+
+        joined = {source: indexes[outer_rows] for source, indexes in rows.items()}
+        joined[key] = inner_rows
+        return joined
+
+    # Aggregation
+
+    def aggregate(self, func: Func, rows: dict[str, np.ndarray], groups: np.ndarray, group_count: int) -> _Series:
+        """Compute one aggregate per group."""
+        if len(func.args) != 1:
+            raise ColumnarUnsupported(f"{func.name.upper()} with {len(func.args)} arguments")
+        argument = func.args[0]
+        no_null = np.zeros(group_count, dtype=bool)
+
+        if isinstance(argument, Star):
+            if func.name != "count" or func.distinct:
+                raise ColumnarUnsupported("Only COUNT accepts *")
+            return _Series("int", np.bincount(groups, minlength=group_count).astype(np.int64), no_null)
+        if contains_aggregate(argument):
+            raise ColumnarUnsupported("Nested aggregates")
+
+        vector = self.vector(argument, rows)
+        selected = np.flatnonzero(vector.valid_mask)
+        values = np.asarray(vector.values)[selected]
+        group_ids = groups[selected]
+        if func.distinct:
+            order = np.lexsort((values, group_ids))
+            values, group_ids = values[order], group_ids[order]
+            keep = np.ones(len(values), dtype=bool)
+            keep[1:] = (values[1:] != values[:-1]) | (group_ids[1:] != group_ids[:-1])
+            values, group_ids = values[keep], group_ids[keep]
+
+        counts = np.bincount(group_ids, minlength=group_count).astype(np.int64)
+        empty = counts == 0
+        if func.name == "count":
+            return _Series("int", counts, no_null)
+
+        if func.name in ("min", "max"):
+            result = np.zeros(group_count, dtype=values.dtype)
+            if len(values):
+                order = np.argsort(group_ids, kind="stable")
+                sorted_groups = group_ids[order]
+                starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+                reducer = np.minimum if func.name == "min" else np.maximum
+                result[sorted_groups[starts]] = reducer.reduceat(values[order], starts)
+            if vector.kind == "text":
+                texts = np.empty(group_count, dtype=object)
+                for position in np.flatnonzero(~empty):
+                    texts[position] = str(vector.dictionary[result[position]])
+                return _Series("text", texts, empty)
+            return _Series(vector.kind, result, empty)
+
+        if func.name not in ("sum", "total", "avg"):
+            raise ColumnarUnsupported(f"Unsupported aggregate {func.name}")
+        if vector.kind == "text":
+            raise ColumnarUnsupported(f"{func.name.upper()} of text")
+
+        # bincount returns int64 when there are no weights at all (no rows matched)
+        magnitude = np.bincount(
+            group_ids, weights=np.abs(values.astype(np.float64)), minlength=group_count
+        ).astype(np.float64)
+        sums = np.bincount(group_ids, weights=values.astype(np.float64), minlength=group_count).astype(np.float64)
+        whole = vector.kind == "int" or bool(np.all(values == np.floor(values)))
+        if whole and (not len(magnitude) or float(magnitude.max()) < _EXACT_INT):
+            # Partial sums of whole numbers below 2^52 are exact in any order
+            if vector.kind == "float":
+                if func.name == "avg":
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        return _Series("float", np.where(empty, 0.0, sums / np.maximum(counts, 1)), empty)
+                return _Series("float", sums, empty if func.name == "sum" else no_null)
+            if func.name == "sum":
+                return _Series("int", sums.astype(np.int64), empty)
+            if func.name == "total":
+                return _Series("float", sums, no_null)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return _Series("float", np.where(empty, 0.0, sums / np.maximum(counts, 1)), empty)
+        if vector.kind == "int":
+            raise ColumnarUnsupported("Integer sum too large to reproduce exactly")
+
+        # Naive (or compensated) summation in any order is within n * eps * sum|x| of the exact sum
+        error = 2 * (counts + 2) * _EPS * magnitude
+        if func.name == "avg":
+            averages = sums / np.maximum(counts, 1)
+            error = error / np.maximum(counts, 1) + 4 * _EPS * np.abs(averages)
+            return _Series("approx", np.where(empty, 0.0, averages), empty, error)
+        null = empty if func.name == "sum" else no_null
+        return _Series("approx", sums, null, error)
+
+    def series(self, expr: Expr, context: _GroupContext) -> _Series:
+        """Evaluate a canonical group-level expression."""
+        for key_expr, key_series in zip(context.key_exprs, context.key_series):
+            if expr == key_expr:
+                return key_series
+        if isinstance(expr, Literal):
+            return _literal_series(expr.value, context.group_count)
+        if isinstance(expr, Func) and expr.is_aggregate:
+            cached = context.aggregates.get(expr)
+            if cached is None:
+                cached = self.aggregate(expr, context.rows, context.groups, context.group_count)
+                context.aggregates[expr] = cached
+            return cached
+        if isinstance(expr, Func) and expr.name == "round" and contains_aggregate(expr):
+            if len(expr.args) not in (1, 2):
+                raise ColumnarUnsupported("ROUND arguments")
+            digits = 0
+            if len(expr.args) == 2:
+                if not isinstance(expr.args[1], Literal) or not isinstance(expr.args[1].value, int):
+                    raise ColumnarUnsupported("ROUND precision must be an integer literal")
+                digits = expr.args[1].value
+            return _round(self.series(expr.args[0], context), digits)
+        if isinstance(expr, BinOp) and contains_aggregate(expr) and expr.op in "+-*/":
+            return _arithmetic(expr.op, self.series(expr.left, context), self.series(expr.right, context))
+        raise ColumnarUnsupported("Expression is neither grouped nor aggregated")
+
+    # Query
+
+    def group_terms(self) -> list[Expr]:
+        """GROUP BY terms with positions and (non-column) aliases replaced by their expressions."""
+        terms = []
+        for expr in self.query.group_by:
+            if isinstance(expr, Literal) and isinstance(expr.value, int):
+                if not 1 <= expr.value <= len(self.query.items):
+                    raise ColumnarUnsupported("GROUP BY position out of range")
+                expr = self.query.items[expr.value - 1].expr
+            elif isinstance(expr, Column) and expr.table is None and not self.is_column(expr):
+                item = self.item_names.get(expr.name)
+                if item is None:
+                    raise ColumnarUnsupported(f"Cannot resolve GROUP BY {expr.name}")
+                expr = item.expr
+            if contains_aggregate(expr) or isinstance(expr, (Literal, Star)):
+                raise ColumnarUnsupported("Unsupported GROUP BY term")
+            terms.append(self.canonical(expr))
+        return terms
+
+    def order_terms(self, select_exprs: list[Expr]) -> list[tuple[Optional[int], Optional[Expr], bool]]:
+        """ORDER BY terms as (select position, or expression to evaluate, descending)."""
+        terms = []
+        for order in self.query.order_by:
+            expr = order.expr
+            if isinstance(expr, Literal):
+                if not isinstance(expr.value, int) or not 1 <= expr.value <= len(self.query.items):
+                    raise ColumnarUnsupported("Unsupported ORDER BY literal")
+                terms.append((expr.value - 1, None, order.descending))
+                continue
+            if isinstance(expr, Column) and expr.table is None:
+                matches = [
+                    position for position, item in enumerate(self.query.items)
+                    if item.alias and item.alias.lower() == expr.name
+                ]
+                if matches:
+                    terms.append((matches[0], None, order.descending))
+                    continue
+            expr = self.canonical(expr)
+            if expr in select_exprs:
+                terms.append((select_exprs.index(expr), None, order.descending))
+            else:
+                terms.append((None, expr, order.descending))
+        return terms
+
+    def run(self) -> tuple[list[str], list[tuple]]:
+        query = self.query
+        if query.distinct or not query.is_aggregate:
+            raise ColumnarUnsupported("Only aggregate queries without DISTINCT are supported")
+        if any(isinstance(item.expr, Star) for item in query.items):
+            raise ColumnarUnsupported("SELECT * in an aggregate query")
+
+        # Single-table predicates on the FROM table and inner-joined tables are applied before joining
+        inner_sources = {query.alias or query.table} | {
+            join.alias or join.table for join in query.joins if join.kind == "inner"
+        }
+        early: dict[str, list] = {}
+        late = []
+        for predicate in query.where:
+            if contains_aggregate(predicate.expr):
+                raise ColumnarUnsupported("Aggregate in WHERE")
+            predicate = Predicate(self.canonical(predicate.expr), predicate.op, predicate.values)
+            sources = {column.table for column in columns_in(predicate.expr)}
+            if len(sources) == 1 and sources <= inner_sources:
+                early.setdefault(sources.pop(), []).append(predicate)
+            else:
+                late.append(predicate)
+
+        def allowed_rows(source: str) -> Optional[np.ndarray]:
+            if source not in early:
+                return None
+            table_rows = {source: np.arange(self.mirror.table(self.sources[source])["rows"])}
+            mask = np.ones(len(table_rows[source]), dtype=bool)
+            for predicate in early[source]:
+                mask &= self.filter(predicate, table_rows)
+            return mask
+
+        base = query.alias or query.table
+        base_allowed = allowed_rows(base)
+        base_rows = self.mirror.table(query.table)["rows"]
+        rows = {base: np.flatnonzero(base_allowed) if base_allowed is not None else np.arange(base_rows)}
+        for join in query.joins:
+            self.check_cancelled()
+            rows = self.join_rows(rows, join, allowed_rows(join.alias or join.table))
+
+        self.check_cancelled()
+        if late:
+            mask = np.ones(len(next(iter(rows.values()))), dtype=bool)
+            for predicate in late:
+                mask &= self.filter(predicate, rows)
+            rows = {source: indexes[mask] for source, indexes in rows.items()}
+        row_count = len(next(iter(rows.values())))
+
+        self.check_cancelled()
+        key_exprs = self.group_terms()
+        if key_exprs:
+            groups, representatives = self._group(key_exprs, rows, row_count)
+            group_count = len(representatives)
+        else:
+            groups, representatives, group_count = np.zeros(row_count, dtype=np.int64), None, 1
+        key_series = [self._key_series(expr, rows, representatives) for expr in key_exprs]
+        context = _GroupContext(rows, groups, group_count, key_exprs, key_series)
+
+        select_exprs = [self.canonical(item.expr) for item in query.items]
+        for expr in select_exprs:
+            if not contains_aggregate(expr) and not isinstance(expr, Literal) and expr not in key_exprs:
+                raise ColumnarUnsupported("Non-aggregated column missing from GROUP BY")
+        self.check_cancelled()
+        select_series = [self.series(expr, context) for expr in select_exprs]
+        self.check_cancelled()
+        columns = [item.output_name for item in query.items]
+        values = [series.python_values() for series in select_series]
+        result_rows = list(zip(*values)) if values else []
+
+        order_terms = self.order_terms(select_exprs)
+        if order_terms:
+            result_rows = self._sort(result_rows, select_series, order_terms, context)
+        elif len(key_exprs) > 1 and group_count > 1:
+            base_columns = {
+                column for expr in key_exprs for column in columns_in(expr)
+                if column.name in self.mirror.indexed(self.sources[column.table])
+            }
+            if base_columns:
+                raise ColumnarUnsupported("Group order may follow an index; add ORDER BY")
+
+        offset = query.offset or 0
+        if query.limit is not None:
+            result_rows = result_rows[offset:offset + query.limit]
+        return columns, result_rows
+
+    def _group(self, key_exprs: list[Expr], rows: dict[str, np.ndarray], row_count: int) -> tuple[np.ndarray, np.ndarray]:
+        """Group ids in SQLite's GROUP BY output order (NULL first, then ascending)."""
+        combined = np.zeros(row_count, dtype=np.int64)
+        capacity = 1
+        for expr in key_exprs:
+            vector = self.vector(expr, rows)
+            if vector.kind == "text":
+                ranks = vector.values.astype(np.int64) + 1
+                cardinality = len(vector.dictionary) + 1
+            else:
+                valid = vector.valid_mask
+                data = np.asarray(vector.values)
+                uniques = np.unique(data[valid])
+                ranks = np.where(valid, np.searchsorted(uniques, data) + 1, 0).astype(np.int64)
+                cardinality = len(uniques) + 1
+            capacity *= cardinality
+            if capacity >= 2 ** 62:
+                raise ColumnarUnsupported("Too many group key combinations")
+            combined = combined * cardinality + ranks
+        _, representatives, groups = np.unique(combined, return_index=True, return_inverse=True)
+        return groups.reshape(-1).astype(np.int64), representatives
+
+    def _key_series(self, expr: Expr, rows: dict[str, np.ndarray], representatives: Optional[np.ndarray]) -> _Series:
+        if representatives is None:
+            raise ColumnarUnsupported("Grouped expression without GROUP BY")
+        vector = self.vector(expr, {source: indexes[representatives] for source, indexes in rows.items()})
+        valid = vector.valid_mask
+        if vector.kind == "text":
+            values = np.empty(len(valid), dtype=object)
+            for position in np.flatnonzero(valid):
+                values[position] = str(vector.dictionary[vector.values[position]])
+            return _Series("text", values, ~valid)
+        return _Series(vector.kind, np.asarray(vector.values), ~valid)
+
+    def _sort(self, result_rows: list[tuple], select_series: list[_Series], order_terms: list, context) -> list[tuple]:
+        """
+        Sort output rows by the ORDER BY terms.
+
+        SQLite breaks ties by its query plan, so kept rows that tie on every
+        ORDER BY key but differ in content make the query unsupported.
+        Unrounded REAL sums may be sort keys only when no two are within
+        their error bounds of each other.
+        """
+        keys = []
+        for position, expr, descending in order_terms:
+            series = select_series[position] if position is not None else self.series(expr, context)
+            if series.kind == "approx":
+                values = [None if null else value for value, null in zip(series.values.tolist(), series.null.tolist())]
+                tolerance = 2 * float(series.error.max()) if len(series.error) else 0.0
+            else:
+                values = series.python_values()
+                tolerance = None
+            keys.append((series.kind, values, descending, tolerance))
+
+        def compare(left: int, right: int) -> int:
+            for kind, values, descending, _ in keys:
+                a, b = _sort_key(kind, values[left]), _sort_key(kind, values[right])
+                if a != b:
+                    return (-1 if a < b else 1) * (-1 if descending else 1)
+            return 0
+
+        order = sorted(range(len(result_rows)), key=cmp_to_key(compare))
+
+        checked = len(order) - 1
+        if self.query.limit is not None:
+            checked = min(checked, (self.query.offset or 0) + self.query.limit)
+        for left, right in zip(order[:checked], order[1:checked + 1]):
+            for kind, values, _, tolerance in keys:
+                a, b = values[left], values[right]
+                if tolerance is not None and a is not None and b is not None and abs(a - b) <= tolerance:
+                    raise ColumnarUnsupported("REAL sums too close to order reliably")
+                if _sort_key(kind, a) != _sort_key(kind, b):
+                    break
+            else:
+                if result_rows[left] != result_rows[right]:
+                    raise ColumnarUnsupported("Rows tie on the ORDER BY keys")
+        return [result_rows[index] for index in order]
+
+
+# ================================================================================
+# Engine
+# ================================================================================
+
+class ColumnarEngine:
+    """Keeps the mirror in sync with the source database and answers eligible queries from it."""
+
+    def __init__(self, source_path: Path = DB_PATH, root: Path = COLUMNAR_DIR, auto_refresh: bool = COLUMNAR_AUTO_REFRESH):
+        self.source_path = Path(source_path)
+        self.root = Path(root)
+        self.auto_refresh = auto_refresh
+        self._lock = threading.Lock()
+        self._mirror: Optional[ColumnarMirror] = None
+        self._refreshing = False
+        self.stats = {"served": 0, "fallbacks": 0, "stale": 0}
+
+    def _current(self) -> Optional[ColumnarMirror]:
+        """The loaded mirror if it matches the source database, else None."""
+        expected = list(database_fingerprint(self.source_path))
+        mirror = self._mirror
+        if mirror is None or mirror.source != expected:
+            loaded = ColumnarMirror.load(self.root)
+            if loaded is not None and loaded.source == expected:
+                with self._lock:
+                    self._mirror = mirror = loaded
+            else:
+                return None
+        return mirror
+
+    def is_fresh(self) -> bool:
+        return self._current() is not None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild the mirror if it is stale (or always, with force)."""
+        if not force and self.is_fresh():
+            return False
+        if not self.source_path.exists():
+            logger.warning(f"Cannot build columnar mirror: {self.source_path} not found")
+            return False
+        build_columnar_mirror(self.source_path, self.root, force=force)
+        self._current()
+        return True
+
+    def refresh_in_background(self):
+        """Start a single background rebuild if none is running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Columnar mirror refresh failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=_run, name="columnar-refresh", daemon=True).start()
+
+    def execute(
+        self,
+        query: str,
+        max_rows: Optional[int] = None,
+        count_limit: int = DEFAULT_COUNT_LIMIT,
+        summarize: bool = False,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Optional[QueryResult]:
+        """
+        Answer an aggregate query from the mirror.
+
+        Setting cancel_event stops the evaluation at the next stage (join,
+        filter, grouping, aggregation) and returns None.
+
+        With summarize, column summaries cover every counted row, as on the
+        SQLite path, before the rows are cut to max_rows.
+
+        Returns:
+            The result, or None if the query must run on SQLite
+        """
+        try:
+            parsed = parse_select(query)
+        except SQLParseError:
+            return None
+        if not parsed.is_aggregate:
+            return None
+
+        mirror = self._current()
+        if mirror is None:
+            self.stats["stale"] += 1
+            if self.auto_refresh:
+                self.refresh_in_background()
+            return None
+
+        start = time.monotonic()
+        try:
+            columns, rows = _Executor(mirror, parsed, cancel_event).run()
+        except ColumnarUnsupported as e:
+            self.stats["fallbacks"] += 1
+            logger.debug(f"Columnar engine not applicable: {str(e)}")
+            return None
+        except Exception as e:
+            self.stats["fallbacks"] += 1
+            logger.warning(f"Columnar engine failed, running on SQLite: {str(e)}")
+            return None
+
+        self.stats["served"] += 1
+        total_rows, total_is_exact = len(rows), True
+        if max_rows is not None:
+            if total_rows - max_rows > count_limit:
+                total_rows, total_is_exact = max_rows + count_limit, False
+        summary = None
+        if summarize and columns:
+            summarizer = ResultSummarizer(columns)
+            summarizer.update(rows[:total_rows])
+            summary = summarizer.finish()
+        if max_rows is not None:
+            rows = rows[:max_rows]
+        logger.info(f"Answered query from the columnar mirror ({total_rows} rows)")
+        return QueryResult(
+            columns=columns,
+            rows=rows,
+            total_rows=total_rows,
+            total_is_exact=total_is_exact,
+            elapsed=time.monotonic() - start,
+            summary=summary
+        )
+
+
+_engine: Optional[ColumnarEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_columnar_engine() -> ColumnarEngine:
+    """Get or create the columnar engine singleton."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ColumnarEngine()
+    return _engine
+
+
+if __name__ == "__main__":
+    get_columnar_engine().refresh(force=True)
@@ -2,36 +2,158 @@
 Data Analyst Agent using LangGraph.
 Handles SQL queries and visualizations for the Olist E-commerce database.
 """
+import asyncio
 import sqlite3
 import json
-from pathlib import Path
-from typing import Annotated, Literal
-import plotly.io as pio
-import plotly.graph_objects as go
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from typing import Annotated, Any, Literal, Optional
 import chainlit as cl
-from langchain_core.tools import tool
-from langchain_core.messages import AIMessage, ToolMessage, HumanMessage
+from langchain_core.tools import tool, StructuredTool
+from langchain_core.messages import AIMessage, ToolMessage, HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, MessagesState, START, END
 from langgraph.checkpoint.memory import MemorySaver
 
-from src.prompts import DATA_ANALYST_SYSTEM_PROMPT
-from src.utils.graph_utils import call_model
+from src.prompts import TEMPLATE_INSIGHT_PROMPT, build_data_analyst_prompt, get_data_analyst_system_prompt
+from src.utils.graph_utils import call_model, compact_messages, get_model_config
+from src.utils.model_registry import get_model_registry
+from src.utils.checkpointer import get_checkpointer
+from src.utils.schema_retriever import RETRIEVAL_ENABLED, get_schema_retriever
+from src.utils.token_utils import estimate_tokens
+from src.utils.result_encoding import RESULT_FORMAT, encode_result, result_token_budget
+from src.utils.result_stats import RESULT_STATS_ENABLED, format_summaries
+from src.services.sql_engine import DB_PATH, QueryResult, QueryTimeoutError, SQLEngine, get_sql_engine
+from src.services.index_advisor import get_index_advisor
+from src.services.rollups import ROLLUP_DB_PATH, get_rollup_manager
+from src.services.columnar_engine import COLUMNAR_ENGINE_ENABLED, get_columnar_engine
+from src.services.time_keys import get_time_key_rewriter
+from src.services.sql_guard import LIMIT_NOTE_PREFIX, SQL_GUARD_ENABLED, QueryRejectedError, get_query_guard
+from src.services.chart_store import CHART_MARKER, ChartArtifact, format_chart_marker, get_chart_store
+from src.services.chart_engine import CHART_MAX_ROWS, column_values, create_chart, render_static
+from src.services.result_handles import get_result_handles
+from src.services.answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from src.services.sql_templates import (
+    TEMPLATE_INSIGHT, TEMPLATES_ENABLED, TemplateMatch, get_template_library
+)
 from src.logger import setup_application_logger
 
 logger = setup_application_logger(__name__)
 
-# Database path
-DB_PATH = Path(__file__).parent.parent.parent / "data" / "olist.sqlite"
+# Rows fetched per query; the model sees as many as fit its result token budget
+MAX_DISPLAY_ROWS = 50
+
+# "sqlite" (persistent, bounded) or "memory" (MemorySaver, lost on restart)
+CHECKPOINT_BACKEND = os.environ.get("CHECKPOINT_BACKEND", "sqlite").lower()
+
+# "interactive" (Plotly), or "png" / "svg" for cached static renders
+CHART_RENDER_MODE = os.environ.get("CHART_RENDER_MODE", "interactive").lower()
+
+# Recent user messages whose tables are kept in the schema section, so follow-ups see them
+SCHEMA_LOOKBACK_MESSAGES = 3
+
+# Marks a SQL tool output that returned rows
+RESULT_HANDLE_PREFIX = "Result handle: "
 
 
 # ================================================================================
 # Tools
 # ================================================================================
 
-@tool
-def execute_sql_tool(
-    query: Annotated[str, "The SQLite query to execute against the olist.sqlite database"]
+def _format_query_result(
+    result: QueryResult,
+    handle: Optional[str] = None,
+    model_name: Optional[str] = None
+) -> str:
+    """Format a query result as the structured string the model reads, sized to the model's context."""
+    if not result.rows:
+        logger.info("Query returned no results")
+        return "Query executed successfully. No rows returned."
+
+    # Format results as a structured string
+    row_count = f"{result.row_count}" if result.total_is_exact else f"more than {result.row_count}"
+    rows_text, shown = encode_result(result.columns, result.rows, result_token_budget(model_name))
+    result_str = f"{RESULT_HANDLE_PREFIX}{handle}\n" if handle else ""
+    if RESULT_FORMAT == "tuples":
+        result_str += f"Columns: {', '.join(result.columns)}\n\n"
+    result_str += f"Results ({row_count} rows):\n"
+    result_str += rows_text
+
+    remaining = result.row_count - shown
+    if remaining > 0:
+        if result.total_is_exact:
+            result_str += f"\n... and {remaining} more rows"
+        else:
+            result_str += f"\n... and more than {remaining} more rows"
+        # Statistics over every row, so insights do not rest on the rows shown
+        if result.summary:
+            result_str += f"\n\n{format_summaries(result.summary, result.row_count, result.total_is_exact)}"
+
+    logger.info(f"Query returned {result.row_count} rows in {result.elapsed:.3f}s")
+    return result_str
+
+
+def _format_sql_error(e: Exception) -> str:
+    """Turn an execution failure into an error message for the model."""
+    if isinstance(e, QueryTimeoutError):
+        error_msg = (
+            f"Query Timeout: {str(e)}. Simplify the query (add WHERE filters, "
+            f"aggregate, or add a LIMIT) and try again."
+        )
+    elif isinstance(e, QueryRejectedError):
+        error_msg = f"Query Rejected: {str(e)}"
+    elif isinstance(e, sqlite3.Error):
+        error_msg = f"SQL Error: {str(e)}"
+    else:
+        error_msg = f"Execution Error: {str(e)}"
+    logger.error(error_msg)
+    return error_msg
+
+
+def _register_result(query: str, db_path, result: QueryResult) -> Optional[str]:
+    """Give a successful result a handle that chart tools can load in full."""
+    if not result.rows:
+        return None
+    return get_result_handles().register(query, db_path, result.columns, result.row_count)
+
+
+def _advise_indexes(engine: SQLEngine, query: str, result: QueryResult):
+    """Hand freshly executed queries to the index advisor in the background."""
+    if not result.cached:
+        engine.submit(get_index_advisor(DB_PATH).observe, query)
+
+
+def _guard_query(query: str) -> tuple[str, Optional[str]]:
+    """
+    Check a model-written query before it runs.
+
+    Returns:
+        The SQL to run (possibly with a LIMIT added) and an optional note for the model
+
+    Raises:
+        QueryRejectedError: If the query is not a single SELECT or is too expensive
+    """
+    if not SQL_GUARD_ENABLED:
+        return query, None
+    checked = get_query_guard().check(query)
+    return checked.sql, checked.note
+
+
+def _with_note(note: Optional[str], output: str) -> str:
+    return f"{note}\n\n{output}" if note else output
+
+
+def _model_name(config: Optional[RunnableConfig]) -> Optional[str]:
+    """The model the current run uses, which sizes the query results it reads."""
+    return (config or {}).get("configurable", {}).get("model_name")
+
+
+def _execute_sql(
+    query: Annotated[str, "The SQLite query to execute against the olist.sqlite database"],
+    config: RunnableConfig = None
 ) -> str:
     """
     Execute a SQL query against the Olist SQLite database and return formatted results.
@@ -43,45 +165,92 @@ def execute_sql_tool(
     """
     try:
         logger.info(f"Executing SQL: {query[:100]}...")
-        
-        conn = sqlite3.connect(str(DB_PATH))
-        cursor = conn.cursor()
-        
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        if not results:
-            conn.close()
-            logger.info("Query returned no results")
-            return "Query executed successfully. No rows returned."
-        
-        # Get column names
-        column_names = [description[0] for description in cursor.description]
-        
-        # Format results as a structured string
-        result_str = f"Columns: {', '.join(column_names)}\n\n"
-        result_str += f"Results ({len(results)} rows):\n"
-        
-        # Limit to first 30 rows for display
-        for row in results[:30]:
-            result_str += f"{row}\n"
-        
-        if len(results) > 30:
-            result_str += f"\n... and {len(results) - 30} more rows"
-        
-        conn.close()
-        
-        logger.info(f"Query returned {len(results)} rows")
-        return result_str
-        
-    except sqlite3.Error as e:
-        error_msg = f"SQL Error: {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        query, note = _guard_query(query)
+        _, output = _run_query(query, _model_name(config))
+        return _with_note(note, output)
     except Exception as e:
-        error_msg = f"Execution Error: {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _format_sql_error(e)
+
+
+def _run_query(
+    query: str,
+    model_name: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> tuple[QueryResult, str]:
+    """
+    Execute a query in the calling thread, through a rollup, the columnar
+    mirror or the integer time keys when one applies.
+
+    Returns:
+        The result and the tool output the model reads
+
+    Raises:
+        Exception: Execution failures of the original query
+    """
+    rewrite = get_rollup_manager().rewrite(query)
+    if rewrite is not None:
+        try:
+            result = get_sql_engine(ROLLUP_DB_PATH).execute(
+                rewrite.sql, cancel_event=cancel_event, max_rows=MAX_DISPLAY_ROWS, summarize=RESULT_STATS_ENABLED
+            )
+            handle = _register_result(rewrite.sql, ROLLUP_DB_PATH, result)
+            return result, f"{rewrite.note}\n\n{_format_query_result(result, handle, model_name)}"
+        except sqlite3.Error as e:
+            logger.warning(f"Rollup query failed, running original query: {str(e)}")
+
+    if COLUMNAR_ENGINE_ENABLED and not (cancel_event is not None and cancel_event.is_set()):
+        result = get_columnar_engine().execute(
+            query, max_rows=MAX_DISPLAY_ROWS, summarize=RESULT_STATS_ENABLED, cancel_event=cancel_event
+        )
+        if result is not None:
+            return result, _format_query_result(result, _register_result(query, DB_PATH, result), model_name)
+
+    engine = get_sql_engine()
+    time_key_sql = get_time_key_rewriter().rewrite(query)
+    if time_key_sql is not None:
+        try:
+            result = engine.execute(
+                time_key_sql, cancel_event=cancel_event, max_rows=MAX_DISPLAY_ROWS, summarize=RESULT_STATS_ENABLED
+            )
+            return result, _format_query_result(result, _register_result(time_key_sql, DB_PATH, result), model_name)
+        except sqlite3.Error as e:
+            logger.warning(f"Time key query failed, running original query: {str(e)}")
+
+    result = engine.execute(query, cancel_event=cancel_event, max_rows=MAX_DISPLAY_ROWS, summarize=RESULT_STATS_ENABLED)
+    _advise_indexes(engine, query, result)
+    return result, _format_query_result(result, _register_result(query, DB_PATH, result), model_name)
+
+
+async def _arun_query(query: str, model_name: Optional[str] = None) -> tuple[QueryResult, str]:
+    """Run _run_query on the SQL engine worker pool; cancelling the task interrupts the query."""
+    cancel_event = threading.Event()
+    future = get_sql_engine().submit(_run_query, query, model_name, cancel_event)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+
+
+async def _aexecute_sql(
+    query: Annotated[str, "The SQLite query to execute against the olist.sqlite database"],
+    config: RunnableConfig = None
+) -> str:
+    """Async variant of execute_sql_tool that runs on the SQL engine worker pool."""
+    try:
+        logger.info(f"Executing SQL (async): {query[:100]}...")
+        query, note = await asyncio.wrap_future(get_sql_engine().submit(_guard_query, query))
+        _, output = await _arun_query(query, _model_name(config))
+        return _with_note(note, output)
+    except Exception as e:
+        return _format_sql_error(e)
+
+
+execute_sql_tool = StructuredTool.from_function(
+    func=_execute_sql,
+    coroutine=_aexecute_sql,
+    name="execute_sql_tool"
+)
 
 
 @tool
@@ -113,34 +282,12 @@ def draw_chart_tool(
         x_values = json.loads(x_data)
         y_values = json.loads(y_data)
         
-        # Create the appropriate chart
-        if chart_type.lower() == "bar":
-            fig = go.Figure(data=[go.Bar(x=x_values, y=y_values, marker_color='#2E86AB')])
-        elif chart_type.lower() == "line":
-            fig = go.Figure(data=[go.Scatter(x=x_values, y=y_values, mode='lines+markers', line=dict(color='#2E86AB', width=2))])
-        elif chart_type.lower() == "scatter":
-            fig = go.Figure(data=[go.Scatter(x=x_values, y=y_values, mode='markers', marker=dict(color='#2E86AB', size=10))])
-        elif chart_type.lower() == "pie":
-            fig = go.Figure(data=[go.Pie(labels=x_values, values=y_values)])
-        else:
-            fig = go.Figure(data=[go.Bar(x=x_values, y=y_values, marker_color='#2E86AB')])
-        
-        # Update layout
-        fig.update_layout(
-            title=dict(text=title, font=dict(size=18)),
-            xaxis_title=x_label,
-            yaxis_title=y_label,
-            template="plotly_white",
-            margin=dict(l=60, r=40, t=80, b=60)
-        )
-        
-        # Store figure in session for later display
-        # We can't display directly here because this is a sync function
-        # We'll return a marker and handle display in the streaming
-        fig_json = pio.to_json(fig)
+        # Build, downsample and store the figure; the model only sees a
+        # handle and a summary, and run_data_analyst resolves the handle
+        handle, summary = create_chart(chart_type, x_values, y_values, title, x_label, y_label)
         
-        logger.info("Chart created successfully")
-        return f"CHART_CREATED::{fig_json}"
+        logger.info(f"Chart created successfully: {handle}")
+        return format_chart_marker(handle, summary)
         
     except json.JSONDecodeError as e:
         error_msg = f"Invalid JSON data: {str(e)}. Make sure x_data and y_data are valid JSON arrays."
@@ -152,14 +299,154 @@ def draw_chart_tool(
         return error_msg
 
 
+def _chart_from_result(
+    result: QueryResult,
+    chart_type: str,
+    x_column: str,
+    y_column: str,
+    title: str,
+    x_label: str,
+    y_label: str,
+    aggregate: str
+) -> str:
+    """Build a chart from a full query result and return the tool output."""
+    if not result.rows:
+        return "Chart error: the result has no rows to plot."
+    x_values = column_values(result.columns, result.rows, x_column)
+    y_values = column_values(result.columns, result.rows, y_column) if aggregate != "count" else x_values
+    handle, summary = create_chart(
+        chart_type, x_values, y_values, title,
+        x_label or x_column, y_label or y_column, aggregate=aggregate
+    )
+    if result.truncated:
+        summary += f" Only the first {len(result.rows)} rows were loaded."
+    return format_chart_marker(handle, summary)
+
+
+def _draw_chart_from_result(
+    result_handle: Annotated[str, "Result handle returned by execute_sql_tool, e.g. 'result_1a2b3c4d5e'"],
+    chart_type: Annotated[str, "Type of chart: bar, line, scatter, pie"],
+    x_column: Annotated[str, "Result column for the x-axis (or pie labels)"],
+    y_column: Annotated[str, "Numeric result column for the y-axis (or pie values)"],
+    title: Annotated[str, "Chart title"],
+    x_label: Annotated[str, "X-axis label (defaults to the column name)"] = "",
+    y_label: Annotated[str, "Y-axis label (defaults to the column name)"] = "",
+    aggregate: Annotated[str, "Optional aggregation of y per x value: sum, mean, count, min, max"] = ""
+) -> str:
+    """
+    Create and display a chart from ALL rows of an execute_sql_tool result.
+    
+    Prefer this over draw_chart_tool: pass the result handle and column names
+    instead of copying values. Large series are downsampled server-side.
+    
+    Example: draw_chart_from_result_tool("result_1a2b3c4d5e", "line", "month", "revenue", "Monthly Revenue")
+    """
+    try:
+        ref = get_result_handles().get(result_handle)
+        if ref is None:
+            return f"Unknown result handle '{result_handle}'. Run execute_sql_tool again and use the handle it returns."
+        logger.info(f"Creating {chart_type} chart from {ref.handle}: {title}")
+        result = get_sql_engine(ref.db_path).execute(ref.query, max_rows=CHART_MAX_ROWS)
+        return _chart_from_result(
+            result, chart_type, x_column, y_column, title, x_label, y_label, aggregate.lower().strip()
+        )
+    except Exception as e:
+        error_msg = f"Chart error: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+async def _adraw_chart_from_result(
+    result_handle: Annotated[str, "Result handle returned by execute_sql_tool, e.g. 'result_1a2b3c4d5e'"],
+    chart_type: Annotated[str, "Type of chart: bar, line, scatter, pie"],
+    x_column: Annotated[str, "Result column for the x-axis (or pie labels)"],
+    y_column: Annotated[str, "Numeric result column for the y-axis (or pie values)"],
+    title: Annotated[str, "Chart title"],
+    x_label: Annotated[str, "X-axis label (defaults to the column name)"] = "",
+    y_label: Annotated[str, "Y-axis label (defaults to the column name)"] = "",
+    aggregate: Annotated[str, "Optional aggregation of y per x value: sum, mean, count, min, max"] = ""
+) -> str:
+    """Async variant of draw_chart_from_result_tool; SQL and NumPy work run on the engine workers."""
+    try:
+        ref = get_result_handles().get(result_handle)
+        if ref is None:
+            return f"Unknown result handle '{result_handle}'. Run execute_sql_tool again and use the handle it returns."
+        logger.info(f"Creating {chart_type} chart from {ref.handle}: {title}")
+        engine = get_sql_engine(ref.db_path)
+        result = await engine.aexecute(ref.query, max_rows=CHART_MAX_ROWS)
+        return await asyncio.wrap_future(engine.submit(partial(
+            _chart_from_result,
+            result, chart_type, x_column, y_column, title, x_label, y_label, aggregate.lower().strip()
+        )))
+    except Exception as e:
+        error_msg = f"Chart error: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+draw_chart_from_result_tool = StructuredTool.from_function(
+    func=_draw_chart_from_result,
+    coroutine=_adraw_chart_from_result,
+    name="draw_chart_from_result_tool"
+)
+
+
 # List of all tools
-ALL_TOOLS = [execute_sql_tool, draw_chart_tool]
+ALL_TOOLS = [execute_sql_tool, draw_chart_from_result_tool, draw_chart_tool]
+
+# Tools whose output carries a chart handle
+CHART_TOOL_NAMES = {"draw_chart_tool", "draw_chart_from_result_tool"}
 
 
 # ================================================================================
 # Agent Nodes
 # ================================================================================
 
+@lru_cache(maxsize=1)
+def _full_prompt_tokens() -> int:
+    return estimate_tokens(get_data_analyst_system_prompt())
+
+
+@lru_cache(maxsize=128)
+def _prompt_for_schema(schema: str) -> tuple[str, int]:
+    """Build (and count) the system prompt for a schema slice; reused across loop iterations."""
+    prompt = build_data_analyst_prompt(schema)
+    return prompt, estimate_tokens(prompt)
+
+
+def _build_system_prompt(messages: list) -> str:
+    """
+    Assemble the system prompt from the core instructions and the schema of
+    the tables relevant to the latest user question.
+    """
+    if not RETRIEVAL_ENABLED:
+        return get_data_analyst_system_prompt()
+    
+    retriever = get_schema_retriever()
+    questions = [
+        m.content for m in reversed(messages)
+        if isinstance(m, HumanMessage) and isinstance(m.content, str)
+    ]
+    
+    # Follow-ups ("only for the top 5 categories") keep the tables of the questions they refine
+    selection = retriever.merge([
+        retriever.retrieve(question) for question in questions[:SCHEMA_LOOKBACK_MESSAGES] or [""]
+    ])
+    
+    prompt, tokens = _prompt_for_schema(selection.schema)
+    logger.info(
+        f"Schema retrieval selected {len(selection.tables)} tables ({', '.join(selection.tables)}): "
+        f"system prompt {_full_prompt_tokens()} -> {tokens} tokens"
+    )
+    return prompt
+
+
+async def compact_history_node(state: MessagesState, config: RunnableConfig):
+    """Trim old tool outputs and drop the oldest turns before the model sees the history."""
+    updates = compact_messages(state["messages"])
+    return {"messages": updates} if updates else {}
+
+
 async def analyst_node(state: MessagesState, config: RunnableConfig):
     """Main analyst node - calls the LLM with tools."""
     logger.info("Analyst node processing...")
@@ -167,15 +454,48 @@ async def analyst_node(state: MessagesState, config: RunnableConfig):
     response = await call_model(
         state,
         config,
-        system_message=DATA_ANALYST_SYSTEM_PROMPT,
+        system_message=_build_system_prompt(state["messages"]),
         tools=ALL_TOOLS
     )
     
     return {"messages": [response]}
 
 
+async def _execute_tool_call(tool_call: dict) -> ToolMessage:
+    """Run a single tool call and wrap the outcome in a ToolMessage."""
+    tool_name = tool_call.get("name", "")
+    tool_args = tool_call.get("args", {})
+    tool_id = tool_call.get("id", "")
+    
+    logger.info(f"Executing tool: {tool_name} with args: {str(tool_args)[:100]}")
+    
+    try:
+        if tool_name == "execute_sql_tool":
+            result = await execute_sql_tool.ainvoke(tool_args)
+        elif tool_name == "draw_chart_tool":
+            result = await draw_chart_tool.ainvoke(tool_args)
+        elif tool_name == "draw_chart_from_result_tool":
+            result = await draw_chart_from_result_tool.ainvoke(tool_args)
+        else:
+            result = f"Unknown tool: {tool_name}"
+        
+        logger.info(f"Tool {tool_name} completed successfully")
+        return ToolMessage(content=result, tool_call_id=tool_id)
+        
+    except Exception as e:
+        error_result = f"Tool execution error: {str(e)}"
+        logger.error(error_result)
+        return ToolMessage(content=error_result, tool_call_id=tool_id)
+
+
 async def tool_executor_node(state: MessagesState, config: RunnableConfig):
-    """Execute tools and return results."""
+    """
+    Execute tools and return results.
+    
+    Tool calls from one model turn cannot depend on each other, so they are
+    dispatched concurrently. gather preserves order, so the ToolMessages line
+    up with the original tool_calls.
+    """
     logger.info("Tool executor node processing...")
     
     messages = state["messages"]
@@ -184,28 +504,12 @@ async def tool_executor_node(state: MessagesState, config: RunnableConfig):
     tool_results = []
     
     if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-        for tool_call in last_message.tool_calls:
-            tool_name = tool_call.get("name", "")
-            tool_args = tool_call.get("args", {})
-            tool_id = tool_call.get("id", "")
-            
-            logger.info(f"Executing tool: {tool_name} with args: {str(tool_args)[:100]}")
-            
-            try:
-                if tool_name == "execute_sql_tool":
-                    result = execute_sql_tool.invoke(tool_args)
-                elif tool_name == "draw_chart_tool":
-                    result = draw_chart_tool.invoke(tool_args)
-                else:
-                    result = f"Unknown tool: {tool_name}"
-                
-                tool_results.append(ToolMessage(content=result, tool_call_id=tool_id))
-                logger.info(f"Tool {tool_name} completed successfully")
-                
-            except Exception as e:
-                error_result = f"Tool execution error: {str(e)}"
-                logger.error(error_result)
-                tool_results.append(ToolMessage(content=error_result, tool_call_id=tool_id))
+        tool_calls = last_message.tool_calls
+        if len(tool_calls) > 1:
+            logger.info(f"Dispatching {len(tool_calls)} tool calls concurrently")
+        tool_results = list(await asyncio.gather(
+            *(_execute_tool_call(tool_call) for tool_call in tool_calls)
+        ))
     
     return {"messages": tool_results}
 
@@ -238,17 +542,19 @@ def create_data_analyst_workflow(checkpointer=None):
     workflow = StateGraph(MessagesState)
     
     # Add nodes
+    workflow.add_node("compact", compact_history_node)
     workflow.add_node("analyst", analyst_node)
     workflow.add_node("tools", tool_executor_node)
     
     # Add edges
-    workflow.add_edge(START, "analyst")
+    workflow.add_edge(START, "compact")
+    workflow.add_edge("compact", "analyst")
     workflow.add_conditional_edges("analyst", should_continue, {"tools": "tools", "end": END})
     workflow.add_edge("tools", "analyst")
     
     # Compile
     if checkpointer is None:
-        checkpointer = MemorySaver()
+        checkpointer = MemorySaver() if CHECKPOINT_BACKEND == "memory" else get_checkpointer()
     
     compiled = workflow.compile(checkpointer=checkpointer)
     
@@ -260,17 +566,326 @@ def create_data_analyst_workflow(checkpointer=None):
 # Agent Runner
 # ================================================================================
 
+async def _chart_element(chart):
+    """
+    Chainlit element for a stored chart: interactive Plotly by default, or a
+    cached kaleido render when CHART_RENDER_MODE is png or svg.
+    """
+    if CHART_RENDER_MODE in ("png", "svg"):
+        try:
+            image = await asyncio.to_thread(render_static, chart.handle, CHART_RENDER_MODE)
+            mime = "image/png" if CHART_RENDER_MODE == "png" else "image/svg+xml"
+            return cl.Image(name="chart", content=image, mime=mime, display="inline", size="large")
+        except Exception as e:
+            logger.warning(f"Static chart render failed, sending interactive chart: {str(e)}")
+    return cl.Plotly(name="chart", figure=chart.figure, display="inline", size="large")
+
+
+@dataclass
+class TurnRecord:
+    """What one turn streamed and added to the conversation, kept for the answer cache."""
+    parts: list[Any] = field(default_factory=list)
+    """Streamed text chunks and displayed ChartArtifacts, in order."""
+    messages: list = field(default_factory=list)
+    answered: bool = False
+    """A query returned rows and the turn finished without errors."""
+
+
+async def _send_chart(chart: ChartArtifact):
+    """Display a chart in Chainlit."""
+    elements = [await _chart_element(chart)]
+    await cl.Message(content="**📊 Visualization**", elements=elements).send()
+
+
+async def _show_chart(tool_output: str, record: Optional[TurnRecord] = None) -> str:
+    """Send the chart behind a chart tool output to the UI; returns the status line to stream."""
+    try:
+        chart = get_chart_store().resolve(tool_output)
+        if chart is None:
+            raise ValueError("chart is no longer available")
+
+        await _send_chart(chart)
+        if record is not None:
+            record.parts.append(chart)
+
+        return "\n✅ Chart displayed above.\n"
+    except Exception as e:
+        logger.error(f"Failed to display chart: {e}")
+        return f"\n⚠️ Chart creation failed: {e}\n"
+
+
+# ================================================================================
+# Template Fast Path
+# ================================================================================
+
+def _result_handle(tool_output: str) -> Optional[str]:
+    for line in tool_output.splitlines():
+        if line.startswith(RESULT_HANDLE_PREFIX):
+            return line[len(RESULT_HANDLE_PREFIX):].strip()
+    return None
+
+
+def _markdown_table(result: QueryResult) -> str:
+    """Render the displayed rows of a result as a Markdown table."""
+    if not result.rows:
+        return "No data found for this query."
+    lines = [
+        "| " + " | ".join(result.columns) + " |",
+        "|" + "---|" * len(result.columns),
+    ]
+    for row in result.rows:
+        lines.append("| " + " | ".join("" if value is None else str(value) for value in row) + " |")
+    if result.truncated:
+        total = result.row_count if result.total_is_exact else f"more than {result.row_count}"
+        lines.append(f"\nShowing {len(result.rows)} of {total} rows.")
+    return "\n".join(lines)
+
+
+def _tool_call(name: str, args: dict) -> dict:
+    return {"name": name, "args": args, "id": f"call_template_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+
+
+async def _stream_insight(question: str, sql_output: str, model_name: str):
+    """Ask the model for the insight text only: no tools, the results are in the prompt."""
+    chat_model = get_model_registry().get(model_name, get_model_config(model_name))
+    messages = [
+        SystemMessage(content=TEMPLATE_INSIGHT_PROMPT),
+        HumanMessage(content=f"Question: {question}\n\n{sql_output}"),
+    ]
+    async for chunk in chat_model.astream(messages):
+        content = chunk.content
+        if isinstance(content, str):
+            if content:
+                yield content
+        elif isinstance(content, list):
+            for item in content:
+                if isinstance(item, dict) and "text" in item:
+                    yield item["text"]
+                elif isinstance(item, str):
+                    yield item
+
+
+async def _answer_from_template(
+    question: str,
+    match: TemplateMatch,
+    result: QueryResult,
+    sql_output: str,
+    model_name: str,
+    config: dict,
+    record: TurnRecord
+):
+    """
+    Stream the answer for a question served by a verified SQL template.
+
+    The exchange is written to the conversation state as the tool calls the
+    agent would have made, so follow-up questions can build on it.
+    """
+    yield f"\n\n**🔍 Executing SQL Query:**\n```sql\n{match.sql}\n```\n"
+
+    sql_call = _tool_call("execute_sql_tool", {"query": match.sql})
+    history = [
+        HumanMessage(content=question),
+        AIMessage(content="", tool_calls=[sql_call]),
+        ToolMessage(content=sql_output, tool_call_id=sql_call["id"]),
+    ]
+
+    handle = _result_handle(sql_output)
+    if match.chart is not None and handle is not None:
+        yield "\n\n**📊 Creating visualization...**\n"
+        chart_args = {"result_handle": handle, **match.chart}
+        chart_output = await _adraw_chart_from_result(**chart_args)
+        chart_call = _tool_call("draw_chart_from_result_tool", chart_args)
+        history.append(AIMessage(content="", tool_calls=[chart_call]))
+        history.append(ToolMessage(content=chart_output, tool_call_id=chart_call["id"]))
+        if CHART_MARKER in chart_output:
+            yield await _show_chart(chart_output, record)
+        else:
+            yield f"\n⚠️ {chart_output}\n"
+
+    answer = ""
+    if TEMPLATE_INSIGHT == "llm":
+        try:
+            async for text in _stream_insight(question, sql_output, model_name):
+                answer += text
+                yield text
+        except Exception as e:
+            logger.warning(f"Insight generation failed, showing the results table: {str(e)}")
+    if not answer:
+        answer = f"\n\n**📋 Results:**\n\n{_markdown_table(result)}\n"
+        yield answer
+    history.append(AIMessage(content=answer))
+    record.messages = history
+    record.answered = handle is not None
+
+    try:
+        await get_workflow().aupdate_state(config, {"messages": history}, as_node="analyst")
+    except Exception as e:
+        logger.warning(f"Could not record the template answer in the conversation: {str(e)}")
+
+
+async def _match_template(question: str, model_name: str) -> Optional[tuple[TemplateMatch, QueryResult, str]]:
+    """
+    Execute the verified template for a question, if any.
+
+    Template SQL goes through the query guard like any other query; templates
+    the guard would limit or reject, and failing ones, are discarded.
+    """
+    if not TEMPLATES_ENABLED:
+        return None
+    library = get_template_library()
+    match = library.match(question)
+    if match is None:
+        return None
+    try:
+        query, note = await asyncio.wrap_future(get_sql_engine().submit(_guard_query, match.sql))
+        if note is not None:
+            raise QueryRejectedError(note)
+        result, sql_output = await _arun_query(query, model_name)
+    except Exception as e:
+        logger.warning(f"Template query failed, running the agent: {str(e)}")
+        library.discard(match)
+        return None
+    library.record_hit(match)
+    logger.info(f"Answering from SQL template '{match.pattern}' ({match.confirmations} confirmations)")
+    return match, result, sql_output
+
+
+def _learn_template(question: str, sql_calls: list[tuple[str, str]], chart_calls: list[tuple[str, dict, str]]):
+    """
+    Offer a finished agent run to the template library.
+
+    Only runs that answered with one successful query returning rows, and at
+    most one chart built from its result handle, are templated.
+    """
+    succeeded = [(query, output) for query, output in sql_calls if RESULT_HANDLE_PREFIX in output]
+    if len(succeeded) != 1 or len(chart_calls) > 1:
+        return
+    chart = None
+    if chart_calls:
+        name, args, output = chart_calls[0]
+        if name != "draw_chart_from_result_tool" or CHART_MARKER not in output:
+            return
+        chart = args
+    get_template_library().learn(question, succeeded[0][0], chart)
+
+
 _workflow = None
+_workflow_lock = threading.Lock()
 
 
 def get_workflow():
     """Get or create the workflow singleton."""
     global _workflow
     if _workflow is None:
-        _workflow = create_data_analyst_workflow()
+        # Startup warm-up builds it in a background thread while requests may arrive
+        with _workflow_lock:
+            if _workflow is None:
+                _workflow = create_data_analyst_workflow()
     return _workflow
 
 
+async def _replay_answer(cached: TurnRecord, config: dict):
+    """Stream a cached turn and add its messages to this conversation."""
+    for part in cached.parts:
+        if isinstance(part, ChartArtifact):
+            try:
+                await _send_chart(part)
+            except Exception as e:
+                logger.error(f"Failed to display cached chart: {e}")
+        else:
+            yield part
+
+    # Fresh ids: the add_messages reducer would replace messages with matching ids
+    messages = [message.model_copy(update={"id": None}) for message in cached.messages]
+    try:
+        await get_workflow().aupdate_state(config, {"messages": messages}, as_node="analyst")
+    except Exception as e:
+        logger.warning(f"Could not record the cached answer in the conversation: {str(e)}")
+
+
+async def _turn_messages(workflow, config: dict) -> list:
+    """Messages the latest turn added to the conversation, starting at its question."""
+    messages = (await workflow.aget_state(config)).values.get("messages", [])
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return list(messages[index:])
+    return []
+
+
+async def _run_agent(question: str, model_name: str, config: dict, record: TurnRecord, first_turn: bool):
+    """Answer one question with the workflow, or a verified SQL template when an opening question matches one."""
+    served = await _match_template(question, model_name) if first_turn else None
+    if served is not None:
+        match, result, sql_output = served
+        async for chunk in _answer_from_template(question, match, result, sql_output, model_name, config, record):
+            yield chunk
+        logger.info("Data analyst completed from a SQL template")
+        return
+
+    workflow = get_workflow()
+    input_messages = {"messages": [HumanMessage(content=question)]}
+    sql_calls: list[tuple[str, str]] = []
+    chart_calls: list[tuple[str, dict, str]] = []
+
+    # Track what we've shown
+    shown_sql = False
+    
+    async for event in workflow.astream_events(input_messages, config=config, version="v2"):
+        event_type = event.get("event", "")
+        
+        # Stream LLM tokens
+        if event_type == "on_chat_model_stream":
+            chunk = event.get("data", {}).get("chunk")
+            if chunk and hasattr(chunk, "content") and chunk.content:
+                content = chunk.content
+                if isinstance(content, str):
+                    yield content
+                elif isinstance(content, list):
+                    for item in content:
+                        if isinstance(item, dict) and "text" in item:
+                            yield item["text"]
+                        elif isinstance(item, str):
+                            yield item
+        
+        # Show when SQL is being executed
+        elif event_type == "on_tool_start":
+            tool_name = event.get("name", "")
+            tool_input = event.get("data", {}).get("input", {})
+            
+            if tool_name == "execute_sql_tool" and not shown_sql:
+                query = tool_input.get("query", "")
+                if query:
+                    yield f"\n\n**🔍 Executing SQL Query:**\n```sql\n{query}\n```\n"
+                    shown_sql = True
+            
+            elif tool_name in CHART_TOOL_NAMES:
+                yield "\n\n**📊 Creating visualization...**\n"
+        
+        # Handle tool results
+        elif event_type == "on_tool_end":
+            tool_name = event.get("name", "")
+            tool_output = event.get("data", {}).get("output", "")
+            tool_input = event.get("data", {}).get("input", {}) or {}
+            
+            if tool_name == "execute_sql_tool":
+                sql_calls.append((tool_input.get("query", ""), str(tool_output)))
+            elif tool_name in CHART_TOOL_NAMES:
+                chart_calls.append((tool_name, dict(tool_input), str(tool_output)))
+            
+            # Check if chart was created
+            if tool_name in CHART_TOOL_NAMES and CHART_MARKER in str(tool_output):
+                yield await _show_chart(tool_output, record)
+    
+    record.answered = any(RESULT_HANDLE_PREFIX in output for _, output in sql_calls)
+    # An answer built on a result the guard cut short is neither cached nor templated
+    limited = any(output.startswith(LIMIT_NOTE_PREFIX) for _, output in sql_calls)
+    if first_turn and ANSWER_CACHE_ENABLED and record.answered and not limited:
+        record.messages = await _turn_messages(workflow, config)
+    if first_turn and TEMPLATES_ENABLED and not limited:
+        _learn_template(question, sql_calls, chart_calls)
+    logger.info("Data analyst completed")
+
+
 async def run_data_analyst(
     question: str,
     model_name: str = "ollama:llama3.1:8b",
@@ -279,11 +894,12 @@ async def run_data_analyst(
     """
     Run the data analyst agent on a user question.
     Yields chunks for streaming and handles chart display.
+
+    Answers to opening questions are cached; an equivalent opening question
+    asked later (in any conversation) replays the cached text and charts.
     """
     logger.info(f"Running data analyst: model={model_name}, thread={thread_id}")
     
-    workflow = get_workflow()
-    
     config = {
         "configurable": {
             "model_name": model_name,
@@ -291,65 +907,28 @@ async def run_data_analyst(
         }
     }
     
-    input_messages = {"messages": [HumanMessage(content=question)]}
-    
     try:
-        # Track what we've shown
-        shown_sql = False
-        pending_chart = None
-        
-        async for event in workflow.astream_events(input_messages, config=config, version="v2"):
-            event_type = event.get("event", "")
-            
-            # Stream LLM tokens
-            if event_type == "on_chat_model_stream":
-                chunk = event.get("data", {}).get("chunk")
-                if chunk and hasattr(chunk, "content") and chunk.content:
-                    content = chunk.content
-                    if isinstance(content, str):
-                        yield content
-                    elif isinstance(content, list):
-                        for item in content:
-                            if isinstance(item, dict) and "text" in item:
-                                yield item["text"]
-                            elif isinstance(item, str):
-                                yield item
-            
-            # Show when SQL is being executed
-            elif event_type == "on_tool_start":
-                tool_name = event.get("name", "")
-                tool_input = event.get("data", {}).get("input", {})
-                
-                if tool_name == "execute_sql_tool" and not shown_sql:
-                    query = tool_input.get("query", "")
-                    if query:
-                        yield f"\n\n**🔍 Executing SQL Query:**\n```sql\n{query}\n```\n"
-                        shown_sql = True
-                
-                elif tool_name == "draw_chart_tool":
-                    yield "\n\n**📊 Creating visualization...**\n"
-            
-            # Handle tool results
-            elif event_type == "on_tool_end":
-                tool_name = event.get("name", "")
-                tool_output = event.get("data", {}).get("output", "")
-                
-                # Check if chart was created
-                if tool_name == "draw_chart_tool" and "CHART_CREATED::" in str(tool_output):
-                    try:
-                        fig_json = str(tool_output).split("CHART_CREATED::")[1]
-                        fig = pio.from_json(fig_json)
-                        
-                        # Display chart in Chainlit
-                        elements = [cl.Plotly(name="chart", figure=fig, display="inline", size="large")]
-                        await cl.Message(content="**📊 Visualization**", elements=elements).send()
-                        
-                        yield "\n✅ Chart displayed above.\n"
-                    except Exception as e:
-                        logger.error(f"Failed to display chart: {e}")
-                        yield f"\n⚠️ Chart creation failed: {e}\n"
-        
-        logger.info("Data analyst completed")
+        cache = get_answer_cache(DB_PATH) if ANSWER_CACHE_ENABLED else None
+
+        # Only opening questions are cached and templated; follow-ups may depend on earlier turns
+        first_turn = False
+        if cache is not None or TEMPLATES_ENABLED:
+            first_turn = not (await get_workflow().aget_state(config)).values.get("messages")
+
+        cached = cache.get(question, model_name) if cache is not None and first_turn else None
+        if cached is not None:
+            async for chunk in _replay_answer(cached.value, config):
+                yield chunk
+            logger.info("Data analyst completed from the answer cache")
+            return
+
+        record = TurnRecord()
+        async for chunk in _run_agent(question, model_name, config, record, first_turn):
+            record.parts.append(chunk)
+            yield chunk
+
+        if cache is not None and first_turn and record.answered and record.messages:
+            cache.put(question, model_name, record)
         
     except Exception as e:
         error_msg = f"\n\n❌ Error: {str(e)}"
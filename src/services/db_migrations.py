@@ -0,0 +1,78 @@
+"""
+One-time migrations that add derived structures (indexes, helper tables)
+to data/olist.sqlite.
+
+The agent only ever opens the database read-only, so migrations run from
+the command line:
+
+    python -m src.services.db_migrations
+"""
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Callable
+from src.services.sql_engine import DB_PATH
+from src.services.index_advisor import create_recommended_indexes
+from src.services.time_keys import create_time_keys
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+
+# ================================================================================
+# Migration Registry
+# ================================================================================
+
+# (version, description, function) - applied in order, tracked in PRAGMA user_version
+MIGRATIONS: list[tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "Indexes for documented join paths and purchase date filters", create_recommended_indexes),
+    (2, "Integer time keys for orders timestamps", create_time_keys),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the migration version recorded in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(db_path: Path = DB_PATH) -> int:
+    """
+    Apply every pending migration to the database.
+
+    Args:
+        db_path: Path to the SQLite database file
+
+    Returns:
+        The schema version after migrating
+    """
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"Database not found at {db_path}")
+
+    conn = sqlite3.connect(str(db_path))
+    try:
+        version = get_schema_version(conn)
+        pending = [m for m in MIGRATIONS if m[0] > version]
+        if not pending:
+            logger.info(f"Database {db_path.name} is up to date (version {version})")
+            return version
+
+        for target, description, migrate in pending:
+            logger.info(f"Applying migration {target}: {description}")
+            with conn:
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {int(target)}")
+            version = target
+
+        # Refresh planner statistics so the new structures get used
+        conn.execute("ANALYZE")
+        conn.commit()
+        logger.info(f"Database {db_path.name} migrated to version {version}")
+        return version
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else DB_PATH
+    print(f"Schema version: {run_migrations(path)}")
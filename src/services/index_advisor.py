@@ -0,0 +1,269 @@
+"""
+Index management for the Olist database.
+Defines the recommended indexes for the documented join paths and learns
+missing ones from the query plans of queries the agent executes.
+"""
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from src.utils.db_pool import get_connection_pool
+from src.utils.query_cache import normalize_sql
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# Create advised indexes automatically once a suggestion was seen this often (0 = never)
+AUTO_CREATE_THRESHOLD = int(os.environ.get("INDEX_ADVISOR_AUTO_CREATE", "0"))
+
+# Distinct queries remembered for plan analysis
+MAX_OBSERVED_QUERIES = 2048
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """A single-table index definition."""
+    table: str
+    columns: tuple[str, ...]
+    index_name: str = ""
+
+    @property
+    def name(self) -> str:
+        return self.index_name or f"idx_{self.table}_{'_'.join(self.columns)}"
+
+    def create_sql(self) -> str:
+        columns = ", ".join(self.columns)
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({columns})"
+
+
+# ================================================================================
+# Recommended Indexes
+# ================================================================================
+
+# Follows "Key Table Relationships" in the system prompt. Trailing columns make
+# the indexes covering for the usual revenue / state / category aggregates.
+RECOMMENDED_INDEXES = [
+    IndexSpec("orders", ("order_id", "customer_id", "order_purchase_timestamp"), "idx_orders_order_id"),
+    IndexSpec("orders", ("customer_id",), "idx_orders_customer_id"),
+    IndexSpec("orders", ("order_purchase_timestamp", "order_id", "customer_id", "order_status"), "idx_orders_purchase_ts"),
+    IndexSpec("order_items", ("order_id", "product_id", "seller_id", "price", "freight_value"), "idx_order_items_order_id"),
+    IndexSpec("order_items", ("product_id",), "idx_order_items_product_id"),
+    IndexSpec("order_items", ("seller_id",), "idx_order_items_seller_id"),
+    IndexSpec("order_payments", ("order_id", "payment_type", "payment_value"), "idx_order_payments_order_id"),
+    IndexSpec("order_reviews", ("order_id", "review_score"), "idx_order_reviews_order_id"),
+    IndexSpec("customers", ("customer_id", "customer_state", "customer_city"), "idx_customers_customer_id"),
+    IndexSpec("customers", ("customer_unique_id",), "idx_customers_unique_id"),
+    IndexSpec("products", ("product_id", "product_category_name"), "idx_products_product_id"),
+    IndexSpec("sellers", ("seller_id", "seller_state", "seller_city"), "idx_sellers_seller_id"),
+    IndexSpec("product_category_name_translation", ("product_category_name", "product_category_name_english"), "idx_category_translation_name"),
+    IndexSpec("geolocation", ("geolocation_zip_code_prefix",), "idx_geolocation_zip_code_prefix"),
+]
+
+
+def _existing_tables(conn: sqlite3.Connection) -> set[str]:
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    return {row[0].lower() for row in rows}
+
+
+def create_indexes(conn: sqlite3.Connection, specs: list[IndexSpec]) -> list[str]:
+    """
+    Create indexes on a writable connection, skipping tables that do not exist.
+
+    Returns:
+        Names of the indexes that were requested
+    """
+    tables = _existing_tables(conn)
+    created = []
+    for spec in specs:
+        if spec.table.lower() not in tables:
+            logger.warning(f"Skipping index {spec.name}: table {spec.table} not found")
+            continue
+        logger.info(f"Creating index {spec.name}")
+        conn.execute(spec.create_sql())
+        created.append(spec.name)
+    return created
+
+
+def create_recommended_indexes(conn: sqlite3.Connection):
+    """Migration: build the recommended join-path and date-filter indexes."""
+    create_indexes(conn, RECOMMENDED_INDEXES)
+
+
+# ================================================================================
+# Query Plan Advisor
+# ================================================================================
+
+# SEARCH oi USING AUTOMATIC [PARTIAL] COVERING INDEX (order_id=?)
+_AUTOMATIC_INDEX = re.compile(
+    r"^SEARCH (?P<alias>\S+) USING AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \((?P<terms>[^)]*)\)"
+)
+# BLOOM FILTER ON oi (order_id=?)
+_BLOOM_FILTER = re.compile(r"^BLOOM FILTER ON (?P<alias>\S+) \((?P<terms>[^)]*)\)")
+_FULL_SCAN = re.compile(r"^SCAN (?P<alias>\S+)(?: USING| VIRTUAL|$)")
+# FROM orders o / JOIN order_items AS oi
+_TABLE_REFERENCE = re.compile(
+    r"\b(?:from|join)\s+([A-Za-z_][A-Za-z0-9_]*)(?:\s+(?:as\s+)?([A-Za-z_][A-Za-z0-9_]*))?",
+    re.IGNORECASE
+)
+_NOT_ALIASES = {"where", "join", "on", "group", "order", "limit", "left", "inner", "cross", "natural", "using", "union"}
+
+
+def _alias_map(query: str) -> dict[str, str]:
+    """Map table aliases (and bare table names) in a query to table names."""
+    aliases = {}
+    for table, alias in _TABLE_REFERENCE.findall(query):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in _NOT_ALIASES:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def _plan_columns(terms: str) -> tuple[str, ...]:
+    """Extract column names from a plan term list like 'a=? AND b>?'."""
+    return tuple(re.findall(r"([A-Za-z_][A-Za-z0-9_]*)\s*[=<>]", terms))
+
+
+class IndexAdvisor:
+    """
+    Collects EXPLAIN QUERY PLAN output for executed queries and tracks the
+    indexes SQLite had to build on the fly (automatic indexes and bloom
+    filters), which are the missing indexes for those queries.
+    """
+
+    def __init__(self, db_path: Path, auto_create_threshold: int = AUTO_CREATE_THRESHOLD):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            auto_create_threshold: Create an advised index after this many sightings (0 disables)
+        """
+        self.db_path = Path(db_path)
+        self.auto_create_threshold = auto_create_threshold
+        self._lock = threading.Lock()
+        self._seen: set[str] = set()
+        self._suggestions: Counter[IndexSpec] = Counter()
+        self._full_scans: Counter[str] = Counter()
+        self._created: set[IndexSpec] = set()
+
+    def explain(self, query: str) -> list[str]:
+        """Return the EXPLAIN QUERY PLAN detail lines for a query."""
+        with get_connection_pool(self.db_path).connection() as conn:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        return [row[3] for row in rows]
+
+    def observe(self, query: str) -> list[IndexSpec]:
+        """
+        Analyse the plan of an executed query and record missing indexes.
+
+        Each distinct (normalized) query is explained once.
+
+        Returns:
+            Index suggestions derived from this query's plan
+        """
+        key = normalize_sql(query)
+        with self._lock:
+            if key in self._seen:
+                return []
+            if len(self._seen) >= MAX_OBSERVED_QUERIES:
+                self._seen.clear()
+            self._seen.add(key)
+
+        try:
+            plan = self.explain(query)
+        except sqlite3.Error as e:
+            logger.debug(f"Could not explain query for index advice: {str(e)}")
+            return []
+
+        aliases = _alias_map(query)
+        suggestions = []
+        scans = []
+        for detail in plan:
+            match = _AUTOMATIC_INDEX.match(detail) or _BLOOM_FILTER.match(detail)
+            if match:
+                table = aliases.get(match.group("alias").lower())
+                columns = _plan_columns(match.group("terms"))
+                if table and columns:
+                    suggestions.append(IndexSpec(table, columns))
+                continue
+            scan = _FULL_SCAN.match(detail)
+            if scan:
+                table = aliases.get(scan.group("alias").lower())
+                if table:
+                    scans.append(table)
+
+        to_create = []
+        with self._lock:
+            self._full_scans.update(scans)
+            for spec in suggestions:
+                self._suggestions[spec] += 1
+                count = self._suggestions[spec]
+                if (self.auto_create_threshold and count >= self.auto_create_threshold
+                        and spec not in self._created):
+                    self._created.add(spec)
+                    to_create.append(spec)
+
+        for spec in suggestions:
+            logger.info(f"Index advisor: query would benefit from {spec.create_sql()}")
+        if to_create:
+            self.apply(to_create)
+        return suggestions
+
+    def suggestions(self, min_count: int = 1) -> list[tuple[IndexSpec, int]]:
+        """Return advised indexes seen at least min_count times, most frequent first."""
+        with self._lock:
+            return [(spec, count) for spec, count in self._suggestions.most_common() if count >= min_count]
+
+    def full_scans(self) -> list[tuple[str, int]]:
+        """Return tables scanned in full by observed queries, most frequent first."""
+        with self._lock:
+            return self._full_scans.most_common()
+
+    def apply(self, specs: Optional[list[IndexSpec]] = None) -> list[str]:
+        """
+        Create advised indexes on a separate writable connection.
+
+        Args:
+            specs: Indexes to create (defaults to every current suggestion)
+
+        Returns:
+            Names of the created indexes
+        """
+        if specs is None:
+            specs = [spec for spec, _ in self.suggestions()]
+        if not specs:
+            return []
+
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        try:
+            with conn:
+                created = create_indexes(conn, specs)
+            conn.execute("ANALYZE")
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to create advised indexes: {str(e)}")
+            return []
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._created.update(specs)
+        logger.info(f"Index advisor created indexes: {', '.join(created)}")
+        return created
+
+
+_advisors: dict[Path, IndexAdvisor] = {}
+_advisors_lock = threading.Lock()
+
+
+def get_index_advisor(db_path: Path) -> IndexAdvisor:
+    """Get or create the process-wide index advisor for a database file."""
+    key = Path(db_path).resolve()
+    with _advisors_lock:
+        advisor = _advisors.get(key)
+        if advisor is None:
+            advisor = IndexAdvisor(key)
+            _advisors[key] = advisor
+        return advisor
@@ -0,0 +1,111 @@
+"""
+Handles for executed SQL results.
+
+execute_sql_tool only shows the model a few rows. A result handle names the
+full result (the executed query and the database it ran on) so chart tools
+can load every row server-side instead of having the model copy numbers into
+tool arguments.
+
+With several app workers, handles are also written to the shared state store
+so a follow-up question served by another worker can still resolve them.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from src.utils.query_cache import normalize_sql
+from src.utils.shared_state import SharedStore, get_shared_store, shared_state_enabled
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+MAX_HANDLES = int(os.environ.get("RESULT_HANDLES_MAX", "1024"))
+
+# Namespace of handles in the shared state store
+SHARED_NAMESPACE = "result_handles"
+
+
+@dataclass(frozen=True)
+class ResultRef:
+    """What a result handle points at."""
+    handle: str
+    query: str
+    db_path: Path
+    columns: tuple[str, ...]
+    total_rows: int
+
+
+class ResultHandleStore:
+    """
+    LRU map from handle to query reference.
+
+    Handles are derived from the database path and the normalized query, so
+    re-running the same query returns the same handle.
+    """
+
+    def __init__(self, max_handles: int = MAX_HANDLES, shared: Optional[SharedStore] = None):
+        """
+        Args:
+            max_handles: Handles kept in memory
+            shared: Store shared with other worker processes, if any
+        """
+        self.max_handles = max_handles
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._refs: OrderedDict[str, ResultRef] = OrderedDict()
+
+    @staticmethod
+    def make_handle(query: str, db_path: Path) -> str:
+        digest = hashlib.sha1(f"{Path(db_path).name}\0{normalize_sql(query)}".encode("utf-8"))
+        return f"result_{digest.hexdigest()[:10]}"
+
+    def register(self, query: str, db_path: Path, columns: list[str], total_rows: int) -> str:
+        """Remember an executed query and return its handle."""
+        handle = self.make_handle(query, db_path)
+        ref = ResultRef(handle, query, Path(db_path), tuple(columns), total_rows)
+        with self._lock:
+            known = self._refs.get(handle) == ref
+            self._remember(ref)
+        if self.shared is not None and not known:
+            self.shared.put(SHARED_NAMESPACE, handle, ref)
+        return handle
+
+    def _remember(self, ref: ResultRef):
+        """Insert a reference as most recently used. Caller holds the lock."""
+        self._refs[ref.handle] = ref
+        self._refs.move_to_end(ref.handle)
+        while len(self._refs) > self.max_handles:
+            self._refs.popitem(last=False)
+
+    def get(self, handle: str) -> Optional[ResultRef]:
+        """Return the reference for a handle, or None if unknown."""
+        handle = handle.strip().strip("`'\"")
+        with self._lock:
+            ref = self._refs.get(handle)
+            if ref is not None:
+                self._refs.move_to_end(handle)
+                return ref
+        if self.shared is None:
+            return None
+        ref = self.shared.get(SHARED_NAMESPACE, handle)
+        if ref is not None:
+            with self._lock:
+                self._remember(ref)
+        return ref
+
+
+_store: Optional[ResultHandleStore] = None
+_store_lock = threading.Lock()
+
+
+def get_result_handles() -> ResultHandleStore:
+    """Get or create the result handle store singleton."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ResultHandleStore(shared=get_shared_store() if shared_state_enabled() else None)
+    return _store
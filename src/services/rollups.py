@@ -0,0 +1,538 @@
+"""
+Materialized rollups for the common analytics questions.
+
+Daily aggregates of sales, orders and payments are kept in a sidecar SQLite
+file next to data/olist.sqlite. The query rewriter answers eligible
+aggregate queries from those rollups instead of scanning the raw tables.
+
+Rollups assume the referential integrity of the Olist dataset: every
+order_items / order_payments row belongs to an order and order_id is unique
+in orders. Optional joins (products, customers, orders for payments) are
+materialized as LEFT JOINs with a has_* flag, so an INNER JOIN in the
+original query becomes a filter on that flag.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+from src.services.sql_engine import DB_PATH
+from src.utils.query_cache import database_fingerprint
+from src.utils.sql_parser import (
+    BinOp, Column, Expr, Func, Literal, SQLParseError, SelectQuery, Star,
+    contains_aggregate, parse_select, quote_identifier, render_literal,
+)
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+ROLLUP_DB_PATH = DB_PATH.with_name("olist_rollups.sqlite")
+
+# Rebuild stale rollups in the background when the source database changes
+ROLLUP_AUTO_REFRESH = os.environ.get("ROLLUP_AUTO_REFRESH", "1") == "1"
+
+
+# ================================================================================
+# Rollup Definitions
+# ================================================================================
+
+ROLLUP_BUILD_SQL = {
+    "rollup_sales": """
+        SELECT date(o.order_purchase_timestamp) AS day,
+               p.product_category_name AS product_category_name,
+               c.customer_state AS customer_state,
+               p.product_id IS NOT NULL AS has_product,
+               c.customer_id IS NOT NULL AS has_customer,
+               COUNT(*) AS item_count,
+               COUNT(oi.price) AS price_count,
+               SUM(oi.price) AS revenue,
+               MIN(oi.price) AS min_price,
+               MAX(oi.price) AS max_price,
+               COUNT(oi.freight_value) AS freight_count,
+               SUM(oi.freight_value) AS freight,
+               MIN(oi.freight_value) AS min_freight,
+               MAX(oi.freight_value) AS max_freight
+        FROM src.order_items oi
+        JOIN src.orders o ON o.order_id = oi.order_id
+        LEFT JOIN src.products p ON p.product_id = oi.product_id
+        LEFT JOIN src.customers c ON c.customer_id = o.customer_id
+        GROUP BY 1, 2, 3, 4, 5
+    """,
+    "rollup_orders": """
+        SELECT date(o.order_purchase_timestamp) AS day,
+               c.customer_state AS customer_state,
+               c.customer_city AS customer_city,
+               o.order_status AS order_status,
+               c.customer_id IS NOT NULL AS has_customer,
+               COUNT(*) AS order_count
+        FROM src.orders o
+        LEFT JOIN src.customers c ON c.customer_id = o.customer_id
+        GROUP BY 1, 2, 3, 4, 5
+    """,
+    "rollup_payments": """
+        SELECT date(o.order_purchase_timestamp) AS day,
+               c.customer_state AS customer_state,
+               op.payment_type AS payment_type,
+               o.order_id IS NOT NULL AS has_order,
+               c.customer_id IS NOT NULL AS has_customer,
+               COUNT(*) AS payment_count,
+               COUNT(op.payment_value) AS value_count,
+               SUM(op.payment_value) AS payment_value,
+               MIN(op.payment_value) AS min_payment_value,
+               MAX(op.payment_value) AS max_payment_value,
+               COUNT(op.payment_installments) AS installments_count,
+               SUM(op.payment_installments) AS installments
+        FROM src.order_payments op
+        LEFT JOIN src.orders o ON o.order_id = op.order_id
+        LEFT JOIN src.customers c ON c.customer_id = o.customer_id
+        GROUP BY 1, 2, 3, 4, 5
+    """,
+}
+
+# Changes whenever a rollup definition changes, so old sidecars are rebuilt
+ROLLUP_DEFINITION_HASH = hashlib.sha256(json.dumps(ROLLUP_BUILD_SQL, sort_keys=True).encode()).hexdigest()[:16]
+
+# Columns of the source tables the rollups cover, used to resolve unqualified names
+SOURCE_COLUMNS = {
+    "orders": {"order_id", "customer_id", "order_status", "order_purchase_timestamp"},
+    "order_items": {"order_id", "product_id", "price", "freight_value"},
+    "products": {"product_id", "product_category_name"},
+    "customers": {"customer_id", "customer_state", "customer_city"},
+    "order_payments": {"order_id", "payment_type", "payment_value", "payment_installments"},
+}
+
+# Join conditions the rollups were built with
+JOIN_KEYS = {
+    frozenset({("orders", "order_id"), ("order_items", "order_id")}),
+    frozenset({("orders", "customer_id"), ("customers", "customer_id")}),
+    frozenset({("order_items", "product_id"), ("products", "product_id")}),
+    frozenset({("orders", "order_id"), ("order_payments", "order_id")}),
+}
+
+TIME_COLUMN = ("orders", "order_purchase_timestamp")
+
+
+def _count(column: str) -> str:
+    return f"COALESCE(SUM({column}), 0)"
+
+
+@dataclass
+class RollupSpec:
+    """Describes which queries a rollup table can answer."""
+    table: str
+    grain: str
+    required: frozenset
+    optional: dict = field(default_factory=dict)
+    dimensions: dict = field(default_factory=dict)
+    measures: dict = field(default_factory=dict)
+
+
+ROLLUP_SPECS = [
+    RollupSpec(
+        table="rollup_sales",
+        grain="day x product category x customer state",
+        required=frozenset({"order_items"}),
+        optional={"orders": None, "products": "has_product", "customers": "has_customer"},
+        dimensions={
+            ("products", "product_category_name"): "product_category_name",
+            ("customers", "customer_state"): "customer_state",
+        },
+        measures={
+            ("count", "*", False): _count("item_count"),
+            ("count", ("order_items", "order_id"), False): _count("item_count"),
+            ("count", ("order_items", "price"), False): _count("price_count"),
+            ("sum", ("order_items", "price"), False): "SUM(revenue)",
+            ("total", ("order_items", "price"), False): "TOTAL(revenue)",
+            ("avg", ("order_items", "price"), False): "(TOTAL(revenue) / SUM(price_count))",
+            ("min", ("order_items", "price"), False): "MIN(min_price)",
+            ("max", ("order_items", "price"), False): "MAX(max_price)",
+            ("count", ("order_items", "freight_value"), False): _count("freight_count"),
+            ("sum", ("order_items", "freight_value"), False): "SUM(freight)",
+            ("total", ("order_items", "freight_value"), False): "TOTAL(freight)",
+            ("avg", ("order_items", "freight_value"), False): "(TOTAL(freight) / SUM(freight_count))",
+            ("min", ("order_items", "freight_value"), False): "MIN(min_freight)",
+            ("max", ("order_items", "freight_value"), False): "MAX(max_freight)",
+        },
+    ),
+    RollupSpec(
+        table="rollup_orders",
+        grain="day x customer state/city x order status",
+        required=frozenset({"orders"}),
+        optional={"customers": "has_customer"},
+        dimensions={
+            ("customers", "customer_state"): "customer_state",
+            ("customers", "customer_city"): "customer_city",
+            ("orders", "order_status"): "order_status",
+        },
+        measures={
+            ("count", "*", False): _count("order_count"),
+            ("count", ("orders", "order_id"), False): _count("order_count"),
+            ("count", ("orders", "order_id"), True): _count("order_count"),
+        },
+    ),
+    RollupSpec(
+        table="rollup_payments",
+        grain="day x customer state x payment type",
+        required=frozenset({"order_payments"}),
+        optional={"orders": "has_order", "customers": "has_customer"},
+        dimensions={
+            ("customers", "customer_state"): "customer_state",
+            ("order_payments", "payment_type"): "payment_type",
+        },
+        measures={
+            ("count", "*", False): _count("payment_count"),
+            ("count", ("order_payments", "order_id"), False): _count("payment_count"),
+            ("count", ("order_payments", "payment_value"), False): _count("value_count"),
+            ("sum", ("order_payments", "payment_value"), False): "SUM(payment_value)",
+            ("total", ("order_payments", "payment_value"), False): "TOTAL(payment_value)",
+            ("avg", ("order_payments", "payment_value"), False): "(TOTAL(payment_value) / SUM(value_count))",
+            ("min", ("order_payments", "payment_value"), False): "MIN(min_payment_value)",
+            ("max", ("order_payments", "payment_value"), False): "MAX(max_payment_value)",
+            ("sum", ("order_payments", "payment_installments"), False): "SUM(installments)",
+            ("avg", ("order_payments", "payment_installments"), False): "(TOTAL(installments) / SUM(installments_count))",
+        },
+    ),
+]
+
+
+# ================================================================================
+# Query Rewriter
+# ================================================================================
+
+class RollupNotApplicable(Exception):
+    """Raised when a query cannot be answered from a rollup."""
+
+
+@dataclass
+class RollupRewrite:
+    """A query rewritten to read from a rollup table."""
+    sql: str
+    table: str
+    grain: str
+
+    @property
+    def note(self) -> str:
+        return (
+            f"Note: answered from the precomputed rollup table `{self.table}` "
+            f"({self.grain}) instead of scanning the raw tables."
+        )
+
+
+# strftime formats with day precision or coarser
+_DATE_FORMAT = re.compile(r"^(?:%[YmdjWw%]|[^%])*$")
+_DATE_LITERAL = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class _Translator:
+    """Translates expressions of one parsed query onto one rollup table."""
+
+    def __init__(self, spec: RollupSpec, query: SelectQuery):
+        self.spec = spec
+        self.query = query
+        self.aliases = query.aliases()
+        self.item_names = {item.alias.lower(): item for item in query.items if item.alias}
+
+    def resolve(self, column: Column) -> tuple[str, str]:
+        if column.table is not None:
+            table = self.aliases.get(column.table)
+            if table is None:
+                raise RollupNotApplicable(f"Unknown table alias {column.table}")
+            return table, column.name
+        owners = [t for t in self.query.tables if column.name in SOURCE_COLUMNS.get(t, set())]
+        if len(owners) != 1:
+            raise RollupNotApplicable(f"Cannot resolve column {column.name}")
+        return owners[0], column.name
+
+    def dimension(self, expr: Expr) -> str:
+        """Translate a grouping/filter expression onto rollup dimension columns."""
+        if isinstance(expr, Literal):
+            return render_literal(expr.value)
+        if isinstance(expr, Column):
+            key = self.resolve(expr)
+            if key in self.spec.dimensions:
+                return self.spec.dimensions[key]
+            raise RollupNotApplicable(f"{key[0]}.{key[1]} is not a rollup dimension")
+        if isinstance(expr, Func) and not expr.is_aggregate:
+            if expr.name == "strftime" and len(expr.args) == 2 and self._is_time(expr.args[1]):
+                fmt = expr.args[0]
+                if isinstance(fmt, Literal) and isinstance(fmt.value, str) and _DATE_FORMAT.match(fmt.value):
+                    return f"strftime({render_literal(fmt.value)}, day)"
+            if expr.name == "date" and len(expr.args) == 1 and self._is_time(expr.args[0]):
+                return "day"
+            if expr.name in ("upper", "lower") and len(expr.args) == 1:
+                return f"{expr.name}({self.dimension(expr.args[0])})"
+        raise RollupNotApplicable("Unsupported dimension expression")
+
+    def _is_time(self, expr: Expr) -> bool:
+        return isinstance(expr, Column) and self.resolve(expr) == TIME_COLUMN
+
+    def value(self, expr: Expr) -> str:
+        """Translate a select-list expression (aggregates over dimensions)."""
+        if isinstance(expr, Func) and expr.is_aggregate:
+            if len(expr.args) != 1:
+                raise RollupNotApplicable("Unsupported aggregate arguments")
+            arg = expr.args[0]
+            if isinstance(arg, Star):
+                key = (expr.name, "*", expr.distinct)
+            elif isinstance(arg, Column):
+                key = (expr.name, self.resolve(arg), expr.distinct)
+            else:
+                raise RollupNotApplicable("Aggregates must be over a column")
+            if key not in self.spec.measures:
+                raise RollupNotApplicable(f"No rollup measure for {key}")
+            return self.spec.measures[key]
+        if isinstance(expr, Func) and expr.name == "round" and contains_aggregate(expr):
+            args = [self.value(expr.args[0])] + [self.dimension(arg) for arg in expr.args[1:]]
+            return f"ROUND({', '.join(args)})"
+        if isinstance(expr, BinOp) and contains_aggregate(expr):
+            return f"({self.value(expr.left)} {expr.op} {self.value(expr.right)})"
+        return self.dimension(expr)
+
+    def reference(self, expr: Expr) -> str:
+        """Translate a GROUP BY / ORDER BY term, keeping alias and position references."""
+        if isinstance(expr, Literal) and isinstance(expr.value, int):
+            return str(expr.value)
+        if isinstance(expr, Column) and expr.table is None and expr.name in self.item_names:
+            return quote_identifier(self.item_names[expr.name].alias)
+        if contains_aggregate(expr):
+            return self.value(expr)
+        return self.dimension(expr)
+
+    def predicate(self, predicate) -> str:
+        """Translate a WHERE predicate on dimensions."""
+        if self._is_time(predicate.expr):
+            value = predicate.values[0] if predicate.values else None
+            if predicate.op in (">=", "<") and isinstance(value, str) and _DATE_LITERAL.match(value):
+                return f"day {predicate.op} {render_literal(value)}"
+            raise RollupNotApplicable("Timestamp filters must compare against a date with >= or <")
+
+        expr = self.dimension(predicate.expr)
+        if predicate.op in ("is null", "is not null"):
+            return f"{expr} {predicate.op.upper()}"
+        if predicate.op in ("in", "not in"):
+            values = ", ".join(render_literal(value) for value in predicate.values)
+            return f"{expr} {predicate.op.upper()} ({values})"
+        if predicate.op in ("between", "not between"):
+            low, high = predicate.values
+            return f"{expr} {predicate.op.upper()} {render_literal(low)} AND {render_literal(high)}"
+        return f"{expr} {predicate.op} {render_literal(predicate.values[0])}"
+
+
+def _match_spec(query: SelectQuery) -> Optional[RollupSpec]:
+    """Pick the rollup whose join graph matches the query's tables."""
+    for spec in ROLLUP_SPECS:
+        if spec.required <= query.tables <= spec.required | set(spec.optional):
+            return spec
+    return None
+
+
+def _check_joins(query: SelectQuery):
+    aliases = query.aliases()
+    for join in query.joins:
+        if join.kind != "inner":
+            raise RollupNotApplicable("Only inner joins are supported")
+        for left, right in join.on:
+            if left.table is None or right.table is None:
+                raise RollupNotApplicable("Join columns must be qualified")
+            key = frozenset({(aliases.get(left.table), left.name), (aliases.get(right.table), right.name)})
+            if key not in JOIN_KEYS:
+                raise RollupNotApplicable("Join is not on a documented key")
+
+
+def rewrite_query(query: str) -> Optional[RollupRewrite]:
+    """
+    Rewrite an aggregate query to read from a rollup table.
+
+    Returns:
+        The rewrite, or None if the query is not eligible
+    """
+    try:
+        parsed = parse_select(query)
+    except SQLParseError:
+        return None
+
+    if parsed.distinct or not parsed.is_aggregate or parsed.offset is not None and parsed.limit is None:
+        return None
+    spec = _match_spec(parsed)
+    if spec is None:
+        return None
+
+    try:
+        _check_joins(parsed)
+        translator = _Translator(spec, parsed)
+
+        group_terms = [translator.reference(expr) for expr in parsed.group_by]
+        items = []
+        for position, item in enumerate(parsed.items, start=1):
+            sql = translator.value(item.expr)
+            if not contains_aggregate(item.expr) and not isinstance(item.expr, Literal):
+                alias = item.alias and quote_identifier(item.alias)
+                if sql not in group_terms and alias not in group_terms and str(position) not in group_terms:
+                    raise RollupNotApplicable("Non-aggregated column missing from GROUP BY")
+            items.append(f"{sql} AS {quote_identifier(item.output_name)}")
+
+        conditions = [
+            f"{flag} = 1" for table, flag in spec.optional.items()
+            if flag and table in parsed.tables
+        ]
+        conditions += [translator.predicate(predicate) for predicate in parsed.where]
+        order_terms = [
+            translator.reference(order.expr) + (" DESC" if order.descending else "")
+            for order in parsed.order_by
+        ]
+    except (RollupNotApplicable, SQLParseError) as e:
+        logger.debug(f"Rollup rewrite not applicable: {str(e)}")
+        return None
+
+    sql = f"SELECT {', '.join(items)} FROM {spec.table}"
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    if group_terms:
+        sql += f" GROUP BY {', '.join(group_terms)}"
+    if order_terms:
+        sql += f" ORDER BY {', '.join(order_terms)}"
+    if parsed.limit is not None:
+        sql += f" LIMIT {parsed.limit}"
+        if parsed.offset is not None:
+            sql += f" OFFSET {parsed.offset}"
+
+    return RollupRewrite(sql=sql, table=spec.table, grain=spec.grain)
+
+
+# ================================================================================
+# Build / Refresh
+# ================================================================================
+
+def build_rollups(source_path: Path = DB_PATH, rollup_path: Path = ROLLUP_DB_PATH):
+    """
+    Build or rebuild every rollup table in a single transaction.
+
+    Readers keep seeing the previous rollups until the rebuild commits.
+    """
+    source_path = Path(source_path)
+    rollup_path = Path(rollup_path)
+    fingerprint = database_fingerprint(source_path)
+    start = time.perf_counter()
+
+    conn = sqlite3.connect(rollup_path.resolve().as_uri(), uri=True, timeout=30)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (f"{source_path.resolve().as_uri()}?mode=ro",))
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rollup_meta (key TEXT PRIMARY KEY, value TEXT)")
+            for table, select_sql in ROLLUP_BUILD_SQL.items():
+                logger.info(f"Building {table}")
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"CREATE TABLE {table} AS {select_sql}")
+                conn.execute(f"CREATE INDEX idx_{table}_day ON {table} (day)")
+            conn.execute(
+                "INSERT OR REPLACE INTO rollup_meta (key, value) VALUES ('source_fingerprint', ?)",
+                (json.dumps([ROLLUP_DEFINITION_HASH] + list(fingerprint)),)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO rollup_meta (key, value) VALUES ('built_at', ?)",
+                (str(time.time()),)
+            )
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+
+    logger.info(f"Rollups built in {time.perf_counter() - start:.2f}s at {rollup_path}")
+
+
+class RollupManager:
+    """Tracks rollup freshness and routes eligible queries to the rollups."""
+
+    def __init__(self, source_path: Path = DB_PATH, rollup_path: Path = ROLLUP_DB_PATH, auto_refresh: bool = ROLLUP_AUTO_REFRESH):
+        self.source_path = Path(source_path)
+        self.rollup_path = Path(rollup_path)
+        self.auto_refresh = auto_refresh
+        self._lock = threading.Lock()
+        self._meta_cache: tuple = (None, None)
+        self._refreshing = False
+
+    def _built_from(self) -> Optional[list]:
+        """Read the definition hash and source fingerprint recorded in the sidecar (cached per sidecar version)."""
+        rollup_fingerprint = database_fingerprint(self.rollup_path)
+        cached_fingerprint, cached_value = self._meta_cache
+        if cached_fingerprint == rollup_fingerprint:
+            return cached_value
+
+        value = None
+        if self.rollup_path.exists():
+            try:
+                conn = sqlite3.connect(f"{self.rollup_path.resolve().as_uri()}?mode=ro", uri=True)
+                try:
+                    row = conn.execute("SELECT value FROM rollup_meta WHERE key = 'source_fingerprint'").fetchone()
+                    value = json.loads(row[0]) if row else None
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read rollup metadata: {str(e)}")
+        self._meta_cache = (rollup_fingerprint, value)
+        return value
+
+    def is_fresh(self) -> bool:
+        """Return True if the rollups were built from the current source database."""
+        built_from = self._built_from()
+        expected = [ROLLUP_DEFINITION_HASH] + list(database_fingerprint(self.source_path))
+        return built_from is not None and built_from == expected
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild the rollups if they are stale (or always, with force)."""
+        if not force and self.is_fresh():
+            return False
+        if not self.source_path.exists():
+            logger.warning(f"Cannot build rollups: {self.source_path} not found")
+            return False
+        build_rollups(self.source_path, self.rollup_path)
+        return True
+
+    def refresh_in_background(self):
+        """Start a single background rebuild if none is running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Rollup refresh failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=_run, name="rollup-refresh", daemon=True).start()
+
+    def rewrite(self, query: str) -> Optional[RollupRewrite]:
+        """Rewrite a query onto fresh rollups, or return None to run it as-is."""
+        rewrite = rewrite_query(query)
+        if rewrite is None:
+            return None
+        if not self.is_fresh():
+            if self.auto_refresh:
+                self.refresh_in_background()
+            return None
+        logger.info(f"Answering query from {rewrite.table}")
+        return rewrite
+
+
+_manager: Optional[RollupManager] = None
+
+
+def get_rollup_manager() -> RollupManager:
+    """Get or create the rollup manager singleton."""
+    global _manager
+    if _manager is None:
+        _manager = RollupManager()
+    return _manager
+
+
+if __name__ == "__main__":
+    get_rollup_manager().refresh(force=True)
@@ -0,0 +1,293 @@
+"""
+SQL execution engine for the Data Analyst Agent.
+Runs queries on a bounded worker pool so the event loop never blocks,
+enforces a per-query wall-clock budget and serves repeated queries from
+the result cache.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import partial
+from pathlib import Path
+from typing import Optional
+from src.utils.db_pool import get_connection_pool, DEFAULT_POOL_SIZE
+from src.utils.query_cache import get_query_cache, is_cacheable
+from src.utils.result_stats import ColumnSummary, ResultSummarizer
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# Database path
+DB_PATH = Path(__file__).parent.parent.parent / "data" / "olist.sqlite"
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("SQL_ENGINE_WORKERS", str(DEFAULT_POOL_SIZE)))
+DEFAULT_QUERY_TIMEOUT = float(os.environ.get("SQL_QUERY_TIMEOUT", "30"))
+
+# Number of SQLite VM instructions between deadline checks
+PROGRESS_HANDLER_STEPS = 10_000
+
+# Rows pulled from the cursor per fetchmany call
+FETCH_BATCH_SIZE = int(os.environ.get("SQL_FETCH_BATCH_SIZE", "500"))
+
+# Rows counted past the display budget before the footer count is capped
+DEFAULT_COUNT_LIMIT = int(os.environ.get("SQL_COUNT_LIMIT", "100000"))
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a query exceeds its wall-clock budget and is interrupted."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        super().__init__(f"Query exceeded the {timeout:g}s time budget and was cancelled")
+
+
+@dataclass
+class QueryResult:
+    """
+    Rows and metadata returned by a single query.
+
+    ``rows`` holds at most the requested row budget; ``total_rows`` is the
+    number of rows the query produced, counted without keeping them. When the
+    count hit its cap, ``total_is_exact`` is False and ``total_rows`` is a
+    lower bound. ``summary`` holds per-column statistics of every counted
+    row when the query was run with ``summarize=True``.
+    """
+    columns: list[str] = field(default_factory=list)
+    rows: list[tuple] = field(default_factory=list)
+    total_rows: int = 0
+    total_is_exact: bool = True
+    elapsed: float = 0.0
+    cached: bool = False
+    summary: Optional[list[ColumnSummary]] = None
+
+    @property
+    def row_count(self) -> int:
+        return self.total_rows
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_rows > len(self.rows)
+
+
+# ================================================================================
+# Engine
+# ================================================================================
+
+class SQLEngine:
+    """Executes read-only queries against the pooled SQLite connections."""
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        query_timeout: float = DEFAULT_QUERY_TIMEOUT
+    ):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            max_workers: Number of worker threads (one pooled connection each)
+            query_timeout: Default per-query budget in seconds
+        """
+        self.db_path = Path(db_path)
+        self.max_workers = max_workers
+        self.query_timeout = query_timeout
+        self._cache = get_query_cache(self.db_path)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sql-worker")
+
+    def _cache_key(self, query: str, max_rows: Optional[int], count_limit: int, use_cache: bool, summarize: bool):
+        """Return the result-cache key for a query, or None if it must not be cached."""
+        if not use_cache or not is_cacheable(query):
+            return None
+        return self._cache.make_key(query, max_rows, count_limit, summarize)
+
+    def _from_cache(self, key) -> Optional[QueryResult]:
+        if key is None:
+            return None
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        logger.info("Query served from result cache")
+        return replace(cached, cached=True, elapsed=0.0)
+
+    def execute(
+        self,
+        query: str,
+        timeout: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None,
+        max_rows: Optional[int] = None,
+        count_limit: int = DEFAULT_COUNT_LIMIT,
+        use_cache: bool = True,
+        summarize: bool = False
+    ) -> QueryResult:
+        """
+        Execute a query synchronously in the calling thread.
+
+        Results are served from the query-result cache when an equivalent
+        query ran against the same database file recently.
+
+        Rows are streamed with fetchmany: at most ``max_rows`` are kept, the
+        rest are only counted (up to ``count_limit``), so peak memory stays
+        bounded however large the table is.
+
+        Args:
+            query: SQLite query to execute
+            timeout: Wall-clock budget in seconds (defaults to the engine budget)
+            cancel_event: Optional event that interrupts the query when set
+            max_rows: Maximum rows to keep (None keeps every row)
+            count_limit: Maximum rows to count past max_rows
+            use_cache: Whether to read from and write to the result cache
+            summarize: Whether to compute column summaries over every counted row
+
+        Returns:
+            QueryResult with column names and rows
+
+        Raises:
+            QueryTimeoutError: If the query ran past its budget
+            sqlite3.Error: For any database error
+        """
+        key = self._cache_key(query, max_rows, count_limit, use_cache, summarize)
+        cached = self._from_cache(key)
+        if cached is not None:
+            return cached
+
+        result = self._run(query, timeout, cancel_event, max_rows, count_limit, summarize)
+        if key is not None:
+            self._cache.put(key, result)
+        return result
+
+    def _run(
+        self,
+        query: str,
+        timeout: Optional[float],
+        cancel_event: Optional[threading.Event],
+        max_rows: Optional[int],
+        count_limit: int,
+        summarize: bool = False
+    ) -> QueryResult:
+        """Execute a query against a pooled connection, bypassing the cache."""
+        budget = self.query_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + budget
+
+        def _should_interrupt() -> int:
+            if time.monotonic() > deadline:
+                return 1
+            if cancel_event is not None and cancel_event.is_set():
+                return 1
+            return 0
+
+        pool = get_connection_pool(self.db_path, max_connections=self.max_workers)
+        with pool.connection() as conn:
+            conn.set_progress_handler(_should_interrupt, PROGRESS_HANDLER_STEPS)
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query)
+                columns = [description[0] for description in cursor.description or []]
+                summarizer = ResultSummarizer(columns) if summarize and columns else None
+                rows, total_rows, total_is_exact = self._stream_rows(cursor, max_rows, count_limit, summarizer)
+            except sqlite3.OperationalError as e:
+                if "interrupted" in str(e) and time.monotonic() > deadline:
+                    logger.error(f"Query interrupted after {budget:g}s budget: {query[:100]}")
+                    raise QueryTimeoutError(budget) from e
+                raise
+            finally:
+                cursor.close()
+                conn.set_progress_handler(None, 0)
+
+        return QueryResult(
+            columns=columns,
+            rows=rows,
+            total_rows=total_rows,
+            total_is_exact=total_is_exact,
+            elapsed=time.monotonic() - start,
+            summary=summarizer.finish() if summarizer is not None else None
+        )
+
+    @staticmethod
+    def _stream_rows(
+        cursor: sqlite3.Cursor,
+        max_rows: Optional[int],
+        count_limit: int,
+        summarizer: Optional[ResultSummarizer] = None
+    ) -> tuple[list[tuple], int, bool]:
+        """Keep the first max_rows rows and count (and summarize) the rest in bounded batches."""
+        rows: list[tuple] = []
+        total_rows = 0
+
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                return rows, total_rows, True
+            total_rows += len(batch)
+            if summarizer is not None:
+                summarizer.update(batch)
+            if max_rows is None:
+                rows.extend(batch)
+                continue
+            if len(rows) < max_rows:
+                rows.extend(batch[:max_rows - len(rows)])
+            if total_rows - len(rows) >= count_limit:
+                return rows, total_rows, False
+
+    async def aexecute(
+        self,
+        query: str,
+        timeout: Optional[float] = None,
+        max_rows: Optional[int] = None,
+        count_limit: int = DEFAULT_COUNT_LIMIT,
+        use_cache: bool = True,
+        summarize: bool = False
+    ) -> QueryResult:
+        """
+        Execute a query on the worker pool without blocking the event loop.
+
+        Cache hits return without leaving the event loop. Cancelling the
+        awaiting task interrupts the running query.
+        """
+        key = self._cache_key(query, max_rows, count_limit, use_cache, summarize)
+        cached = self._from_cache(key)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        cancel_event = threading.Event()
+        future = loop.run_in_executor(
+            self._executor,
+            partial(self._run, query, timeout, cancel_event, max_rows, count_limit, summarize)
+        )
+        try:
+            result = await future
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+        if key is not None:
+            self._cache.put(key, result)
+        return result
+
+    def submit(self, func, *args) -> Future:
+        """Run background work (e.g. plan analysis) on the engine worker pool."""
+        return self._executor.submit(func, *args)
+
+    def shutdown(self):
+        """Stop the worker pool."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_engines: dict[Path, SQLEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_sql_engine(db_path: Path = DB_PATH) -> SQLEngine:
+    """Get or create the SQL engine singleton for a database file."""
+    key = Path(db_path).resolve()
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = SQLEngine(key)
+            _engines[key] = engine
+        return engine
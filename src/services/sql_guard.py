@@ -0,0 +1,385 @@
+"""
+Pre-execution checks for the SQL the model writes.
+
+execute_sql_tool used to run whatever it was given, so a cartesian join
+such as geolocation x customers kept a worker busy until the query timeout.
+The guard rejects anything but a single read-only SELECT, estimates the
+rows SQLite will visit from EXPLAIN QUERY PLAN and the table sizes, and
+handles queries over budget in one of two ways:
+
+- rows stream out without sorting or aggregation: a LIMIT is appended,
+  which stops the scan early
+- otherwise: the query is rejected with its plan so the model rewrites it
+
+Both cost milliseconds instead of a worker's full time budget.
+"""
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+from src.services.sql_engine import DB_PATH
+from src.utils.db_pool import get_connection_pool
+from src.utils.query_cache import database_fingerprint
+from src.utils.sql_parser import AGGREGATES, Token, tokenize
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+SQL_GUARD_ENABLED = os.environ.get("SQL_GUARD", "1") == "1"
+
+# Estimated row visits a query may cost before it is limited or rejected
+SQL_GUARD_BUDGET = int(os.environ.get("SQL_GUARD_BUDGET", "50000000"))
+
+# LIMIT appended to streaming queries over budget
+SQL_GUARD_AUTO_LIMIT = int(os.environ.get("SQL_GUARD_AUTO_LIMIT", "1000"))
+
+# Rows per lookup assumed for an equality search without index statistics (SQLite's own guess)
+DEFAULT_SEARCH_ROWS = 10
+
+# Share of a table a range search is assumed to return
+RANGE_DIVISOR = 4
+
+# Rows assumed for plan loops over something that is neither a table nor a materialized subquery
+UNKNOWN_SOURCE_ROWS = 1000
+
+# Statements and clauses that change the database or the connection
+FORBIDDEN_WORDS = {
+    "insert", "update", "delete", "drop", "create", "alter", "attach", "detach", "pragma",
+    "vacuum", "reindex", "analyze", "begin", "commit", "rollback", "savepoint", "release",
+}
+
+# Start of the note returned with a query that had a LIMIT added
+LIMIT_NOTE_PREFIX = "Note: this query would read about"
+
+# Keywords after which rows no longer stream out in scan order, so a LIMIT does not cut the work
+NON_STREAMING_WORDS = {"group", "order", "distinct", "having", "union", "intersect", "except", "over"}
+
+# FROM orders o / JOIN order_items AS oi / , customers c
+_TABLE_REFERENCE = re.compile(
+    r"(?:\bfrom|\bjoin|,)\s+([A-Za-z_][A-Za-z0-9_]*)(?:\s+(?:as\s+)?([A-Za-z_][A-Za-z0-9_]*))?",
+    re.IGNORECASE
+)
+_NOT_ALIASES = NON_STREAMING_WORDS | {"where", "join", "on", "inner", "left", "cross", "natural", "using", "limit"}
+# SCAN o / SEARCH oi USING COVERING INDEX idx_order_items_order_id (order_id=?)
+_LOOP = re.compile(r"^(?P<op>SCAN|SEARCH) (?P<source>\S+)(?P<rest>.*)$")
+_INDEX_NAME = re.compile(r"USING (?:COVERING )?INDEX (\S+)")
+_TERMS = re.compile(r"\(([^)]*)\)\s*$")
+# MATERIALIZE t / CO-ROUTINE t
+_NAMED_SUBQUERY = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)$")
+
+
+class QueryRejectedError(Exception):
+    """Raised when a query is not a single read-only SELECT or would cost too much to run."""
+
+
+@dataclass
+class GuardResult:
+    """A query cleared to run, possibly with a LIMIT added."""
+    sql: str
+    estimated_rows: int
+    note: Optional[str] = None
+
+
+# ================================================================================
+# Statement Checks
+# ================================================================================
+
+def check_statement(query: str) -> list[Token]:
+    """
+    Reject anything but a single SELECT (or WITH ... SELECT) statement.
+
+    Returns:
+        The query's tokens
+
+    Raises:
+        QueryRejectedError: For empty, multi-statement or modifying queries
+    """
+    tokens = tokenize(query)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    if not tokens:
+        raise QueryRejectedError("The query is empty")
+    if any(token.text == ";" for token in tokens):
+        raise QueryRejectedError("Only one statement can be run at a time")
+    if tokens[0].lower not in ("select", "with"):
+        raise QueryRejectedError(f"Only SELECT queries are allowed, not {tokens[0].text.upper()}")
+
+    for token, following in zip(tokens, tokens[1:] + [None]):
+        if token.kind != "word":
+            continue
+        if token.lower in FORBIDDEN_WORDS or (
+            token.lower == "replace" and following is not None and following.lower == "into"
+        ):
+            raise QueryRejectedError(f"Only SELECT queries are allowed, {token.text.upper()} is not")
+    return tokens
+
+
+def is_streaming(tokens: list[Token]) -> bool:
+    """Return True if rows come out in scan order, so a LIMIT ends the scan early."""
+    for token, following in zip(tokens, tokens[1:] + [None]):
+        if token.kind != "word":
+            continue
+        if token.lower in NON_STREAMING_WORDS:
+            return False
+        if token.lower in AGGREGATES and following is not None and following.text == "(":
+            return False
+    return True
+
+
+def trailing_limit(tokens: list[Token]) -> Optional[int]:
+    """Return the rows a trailing LIMIT n [OFFSET m] lets the query read, if it has one."""
+    starts = [i for i, token in enumerate(tokens[-4:]) if token.lower == "limit"]
+    if not starts:
+        return None
+    tail = tokens[-4:][starts[-1] + 1:]
+    if not tail or any(token.lower not in ("offset", ",") and not token.text.isdigit() for token in tail):
+        return None
+    return sum(int(token.text) for token in tail if token.text.isdigit())
+
+
+def add_limit(query: str, limit: int) -> str:
+    """Append a LIMIT on its own line, so a trailing line comment cannot swallow it."""
+    return f"{query.rstrip().rstrip(';').rstrip()}\nLIMIT {int(limit)}"
+
+
+# ================================================================================
+# Cost Estimation
+# ================================================================================
+
+@dataclass
+class _Statistics:
+    """Table sizes and index statistics for one version of the database."""
+    fingerprint: tuple
+    tables: set[str]
+    index_stats: dict[str, list[int]]
+    table_rows: dict[str, int]
+
+
+class _PlanEstimator:
+    """
+    Estimates the row visits of an EXPLAIN QUERY PLAN.
+
+    Loops that share a parent are nested, so a block costs the running
+    product of their row estimates. Subquery blocks are estimated on their
+    own and added; materialized ones are remembered by name for the loops
+    that scan them.
+    """
+
+    def __init__(
+        self,
+        plan: list[tuple],
+        sources: dict[str, str],
+        table_rows: Callable[[str], int],
+        index_stats: dict[str, list[int]]
+    ):
+        self.children: dict[int, list[tuple[int, str]]] = {}
+        for node_id, parent, _, detail in plan:
+            self.children.setdefault(parent, []).append((node_id, detail))
+        self.sources = sources
+        self.table_rows = table_rows
+        self.index_stats = index_stats
+        self.subqueries: dict[str, int] = {}
+
+    def loop_rows(self, op: str, source: str, rest: str) -> tuple[int, int]:
+        """Return (rows per iteration, one-off build cost) of a SCAN or SEARCH."""
+        if source == "CONSTANT":
+            return 1, 0
+        source = source.lower()
+        if source in self.subqueries:
+            rows = self.subqueries[source]
+        elif self.sources.get(source):
+            rows = self.table_rows(self.sources[source])
+        else:
+            rows = UNKNOWN_SOURCE_ROWS
+        if op == "SCAN":
+            return rows, 0
+
+        terms = _TERMS.search(rest)
+        terms = terms.group(1) if terms else ""
+        equalities = len(re.findall(r"=\?", terms))
+        ranged = bool(re.search(r"[<>]", terms))
+        build = 0
+        if "AUTOMATIC" in rest:
+            estimate, build = (DEFAULT_SEARCH_ROWS if equalities else rows), rows
+        elif "PRIMARY KEY" in rest and equalities and not ranged:
+            estimate = 1
+        elif equalities:
+            index = _INDEX_NAME.search(rest)
+            stats = self.index_stats.get(index.group(1)) if index else None
+            estimate = stats[equalities] if stats and len(stats) > equalities else DEFAULT_SEARCH_ROWS
+        else:
+            estimate = rows
+        if ranged:
+            estimate = max(1, estimate // RANGE_DIVISOR)
+        return max(1, min(estimate, rows)), build
+
+    def block(self, parent: int) -> tuple[int, int]:
+        """Return (row visits, output rows) of the plan block under a node."""
+        cost = 0
+        product = 1
+        loops = 0
+        child_rows = 0
+        for node_id, detail in self.children.get(parent, []):
+            loop = _LOOP.match(detail)
+            if loop:
+                rows, build = self.loop_rows(loop.group("op"), loop.group("source"), loop.group("rest"))
+                product *= rows
+                cost += product + build
+                loops += 1
+                continue
+            if node_id not in self.children:
+                continue
+            sub_cost, sub_rows = self.block(node_id)
+            named = _NAMED_SUBQUERY.match(detail)
+            if named:
+                self.subqueries[named.group(1).lower()] = max(1, sub_rows)
+            elif detail.startswith("CORRELATED"):
+                # Runs once per row of the loops around it
+                sub_cost *= product
+            else:
+                child_rows += sub_rows
+            cost += sub_cost
+        return cost, product if loops else child_rows
+
+    def estimate(self) -> tuple[int, int]:
+        return self.block(0)
+
+
+def referenced_tables(query: str, tables: set[str]) -> dict[str, str]:
+    """Map aliases and names of the database tables a query reads to the table names."""
+    sources = {}
+    for table, alias in _TABLE_REFERENCE.findall(query):
+        table = table.lower()
+        if table not in tables:
+            continue
+        sources[table] = table
+        if alias and alias.lower() not in _NOT_ALIASES:
+            sources[alias.lower()] = table
+    return sources
+
+
+# ================================================================================
+# Guard
+# ================================================================================
+
+class QueryGuard:
+    """Checks model-written queries against a row-visit budget before they run."""
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        budget: int = SQL_GUARD_BUDGET,
+        auto_limit: int = SQL_GUARD_AUTO_LIMIT
+    ):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            budget: Estimated row visits allowed per query
+            auto_limit: LIMIT appended to streaming queries over budget
+        """
+        self.db_path = Path(db_path)
+        self.budget = budget
+        self.auto_limit = auto_limit
+        self._lock = threading.Lock()
+        self._stats: Optional[_Statistics] = None
+
+    def _statistics(self, conn: sqlite3.Connection) -> _Statistics:
+        """Table names and sqlite_stat1 index statistics, reloaded when the database changes."""
+        fingerprint = database_fingerprint(self.db_path)
+        stats = self._stats
+        if stats is not None and stats.fingerprint == fingerprint:
+            return stats
+
+        tables = {row[0].lower() for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        index_stats = {}
+        table_rows = {}
+        if "sqlite_stat1" in tables:
+            for table, index, stat in conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1"):
+                numbers = [int(part) for part in str(stat).split() if part.isdigit()]
+                if not numbers:
+                    continue
+                table_rows.setdefault(table.lower(), numbers[0])
+                if index:
+                    index_stats[index] = numbers
+        stats = _Statistics(fingerprint, tables, index_stats, table_rows)
+        with self._lock:
+            self._stats = stats
+        return stats
+
+    def _table_rows(self, conn: sqlite3.Connection, stats: _Statistics, table: str) -> int:
+        """Rows in a table, from sqlite_stat1 or counted once per database version."""
+        rows = stats.table_rows.get(table)
+        if rows is None:
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            stats.table_rows[table] = rows
+        return rows
+
+    def check(self, query: str) -> GuardResult:
+        """
+        Clear a query to run.
+
+        Queries SQLite cannot plan are passed through unchanged, so executing
+        them reports the real error.
+
+        Returns:
+            GuardResult with the SQL to run and an optional note for the model
+
+        Raises:
+            QueryRejectedError: If the query is not a single SELECT or is too expensive
+        """
+        tokens = check_statement(query)
+        with get_connection_pool(self.db_path).connection() as conn:
+            try:
+                plan = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+            except sqlite3.Error:
+                return GuardResult(query, 0)
+            stats = self._statistics(conn)
+            estimator = _PlanEstimator(
+                plan,
+                referenced_tables(query, stats.tables),
+                lambda table: self._table_rows(conn, stats, table),
+                stats.index_stats
+            )
+            cost, output_rows = estimator.estimate()
+
+        if cost <= self.budget:
+            return GuardResult(query, cost)
+
+        # Streaming queries only visit rows until the LIMIT is filled
+        streaming = is_streaming(tokens) and output_rows > 0
+        limit = trailing_limit(tokens)
+        if streaming and limit is not None and cost * limit / output_rows <= self.budget:
+            return GuardResult(query, cost)
+        if streaming and limit is None and cost * self.auto_limit / output_rows <= self.budget:
+            logger.warning(f"Query estimated at {cost:,} row visits, adding LIMIT {self.auto_limit}")
+            note = (
+                f"{LIMIT_NOTE_PREFIX} {cost:,} rows in full, so LIMIT {self.auto_limit} "
+                f"was added. Add join conditions, filters or aggregation for a complete answer."
+            )
+            return GuardResult(add_limit(query, self.auto_limit), cost, note)
+
+        logger.warning(f"Query rejected at an estimated {cost:,} row visits: {query[:100]}")
+        steps = "; ".join(detail for _, _, _, detail in plan)
+        raise QueryRejectedError(
+            f"The query would read about {cost:,} rows (budget {self.budget:,}). "
+            f"Query plan: {steps}. Join every table on its key columns, add WHERE filters "
+            f"or aggregate, then try again."
+        )
+
+
+_guards: dict[Path, QueryGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_query_guard(db_path: Path = DB_PATH) -> QueryGuard:
+    """Get or create the query guard singleton for a database file."""
+    key = Path(db_path).resolve()
+    with _guards_lock:
+        guard = _guards.get(key)
+        if guard is None:
+            guard = QueryGuard(key)
+            _guards[key] = guard
+        return guard
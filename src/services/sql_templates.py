@@ -0,0 +1,328 @@
+"""
+Verified NL-to-SQL templates for questions the agent has answered before.
+
+Canonical questions ("How many customers...", "top 10 cities by number of
+orders", "monthly revenue for 2018") otherwise cost at least two LLM
+round-trips each. After a successful agent run, the question is normalized
+into a pattern with parameter slots (years, numbers, state codes) and the
+executed SQL (plus the chart call, if any) is turned into a template by
+replacing the slot values. A template is served once independent agent runs
+have produced it MIN_CONFIRMATIONS times; run_data_analyst then executes it
+directly and only asks the model for the insight text, or skips the model
+entirely when SQL_TEMPLATE_INSIGHT=none.
+
+Templates live in a WAL-mode SQLite file, so every app worker uses them.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+from src.utils.shared_state import connect_shared_sqlite
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# ===============================
+# Template Configuration
+# ===============================
+
+# Set to 0 to always run the full agent
+TEMPLATES_ENABLED = os.environ.get("SQL_TEMPLATES", "1") != "0"
+
+# "llm" asks the model for the insight text only; "none" answers without any model call
+TEMPLATE_INSIGHT = os.environ.get("SQL_TEMPLATE_INSIGHT", "llm").lower()
+
+# Agent runs that must have produced the same template before it is served
+MIN_CONFIRMATIONS = int(os.environ.get("SQL_TEMPLATE_MIN_CONFIRMATIONS", "2"))
+
+TEMPLATE_DB_PATH = Path(os.environ.get(
+    "SQL_TEMPLATE_PATH",
+    Path(__file__).parent.parent.parent / "data" / "sql_templates.sqlite"
+))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sql_templates (
+    pattern TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    chart TEXT NOT NULL,
+    example TEXT NOT NULL,
+    confirmations INTEGER NOT NULL DEFAULT 1,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used_at REAL,
+    PRIMARY KEY (pattern, sql, chart)
+);
+"""
+
+# Brazilian state codes; only taken as slots when written in capitals ("SP", not "to")
+STATE_CODES = frozenset({
+    "AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA",
+    "PB", "PE", "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO",
+})
+
+# Leading phrases that do not change what is asked
+_PREFIXES = (
+    "please", "can you", "could you", "would you", "show me", "tell me", "give me",
+    "list", "what is", "what are", "whats", "what s", "i want", "id like", "i d like",
+)
+
+# Words dropped anywhere in the question
+_STOPWORDS = frozenset({"the", "a", "an", "please", "me"})
+
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|[A-Za-z]+")
+_YEAR = re.compile(r"(19|20)\d\d")
+_SLOT = re.compile(r"\{\{(\w+)\}\}")
+
+# Chart arguments stored with a template (the result handle is filled in per run)
+CHART_ARGS = ("chart_type", "x_column", "y_column", "title", "x_label", "y_label", "aggregate")
+
+
+@dataclass(frozen=True)
+class NormalizedQuestion:
+    """A question reduced to a pattern plus the values of its slots."""
+    pattern: str
+    params: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    """A verified template bound to the parameters of a new question."""
+    pattern: str
+    sql: str
+    chart: Optional[dict]
+    confirmations: int
+    template_sql: str
+    template_chart: str
+
+
+def normalize_question(question: str) -> NormalizedQuestion:
+    """
+    Normalize a question into a pattern with parameter slots.
+
+    Years become {year0}, other numbers {n0}, capitalized state codes
+    {state0} (numbered in order of appearance); the rest is lowercased with
+    punctuation, articles and polite prefixes removed.
+    """
+    words: list[str] = []
+    params: dict[str, str] = {}
+    counts = {"year": 0, "n": 0, "state": 0}
+
+    for token in _TOKEN.findall(question.replace("'", "")):
+        if token[0].isdigit():
+            kind = "year" if _YEAR.fullmatch(token) else "n"
+        elif token in STATE_CODES:
+            kind = "state"
+        else:
+            words.append(token.lower())
+            continue
+        name = f"{kind}{counts[kind]}"
+        counts[kind] += 1
+        params[name] = token
+        words.append(f"{{{name}}}")
+
+    text = " ".join(words)
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in _PREFIXES:
+            if text.startswith(prefix + " "):
+                text = text[len(prefix) + 1:]
+                stripped = True
+    pattern = " ".join(word for word in text.split() if word not in _STOPWORDS)
+    return NormalizedQuestion(pattern=pattern, params=params)
+
+
+def _value_regex(kind: str, value: str) -> re.Pattern:
+    if kind == "state":
+        return re.compile(rf"(?<=['\"]){value}(?=['\"])")
+    return re.compile(rf"(?<![\w.]){re.escape(value)}(?![\w.])")
+
+
+def _kind(name: str) -> str:
+    return name.rstrip("0123456789")
+
+
+def templatize(text: str, params: dict[str, str]) -> tuple[str, dict[str, int]]:
+    """Replace slot values in text with {{slot}} markers; returns the template and the replacements per slot."""
+    replacements = {}
+    for name, value in params.items():
+        text, replaced = _value_regex(_kind(name), value).subn(f"{{{{{name}}}}}", text)
+        if replaced:
+            replacements[name] = replaced
+    return text, replacements
+
+
+def render(template: str, params: dict[str, str]) -> str:
+    """Fill {{slot}} markers with parameter values."""
+    return _SLOT.sub(lambda match: params[match.group(1)], template)
+
+
+class SQLTemplateLibrary:
+    """SQLite-backed library of question patterns and their verified SQL."""
+
+    def __init__(self, db_path: Path = TEMPLATE_DB_PATH, min_confirmations: int = MIN_CONFIRMATIONS):
+        """
+        Args:
+            db_path: SQLite file holding the templates
+            min_confirmations: Agent runs that must agree on a template before it is served
+        """
+        self.db_path = Path(db_path)
+        self.min_confirmations = min_confirmations
+        self._lock = threading.Lock()
+        self._conn = connect_shared_sqlite(self.db_path)
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "learned": 0, "rejected": 0}
+        logger.info(f"SQL template library using {self.db_path}")
+
+    # ============================================================================
+    # Matching
+    # ============================================================================
+
+    def match(self, question: str) -> Optional[TemplateMatch]:
+        """Return the best verified template for a question, bound to its parameters."""
+        normalized = normalize_question(question)
+        if not normalized.pattern:
+            return None
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT sql, chart, confirmations FROM sql_templates "
+                    "WHERE pattern = ? AND confirmations >= ? "
+                    "ORDER BY confirmations DESC, created_at LIMIT 1",
+                    (normalized.pattern, self.min_confirmations)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"SQL template lookup failed: {str(e)}")
+            return None
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+
+        template_sql, template_chart, confirmations = row
+        slots = _SLOT.findall(template_sql)
+        if len(slots) != len(set(slots)):
+            # Stored before repeated slot values were rejected by learn()
+            self.stats["misses"] += 1
+            return None
+        chart = json.loads(template_chart) if template_chart else None
+        if chart is not None:
+            chart = {key: render(value, normalized.params) for key, value in chart.items()}
+        self.stats["hits"] += 1
+        return TemplateMatch(
+            pattern=normalized.pattern,
+            sql=render(template_sql, normalized.params),
+            chart=chart,
+            confirmations=confirmations,
+            template_sql=template_sql,
+            template_chart=template_chart,
+        )
+
+    def record_hit(self, match: TemplateMatch):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE sql_templates SET hits = hits + 1, last_used_at = ? "
+                    "WHERE pattern = ? AND sql = ? AND chart = ?",
+                    (time.time(), match.pattern, match.template_sql, match.template_chart)
+                )
+
+    def discard(self, match: TemplateMatch):
+        """Drop a template that failed when served; the agent answers instead."""
+        logger.warning(f"Discarding SQL template for '{match.pattern}'")
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM sql_templates WHERE pattern = ? AND sql = ? AND chart = ?",
+                    (match.pattern, match.template_sql, match.template_chart)
+                )
+
+    # ============================================================================
+    # Learning
+    # ============================================================================
+
+    def learn(self, question: str, sql: str, chart: Optional[dict] = None) -> bool:
+        """
+        Record the SQL (and chart call) of a successful agent run.
+
+        The run is skipped when it cannot be templated safely: two slots share
+        a value, a slot value does not appear in the SQL (the query would
+        ignore a new value) or appears more than once (it cannot tell which
+        occurrence came from the question, e.g. "top 5" with "< 5" and
+        "LIMIT 5"), or filling the template does not give back the original
+        SQL.
+
+        Returns:
+            True if the template was stored or confirmed
+        """
+        normalized = normalize_question(question)
+        params = normalized.params
+        if not normalized.pattern or "{{" in sql:
+            return self._reject(question, "nothing to template")
+        if len(set(params.values())) != len(params):
+            return self._reject(question, "ambiguous parameters")
+
+        template_sql, replacements = templatize(sql, params)
+        if set(replacements) != set(params) or render(template_sql, params) != sql:
+            return self._reject(question, "parameters not found in the SQL")
+        if any(count > 1 for count in replacements.values()):
+            return self._reject(question, "parameter value repeated in the SQL")
+
+        template_chart = ""
+        if chart is not None:
+            args = {key: str(chart[key]) for key in CHART_ARGS if chart.get(key)}
+            if any("{{" in value for value in args.values()):
+                return self._reject(question, "chart arguments cannot be templated")
+            template_args = {key: templatize(value, params)[0] for key, value in args.items()}
+            template_chart = json.dumps(template_args, sort_keys=True)
+
+        with self._lock:
+            with self._conn:
+                updated = self._conn.execute(
+                    "UPDATE sql_templates SET confirmations = confirmations + 1 "
+                    "WHERE pattern = ? AND sql = ? AND chart = ?",
+                    (normalized.pattern, template_sql, template_chart)
+                ).rowcount
+                if not updated:
+                    self._conn.execute(
+                        "INSERT INTO sql_templates (pattern, sql, chart, example, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (normalized.pattern, template_sql, template_chart, question, time.time())
+                    )
+        self.stats["learned"] += 1
+        logger.info(f"SQL template {'confirmed' if updated else 'recorded'} for '{normalized.pattern}'")
+        return True
+
+    def _reject(self, question: str, reason: str) -> bool:
+        self.stats["rejected"] += 1
+        logger.debug(f"Not templating '{question[:80]}': {reason}")
+        return False
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sql_templates").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM sql_templates")
+
+
+_library: Optional[SQLTemplateLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_template_library() -> SQLTemplateLibrary:
+    """Get or create the template library for this process."""
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                _library = SQLTemplateLibrary()
+    return _library
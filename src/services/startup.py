@@ -0,0 +1,188 @@
+"""
+Application boot sequence: background warm-up and readiness.
+
+The app module only imports what it needs to register its handlers, so the
+server starts listening quickly. Everything expensive (the agent module and
+LangGraph, the system prompt and schema index, the compiled workflow, the
+database pool, the columnar mirror, Plotly and, optionally, the Whisper
+workers) is loaded by a background thread started once the server is up.
+Handlers that need the agent await readiness instead of importing it on the
+event loop, and ``/readyz`` reports the state to load balancers.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, Optional
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# Start the Whisper workers during warm-up instead of on the first voice message
+TRANSCRIPTION_PRELOAD = os.environ.get("TRANSCRIPTION_PRELOAD", "1") != "0"
+
+READINESS_PATH = "/readyz"
+
+
+def _import_agent():
+    import src.services.data_analyst_agent  # noqa: F401
+
+
+def _build_prompt():
+    from src.prompts import get_data_analyst_system_prompt
+    from src.utils.schema_retriever import RETRIEVAL_ENABLED, get_schema_retriever
+
+    get_data_analyst_system_prompt()
+    if RETRIEVAL_ENABLED:
+        get_schema_retriever().retrieve("orders")
+
+
+def _build_workflow():
+    from src.services.data_analyst_agent import get_workflow
+
+    get_workflow()
+
+
+def _open_database():
+    from src.services.sql_engine import get_sql_engine
+
+    get_sql_engine().execute("SELECT 1", use_cache=False)
+
+
+def _load_columnar():
+    from src.services.columnar_engine import COLUMNAR_ENGINE_ENABLED, get_columnar_engine
+
+    if COLUMNAR_ENGINE_ENABLED:
+        engine = get_columnar_engine()
+        if not engine.is_fresh():
+            engine.refresh_in_background()
+
+
+def _import_charts():
+    import plotly.graph_objects  # noqa: F401
+
+
+def _start_transcription():
+    from src.services.voice_service import get_voice_service
+
+    get_voice_service().warm_up()
+
+
+# Steps that gate readiness, in order
+WARM_UP_STEPS: list[tuple[str, Callable[[], None]]] = [
+    ("agent_import", _import_agent),
+    ("prompt", _build_prompt),
+    ("workflow", _build_workflow),
+    ("database", _open_database),
+    ("columnar", _load_columnar),
+    ("charts", _import_charts),
+]
+
+
+class StartupState:
+    """Progress of the background warm-up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+
+    def begin(self, preload_transcription: bool = TRANSCRIPTION_PRELOAD):
+        """Start the warm-up thread once; later calls do nothing."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(
+                target=self._run, args=(preload_transcription,), name="startup-warm-up", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, preload_transcription: bool):
+        steps = list(WARM_UP_STEPS)
+        if preload_transcription:
+            steps.append(("transcription", _start_transcription))
+        for name, step in steps:
+            started = time.monotonic()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.error(f"Warm-up step {name} failed: {str(e)}")
+            self.steps[name] = round(time.monotonic() - started, 3)
+            if name == WARM_UP_STEPS[-1][0]:
+                # Core steps done: serve requests while the Whisper workers load
+                self.finished_at = time.monotonic()
+                self._done.set()
+                logger.info(f"Application ready after {self.finished_at - self.started_at:.2f}s warm-up: {self.steps}")
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def is_ready(self) -> bool:
+        core_errors = [name for name, _ in WARM_UP_STEPS if name in self.errors]
+        return self._done.is_set() and not core_errors
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the core warm-up without blocking the event loop. Returns False on timeout."""
+        if self._done.is_set():
+            return True
+        if not self.started:
+            self.begin()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._done.wait, timeout)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "warm_up_s": round(self.finished_at - self.started_at, 3) if self.finished_at else None,
+            "steps": dict(self.steps),
+            "errors": dict(self.errors),
+        }
+
+
+_state = StartupState()
+
+
+def begin_warm_up(preload_transcription: bool = TRANSCRIPTION_PRELOAD):
+    """Start the background warm-up (idempotent)."""
+    _state.begin(preload_transcription)
+
+
+def is_ready() -> bool:
+    return _state.is_ready()
+
+
+async def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    """Wait until the agent is loaded; starts the warm-up if nothing did."""
+    return await _state.wait(timeout)
+
+
+def readiness() -> dict:
+    """Readiness flag plus per-step warm-up timings (seconds) and errors."""
+    return _state.status()
+
+
+def register_readiness_route(app, path: str = READINESS_PATH):
+    """
+    Serve the readiness state on a FastAPI app: 200 when ready, 503 before.
+
+    The route is moved in front of the app's routes so catch-all routes
+    (Chainlit serves its frontend from one) do not shadow it.
+    """
+    from fastapi.responses import JSONResponse
+
+    if any(getattr(route, "path", None) == path for route in app.router.routes):
+        return
+
+    async def readyz():
+        status = readiness()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    app.add_api_route(path, readyz, methods=["GET"], include_in_schema=False)
+    app.router.routes.insert(0, app.router.routes.pop())
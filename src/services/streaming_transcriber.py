@@ -0,0 +1,212 @@
+"""
+Incremental transcription of a PCM16 voice stream.
+
+Audio chunks are fed in while the user is still speaking. An energy-based
+voice activity detector splits the stream into utterances at pauses; each
+closed segment is sent to the transcription pool right away. When recording
+stops, only the tail after the last pause is left to transcribe, so the time
+from end of speech to the agent run is one short decode instead of a decode
+of the whole recording.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+import numpy as np
+from src.services.transcription_pool import TranscriptionPool, get_transcription_pool
+from src.utils.audio_utils import WHISPER_SAMPLE_RATE, frame_energy_db, pcm16_to_float32, resample
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# ===============================
+# VAD Configuration
+# ===============================
+
+# Set to 0 to transcribe recordings in one pass after they end
+STREAMING_TRANSCRIPTION = os.environ.get("STREAMING_TRANSCRIPTION", "1") != "0"
+
+FRAME_MS = 30
+
+# Pause that closes a segment
+SILENCE_MS = int(os.environ.get("VAD_SILENCE_MS", "500"))
+
+# Past this length a segment closes on half the pause, keeping the final tail short
+SOFT_SEGMENT_S = 5.0
+
+# Segments with less speech than this are dropped (clicks, breaths)
+MIN_SPEECH_MS = int(os.environ.get("VAD_MIN_SPEECH_MS", "250"))
+
+# Long utterances are cut at their quietest frame once they reach this length
+MAX_SEGMENT_S = float(os.environ.get("VAD_MAX_SEGMENT_S", "15"))
+
+# Audio kept before speech onset so the first syllable is not clipped
+PRE_ROLL_MS = 200
+
+# A frame is speech when louder than both the absolute floor and the noise floor plus the margin
+SPEECH_FLOOR_DB = float(os.environ.get("VAD_SPEECH_FLOOR_DB", "-45"))
+NOISE_MARGIN_DB = 10.0
+
+
+class StreamingTranscriber:
+    """
+    Segments one recording with a VAD and transcribes segments as they close.
+
+    feed() must be called from the event loop; transcriptions run as tasks
+    on the transcription pool.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        pool: Optional[TranscriptionPool] = None,
+        language: Optional[str] = None,
+        silence_ms: int = SILENCE_MS,
+        min_speech_ms: int = MIN_SPEECH_MS,
+        max_segment_s: float = MAX_SEGMENT_S
+    ):
+        """
+        Args:
+            sample_rate: Sample rate of the incoming PCM16 stream
+            pool: Transcription pool (defaults to the shared one)
+            language: Optional language code passed to Whisper
+            silence_ms: Pause in milliseconds that closes a segment
+            min_speech_ms: Minimum speech in a segment worth transcribing
+            max_segment_s: Maximum segment length in seconds
+        """
+        self.sample_rate = sample_rate
+        self.pool = pool or get_transcription_pool()
+        self.language = language
+
+        self.frame_length = sample_rate * FRAME_MS // 1000
+        self._frame_bytes = self.frame_length * 2
+        self._silence_frames = max(1, silence_ms // FRAME_MS)
+        self._min_speech_frames = max(1, min_speech_ms // FRAME_MS)
+        self._max_segment_frames = max(1, int(max_segment_s * 1000) // FRAME_MS)
+        self._soft_segment_frames = min(self._max_segment_frames, int(SOFT_SEGMENT_S * 1000) // FRAME_MS)
+
+        self._bytes = bytearray()
+        self._pre_roll: deque[np.ndarray] = deque(maxlen=max(1, PRE_ROLL_MS // FRAME_MS))
+        self._segment: list[np.ndarray] = []
+        self._segment_energy: list[float] = []
+        self._speech_frames = 0
+        self._trailing_silence = 0
+        self._noise_floor: Optional[float] = None
+
+        self._jobs: list[asyncio.Task] = []
+        self.total_frames = 0
+
+    # ============================================================================
+    # Segmentation
+    # ============================================================================
+
+    def feed(self, data: bytes):
+        """Add PCM16 bytes from the stream, starting a transcription for every closed segment."""
+        self._bytes.extend(data)
+        usable = len(self._bytes) - len(self._bytes) % self._frame_bytes
+        if not usable:
+            return
+        with memoryview(self._bytes) as view:
+            frames = pcm16_to_float32(view[:usable]).reshape(-1, self.frame_length)
+        del self._bytes[:usable]
+        for frame, energy in zip(frames, frame_energy_db(frames)):
+            self._push(frame, float(energy))
+
+    def _is_speech(self, energy: float) -> bool:
+        threshold = SPEECH_FLOOR_DB
+        if self._noise_floor is not None:
+            threshold = max(threshold, self._noise_floor + NOISE_MARGIN_DB)
+        speech = energy > threshold
+        if not speech:
+            # Track background level on non-speech frames only
+            self._noise_floor = energy if self._noise_floor is None else 0.95 * self._noise_floor + 0.05 * energy
+        return speech
+
+    def _push(self, frame: np.ndarray, energy: float):
+        self.total_frames += 1
+        speech = self._is_speech(energy)
+
+        if not self._segment:
+            if not speech:
+                self._pre_roll.append(frame)
+                return
+            self._segment.extend(self._pre_roll)
+            self._segment_energy.extend([energy] * len(self._pre_roll))
+            self._pre_roll.clear()
+
+        self._segment.append(frame)
+        self._segment_energy.append(energy)
+        if speech:
+            self._speech_frames += 1
+            self._trailing_silence = 0
+        else:
+            self._trailing_silence += 1
+
+        silence_needed = self._silence_frames
+        if len(self._segment) >= self._soft_segment_frames:
+            silence_needed = max(1, silence_needed // 2)
+        if self._trailing_silence >= silence_needed:
+            self._close_segment()
+        elif len(self._segment) >= self._max_segment_frames:
+            self._split_segment()
+
+    def _split_segment(self):
+        """Cut an over-long segment at its quietest frame in the second half."""
+        half = len(self._segment) // 2
+        cut = half + int(np.argmin(self._segment_energy[half:]))
+        carry = self._segment[cut + 1:]
+        carry_energy = self._segment_energy[cut + 1:]
+        del self._segment[cut + 1:]
+        self._close_segment(force=True)
+        self._segment = carry
+        self._segment_energy = carry_energy
+        self._speech_frames = len(carry)
+
+    def _close_segment(self, force: bool = False):
+        """Hand the current segment to the pool if it holds enough speech."""
+        frames, self._segment = self._segment, []
+        self._segment_energy = []
+        speech_frames, self._speech_frames = self._speech_frames, 0
+        self._trailing_silence = 0
+        if not frames or (speech_frames < self._min_speech_frames and not force):
+            return
+
+        audio = resample(np.concatenate(frames), self.sample_rate, WHISPER_SAMPLE_RATE)
+        index = len(self._jobs)
+        logger.debug(f"Voice segment {index} closed: {audio.size / WHISPER_SAMPLE_RATE:.2f}s")
+        self._jobs.append(asyncio.ensure_future(self.pool.transcribe(audio, language=self.language)))
+
+    # ============================================================================
+    # Results
+    # ============================================================================
+
+    async def finish(self) -> str:
+        """
+        Close the stream: transcribe the tail and return the full text.
+
+        Raises:
+            Exception: The first segment failure (e.g. TranscriptionQueueFull);
+                callers can fall back to transcribing the whole recording
+        """
+        started = time.monotonic()
+        if self._bytes:
+            padding = self._frame_bytes - len(self._bytes) % self._frame_bytes
+            self.feed(b"\0" * padding)
+        self._close_segment()
+
+        results = await asyncio.gather(*self._jobs, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        text = " ".join(result.text for result in results if result.text)
+        logger.info(
+            f"Streaming transcription: {len(results)} segment(s), "
+            f"{self.total_frames * FRAME_MS / 1000:.1f}s of audio, tail {time.monotonic() - started:.2f}s"
+        )
+        return text
+
+    def cancel(self):
+        """Cancel segment transcriptions that are still pending."""
+        for job in self._jobs:
+            job.cancel()
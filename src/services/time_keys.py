@@ -0,0 +1,343 @@
+"""
+Integer time keys for the orders timestamps.
+
+The Olist timestamps are TEXT, so every time-based question makes SQLite
+run strftime() on each row. Migration 2 adds the shadow table
+order_time_keys: one row per order_id with the epoch seconds and the year,
+year-month, year-week and day of each of the purchase, approved, delivered
+and estimated timestamps as integers (2018, 201801, 201805, 20180115),
+indexed and kept in sync by triggers. It is keyed by order_id rather than
+rowid because VACUUM may renumber the rowids of orders; the key column is
+called order_ref so unqualified order_id references stay unambiguous.
+
+The rewriter joins the shadow table into queries that filter on
+strftime('%Y'), strftime('%Y-%m'), strftime('%Y-%W'), strftime('%Y-%m-%d')
+or date() of those columns: WHERE filters compare the indexed integer keys,
+GROUP BY groups on them, and selected values are formatted back from the key with
+printf(), so results are unchanged.
+"""
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+from src.services.sql_engine import DB_PATH
+from src.utils.query_cache import database_fingerprint
+from src.utils.sql_parser import (
+    BinOp, Column, Expr, Func, Literal, Predicate, SQLParseError, SelectQuery, Star,
+    parse_select, quote_identifier, render_literal,
+)
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+TIME_KEYS_TABLE = "order_time_keys"
+
+# Alias of the shadow table in rewritten queries
+TIME_KEYS_ALIAS = "otk"
+
+# orders timestamp column -> key column prefix
+TIME_COLUMNS = {
+    "order_purchase_timestamp": "purchase",
+    "order_approved_at": "approved",
+    "order_delivered_customer_date": "delivered",
+    "order_estimated_delivery_date": "estimated",
+}
+
+
+@dataclass(frozen=True)
+class TimeKey:
+    """A time bucket stored as an integer key."""
+    name: str
+    build_format: str
+    literal: re.Pattern
+    label: str
+
+    def to_int(self, value: str) -> int:
+        return int(value.replace("-", ""))
+
+
+# strftime format (as written by the agent) -> key
+TIME_KEYS = {
+    "%Y": TimeKey("year", "%Y", re.compile(r"\d{4}"), "printf('%04d', {key})"),
+    "%Y-%m": TimeKey("month", "%Y%m", re.compile(r"\d{4}-\d{2}"), "printf('%04d-%02d', {key} / 100, {key} % 100)"),
+    "%Y-%W": TimeKey("week", "%Y%W", re.compile(r"\d{4}-\d{2}"), "printf('%04d-%02d', {key} / 100, {key} % 100)"),
+    "%Y-%m-%d": TimeKey(
+        "day", "%Y%m%d", re.compile(r"\d{4}-\d{2}-\d{2}"),
+        "printf('%04d-%02d-%02d', {key} / 10000, {key} / 100 % 100, {key} % 100)"
+    ),
+}
+
+# Key columns indexed for every timestamp (purchase dates also get year and week)
+INDEXED_KEYS = ("month", "day")
+INDEXED_PURCHASE_KEYS = ("year", "month", "week", "day", "epoch")
+
+
+# ================================================================================
+# Migration
+# ================================================================================
+
+def _key_columns() -> list[tuple[str, str]]:
+    """(column name, SQL computing it from the orders row NEW.<column>) for every key."""
+    columns = []
+    for source, prefix in TIME_COLUMNS.items():
+        columns.append((f"{prefix}_epoch", f"CAST(strftime('%s', {{row}}.{source}) AS INTEGER)"))
+        for key in TIME_KEYS.values():
+            columns.append((f"{prefix}_{key.name}", f"CAST(strftime('{key.build_format}', {{row}}.{source}) AS INTEGER)"))
+    return columns
+
+
+def create_time_keys(conn: sqlite3.Connection):
+    """Create, fill and index order_time_keys, plus the triggers that keep it in sync with orders."""
+    columns = _key_columns()
+    definitions = ", ".join(f"{name} INTEGER" for name, _ in columns)
+    names = ", ".join(name for name, _ in columns)
+
+    def values(row: str) -> str:
+        return ", ".join(sql.format(row=row) for _, sql in columns)
+
+    conn.execute(f"DROP TABLE IF EXISTS {TIME_KEYS_TABLE}")
+    conn.execute(f"CREATE TABLE {TIME_KEYS_TABLE} (order_ref TEXT PRIMARY KEY, {definitions}) WITHOUT ROWID")
+    conn.execute(
+        f"INSERT INTO {TIME_KEYS_TABLE} (order_ref, {names}) SELECT o.order_id, {values('o')} FROM orders o"
+    )
+
+    for prefix in TIME_COLUMNS.values():
+        keys = INDEXED_PURCHASE_KEYS if prefix == "purchase" else INDEXED_KEYS
+        for key in keys:
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{TIME_KEYS_TABLE}_{prefix}_{key} "
+                f"ON {TIME_KEYS_TABLE} ({prefix}_{key})"
+            )
+
+    upsert = f"INSERT OR REPLACE INTO {TIME_KEYS_TABLE} (order_ref, {names}) VALUES (NEW.order_id, {values('NEW')});"
+    conn.execute(f"DROP TRIGGER IF EXISTS {TIME_KEYS_TABLE}_insert")
+    conn.execute(f"CREATE TRIGGER {TIME_KEYS_TABLE}_insert AFTER INSERT ON orders BEGIN {upsert} END")
+    conn.execute(f"DROP TRIGGER IF EXISTS {TIME_KEYS_TABLE}_update")
+    conn.execute(
+        f"CREATE TRIGGER {TIME_KEYS_TABLE}_update AFTER UPDATE ON orders BEGIN "
+        f"DELETE FROM {TIME_KEYS_TABLE} WHERE order_ref = OLD.order_id; {upsert} END"
+    )
+    conn.execute(f"DROP TRIGGER IF EXISTS {TIME_KEYS_TABLE}_delete")
+    conn.execute(
+        f"CREATE TRIGGER {TIME_KEYS_TABLE}_delete AFTER DELETE ON orders BEGIN "
+        f"DELETE FROM {TIME_KEYS_TABLE} WHERE order_ref = OLD.order_id; END"
+    )
+
+
+# ================================================================================
+# Query Rewriter
+# ================================================================================
+
+class TimeKeysNotApplicable(Exception):
+    """Raised when a query cannot be moved onto the time keys."""
+
+
+class _Rewriter:
+    """Renders one parsed query with time functions of orders timestamps replaced by key columns."""
+
+    def __init__(self, query: SelectQuery):
+        self.query = query
+        aliases = query.aliases()
+        if TIME_KEYS_ALIAS in aliases or TIME_KEYS_TABLE in query.tables:
+            raise TimeKeysNotApplicable("Shadow table alias already in use")
+        references = [(query.table, query.alias, "inner")] + [(j.table, j.alias, j.kind) for j in query.joins]
+        orders = [(alias or table, kind) for table, alias, kind in references if table == "orders"]
+        if len(orders) != 1:
+            raise TimeKeysNotApplicable("Query must read orders exactly once")
+        self.orders, self.orders_join = orders[0]
+        self.names = {name for name, table in aliases.items() if table == "orders"}
+        self.filtered = False
+
+    def time_key(self, expr: Expr) -> Optional[tuple[TimeKey, str]]:
+        """Return (key, prefix) if expr is a supported time function of an orders timestamp."""
+        if not isinstance(expr, Func) or expr.distinct:
+            return None
+        if expr.name == "strftime" and len(expr.args) == 2:
+            fmt, column = expr.args
+            if not isinstance(fmt, Literal) or fmt.value not in TIME_KEYS:
+                return None
+            key = TIME_KEYS[fmt.value]
+        elif expr.name == "date" and len(expr.args) == 1:
+            column, key = expr.args[0], TIME_KEYS["%Y-%m-%d"]
+        else:
+            return None
+        if not isinstance(column, Column) or column.name not in TIME_COLUMNS:
+            return None
+        if column.table is not None and column.table not in self.names:
+            return None
+        return key, TIME_COLUMNS[column.name]
+
+    def key_column(self, key: TimeKey, prefix: str) -> str:
+        return f"{TIME_KEYS_ALIAS}.{prefix}_{key.name}"
+
+    def label(self, key: TimeKey, prefix: str) -> str:
+        column = self.key_column(key, prefix)
+        return f"CASE WHEN {column} IS NULL THEN NULL ELSE {key.label.format(key=column)} END"
+
+    def expr(self, expr: Expr) -> str:
+        """Render an expression, formatting time functions from their keys."""
+        match = self.time_key(expr)
+        if match is not None:
+            return self.label(*match)
+        if isinstance(expr, Column):
+            return f"{expr.table}.{expr.name}" if expr.table else expr.name
+        if isinstance(expr, Literal):
+            return render_literal(expr.value)
+        if isinstance(expr, Star):
+            return "*"
+        if isinstance(expr, Func):
+            args = ", ".join(self.expr(arg) for arg in expr.args)
+            return f"{expr.name.upper()}({'DISTINCT ' if expr.distinct else ''}{args})"
+        if isinstance(expr, BinOp):
+            return f"({self.expr(expr.left)} {expr.op} {self.expr(expr.right)})"
+        raise TimeKeysNotApplicable(f"Cannot render {expr!r}")
+
+    def predicate(self, predicate: Predicate) -> str:
+        """Render a WHERE predicate, comparing keys when the literals have the key's format."""
+        match = self.time_key(predicate.expr)
+        values = predicate.values
+        if match is not None and all(isinstance(v, str) and match[0].literal.fullmatch(v) for v in values):
+            key, prefix = match
+            expr = self.key_column(key, prefix)
+            self.filtered = True
+            values = tuple(key.to_int(value) for value in values)
+        else:
+            expr = self.expr(predicate.expr)
+        if predicate.op in ("is null", "is not null"):
+            return f"{expr} {predicate.op.upper()}"
+        if predicate.op in ("in", "not in"):
+            return f"{expr} {predicate.op.upper()} ({', '.join(render_literal(v) for v in values)})"
+        if predicate.op in ("between", "not between"):
+            low, high = values
+            return f"{expr} {predicate.op.upper()} {render_literal(low)} AND {render_literal(high)}"
+        return f"{expr} {predicate.op} {render_literal(values[0])}"
+
+    def group_term(self, expr: Expr) -> str:
+        """Group on the key itself when the term (or the item it refers to) is a time function."""
+        target = expr
+        if isinstance(expr, Literal) and isinstance(expr.value, int) and 1 <= expr.value <= len(self.query.items):
+            target = self.query.items[expr.value - 1].expr
+        elif isinstance(expr, Column) and expr.table is None:
+            items = [item for item in self.query.items if item.alias and item.alias.lower() == expr.name]
+            if items:
+                target = items[0].expr
+        match = self.time_key(target)
+        return self.key_column(*match) if match is not None else self.expr(expr)
+
+    def order_term(self, expr: Expr) -> str:
+        if isinstance(expr, Literal) and isinstance(expr.value, int):
+            return str(expr.value)
+        return self.expr(expr)
+
+    def select_item(self, item) -> str:
+        if isinstance(item.expr, Star):
+            # Only the query's own tables, not the joined key columns
+            sources = [self.query.alias or self.query.table] + [j.alias or j.table for j in self.query.joins]
+            return ", ".join(f"{source}.*" for source in sources)
+        return f"{self.expr(item.expr)} AS {quote_identifier(item.output_name)}"
+
+    def render(self) -> str:
+        query = self.query
+        items = ", ".join(self.select_item(item) for item in query.items)
+        conditions = [self.predicate(predicate) for predicate in query.where]
+        groups = [self.group_term(expr) for expr in query.group_by]
+        orders = [self.order_term(o.expr) + (" DESC" if o.descending else "") for o in query.order_by]
+        # Without a key filter the extra join costs more than the strftime() calls it saves
+        if not self.filtered:
+            raise TimeKeysNotApplicable("No filter on a time function of orders timestamps")
+
+        sql = f"SELECT {'DISTINCT ' if query.distinct else ''}{items} FROM {query.table}"
+        if query.alias:
+            sql += f" {query.alias}"
+        for join in query.joins:
+            on = " AND ".join(f"{self.expr(left)} = {self.expr(right)}" for left, right in join.on)
+            sql += f" {'LEFT JOIN' if join.kind == 'left' else 'JOIN'} {join.table}"
+            sql += f" {join.alias} ON {on}" if join.alias else f" ON {on}"
+        # Every orders row has a key row, so an inner join keeps the row count
+        kind = "LEFT JOIN" if self.orders_join == "left" else "JOIN"
+        sql += f" {kind} {TIME_KEYS_TABLE} {TIME_KEYS_ALIAS} ON {TIME_KEYS_ALIAS}.order_ref = {self.orders}.order_id"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        if groups:
+            sql += f" GROUP BY {', '.join(groups)}"
+        if orders:
+            sql += f" ORDER BY {', '.join(orders)}"
+        if query.limit is not None:
+            sql += f" LIMIT {query.limit}"
+            if query.offset is not None:
+                sql += f" OFFSET {query.offset}"
+        return sql
+
+
+def rewrite_query(query: str) -> Optional[str]:
+    """
+    Move strftime()/date() of orders timestamps onto order_time_keys.
+
+    Returns:
+        The rewritten query, or None if it has nothing to rewrite
+    """
+    try:
+        return _Rewriter(parse_select(query)).render()
+    except (SQLParseError, TimeKeysNotApplicable) as e:
+        logger.debug(f"Time key rewrite not applicable: {str(e)}")
+        return None
+
+
+class TimeKeyRewriter:
+    """Rewrites queries onto the time keys when the database has them."""
+
+    def __init__(self, db_path: Path = DB_PATH, has_table: Optional[Callable[[Path], bool]] = None):
+        self.db_path = Path(db_path)
+        self._has_table = has_table or _has_time_keys
+        self._lock = threading.Lock()
+        self._available: tuple = (None, False)
+
+    def available(self) -> bool:
+        """Return True if the database has order_time_keys (checked once per database version)."""
+        fingerprint = database_fingerprint(self.db_path)
+        cached_fingerprint, available = self._available
+        if cached_fingerprint == fingerprint:
+            return available
+        available = self._has_table(self.db_path)
+        with self._lock:
+            self._available = (fingerprint, available)
+        return available
+
+    def rewrite(self, query: str) -> Optional[str]:
+        """Return the query moved onto the time keys, or None to run it as-is."""
+        if not self.available():
+            return None
+        rewritten = rewrite_query(query)
+        if rewritten is not None:
+            logger.info("Filtering and grouping on integer time keys")
+        return rewritten
+
+
+def _has_time_keys(db_path: Path) -> bool:
+    if not db_path.exists():
+        return False
+    try:
+        conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            row = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TIME_KEYS_TABLE,)
+            ).fetchone()
+            return row is not None
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not check for {TIME_KEYS_TABLE}: {str(e)}")
+        return False
+
+
+_rewriter: Optional[TimeKeyRewriter] = None
+
+
+def get_time_key_rewriter() -> TimeKeyRewriter:
+    """Get or create the time key rewriter singleton."""
+    global _rewriter
+    if _rewriter is None:
+        _rewriter = TimeKeyRewriter()
+    return _rewriter
@@ -0,0 +1,266 @@
+"""
+Process pool for Whisper transcription.
+
+A Whisper decode is seconds of CPU work. Running it in the app process blocks
+the event loop (and every text chat with it), and the GIL rules out a thread
+pool. Transcriptions therefore run in separate worker processes that load the
+model once, in the pool initializer. Jobs pass through a bounded queue: when
+it is full, callers wait up to a deadline for a slot and are then rejected,
+so a burst of voice messages cannot pile up unbounded work.
+"""
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Optional
+from src.utils.audio_utils import WHISPER_SAMPLE_RATE
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# ===============================
+# Pool Configuration
+# ===============================
+
+# Worker processes, each holding one Whisper model in memory
+TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", "1"))
+
+# Jobs admitted at once (running plus waiting for a worker)
+MAX_PENDING_JOBS = int(os.environ.get("TRANSCRIPTION_MAX_PENDING", "8"))
+
+# Seconds a job may wait for a queue slot before it is rejected
+QUEUE_TIMEOUT = float(os.environ.get("TRANSCRIPTION_QUEUE_TIMEOUT", "10"))
+
+# Seconds a job may take once admitted
+JOB_TIMEOUT = float(os.environ.get("TRANSCRIPTION_TIMEOUT", "300"))
+
+# Latency samples kept for the percentiles in stats()
+LATENCY_WINDOW = 256
+
+
+class TranscriptionQueueFull(Exception):
+    """Raised when no queue slot frees up within the queue timeout."""
+
+    def __init__(self, pending: int):
+        self.pending = pending
+        super().__init__(f"Transcription queue is full ({pending} jobs pending)")
+
+
+@dataclass
+class Transcription:
+    """Text and metadata returned by a worker."""
+    text: str
+    language: str
+    elapsed: float
+
+
+# ================================================================================
+# Worker Process
+# ================================================================================
+
+_worker_model = None
+
+
+def _init_worker(model_size: str, threads: int):
+    """Pool initializer: load the Whisper model once per worker process."""
+    global _worker_model
+    import torch
+    import whisper
+
+    torch.set_num_threads(threads)
+    started = time.monotonic()
+    _worker_model = whisper.load_model(model_size)
+    logger.info(f"Transcription worker {os.getpid()} loaded Whisper '{model_size}' in {time.monotonic() - started:.1f}s")
+
+
+def _transcribe_in_worker(audio: Any, language: Optional[str]) -> Transcription:
+    options = {"language": language} if language else {}
+    started = time.monotonic()
+    result = _worker_model.transcribe(audio, **options)
+    return Transcription(
+        text=result.get("text", "").strip(),
+        language=result.get("language", "unknown"),
+        elapsed=time.monotonic() - started
+    )
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# ================================================================================
+# Pool
+# ================================================================================
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * q)))]
+
+
+class TranscriptionPool:
+    """Bounded async front end to a process pool of Whisper workers."""
+
+    def __init__(
+        self,
+        model_size: str = "base",
+        workers: int = TRANSCRIPTION_WORKERS,
+        max_pending: int = MAX_PENDING_JOBS,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        job_timeout: float = JOB_TIMEOUT
+    ):
+        """
+        Args:
+            model_size: Whisper model size loaded by every worker
+            workers: Number of worker processes
+            max_pending: Jobs admitted at once; further callers wait for a slot
+            queue_timeout: Seconds to wait for a slot before rejecting a job
+            job_timeout: Seconds an admitted job may take
+        """
+        self.model_size = model_size
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.queue_timeout = queue_timeout
+        self.job_timeout = job_timeout
+
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._pending = 0
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0, "cancelled": 0, "timed_out": 0}
+        self._queue_wait: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._latency: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                # spawn: forking a process that already runs threads and an event loop is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=mp.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_size, threads)
+                )
+                logger.info(f"Started transcription pool: {self.workers} worker(s), {threads} thread(s) each")
+            return self._executor
+
+    def _reset_executor(self):
+        """Drop a broken pool so the next job starts a fresh one."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self):
+        """Start the worker processes (and load their models) ahead of the first job."""
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_ping)
+
+    async def transcribe(self, audio: Any, language: Optional[str] = None) -> Transcription:
+        """
+        Transcribe audio in a worker process without blocking the event loop.
+
+        Cancelling the awaiting task cancels the job if it has not started yet;
+        a job already running finishes in its worker and its result is dropped.
+
+        Args:
+            audio: Path to an audio file, or float32 samples at 16 kHz (NumPy array)
+            language: Optional language code, auto-detected when omitted
+
+        Returns:
+            Transcription from the worker
+
+        Raises:
+            TranscriptionQueueFull: If no slot freed up within the queue timeout
+            asyncio.TimeoutError: If the job ran past the job timeout
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        queued_at = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._counters["rejected"] += 1
+            logger.warning(f"Transcription rejected: {self._pending} jobs pending")
+            raise TranscriptionQueueFull(self._pending) from None
+        finally:
+            self._waiting -= 1
+
+        self._pending += 1
+        started = time.monotonic()
+        self._queue_wait.append(started - queued_at)
+        try:
+            future = self._get_executor().submit(_transcribe_in_worker, audio, language)
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.job_timeout)
+        except asyncio.CancelledError:
+            self._counters["cancelled"] += 1
+            raise
+        except asyncio.TimeoutError:
+            self._counters["timed_out"] += 1
+            raise
+        except BrokenProcessPool:
+            self._counters["failed"] += 1
+            logger.error("Transcription worker died, restarting the pool")
+            self._reset_executor()
+            raise
+        except Exception:
+            self._counters["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+            self._slots.release()
+
+        self._counters["completed"] += 1
+        self._latency.append(time.monotonic() - started)
+        source = audio if isinstance(audio, str) else f"{len(audio) / WHISPER_SAMPLE_RATE:.1f}s of audio"
+        logger.info(
+            f"Transcribed {source} in {result.elapsed:.2f}s "
+            f"(queued {started - queued_at:.2f}s, {self._pending} pending)"
+        )
+        return result
+
+    def stats(self) -> dict:
+        """Queue depth, counters and latency percentiles (seconds)."""
+        queue_wait = list(self._queue_wait)
+        latency = list(self._latency)
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "queue_depth": self._waiting,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            **self._counters,
+            "queue_wait_p50": round(_percentile(queue_wait, 0.50), 3),
+            "queue_wait_p95": round(_percentile(queue_wait, 0.95), 3),
+            "latency_p50": round(_percentile(latency, 0.50), 3),
+            "latency_p95": round(_percentile(latency, 0.95), 3),
+        }
+
+    def shutdown(self):
+        """Stop the worker processes, cancelling jobs that have not started."""
+        self._reset_executor()
+
+
+_pool: Optional[TranscriptionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_transcription_pool(model_size: str = "base") -> TranscriptionPool:
+    """Get or create the transcription pool singleton."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = TranscriptionPool(model_size=model_size)
+    return _pool
@@ -1,8 +1,10 @@
 import os
 import tempfile
 from pathlib import Path
-from typing import Optional
-import whisper
+from typing import Optional, Union
+import numpy as np
+from src.services.transcription_pool import TranscriptionQueueFull, get_transcription_pool
+from src.utils.audio_utils import WHISPER_SAMPLE_RATE
 from src.logger import setup_application_logger
 
 logger = setup_application_logger(__name__)
@@ -34,14 +36,16 @@ def _add_ffmpeg_to_path():
     logger.warning("FFmpeg not found in PATH or common installation locations.")
     return False
 
-_add_ffmpeg_to_path()
-
 
 class VoiceService:
-    """Handles voice-to-text transcription using local Whisper model."""
+    """
+    Handles voice-to-text transcription using local Whisper model.
+
+    The model is loaded and run in the transcription pool's worker processes,
+    never in the app process, so a decode does not block the event loop.
+    """
     
     _instance = None
-    _model = None
     
     def __new__(cls, model_size: str = "base"):
         """Singleton pattern to avoid loading model multiple times."""
@@ -66,60 +70,63 @@ class VoiceService:
         if self._initialized:
             return
             
+        # Before the pool starts: its worker processes inherit PATH
+        _add_ffmpeg_to_path()
         self.model_size = model_size
-        logger.info(f"Loading Whisper model: {model_size}")
-        
-        try:
-            self._model = whisper.load_model(model_size)
-            logger.info(f"Whisper model '{model_size}' loaded successfully")
-            self._initialized = True
-        except Exception as e:
-            logger.error(f"Failed to load Whisper model: {str(e)}")
-            raise
+        self._pool = get_transcription_pool(model_size)
+        self._initialized = True
     
-    async def transcribe(self, audio_path: str, language: Optional[str] = None) -> Optional[str]:
+    async def transcribe(self, audio: Union[str, np.ndarray], language: Optional[str] = None) -> Optional[str]:
         """
-        Transcribe audio file to text using local Whisper model.
+        Transcribe audio to text using local Whisper model.
         
         Args:
-            audio_path: Path to the audio file (supports wav, mp3, webm, etc.)
+            audio: Path to the audio file (supports wav, mp3, webm, etc.), or float32
+                   samples at 16 kHz, which Whisper decodes without ffmpeg
             language: Optional language code (e.g., 'en', 'ar'). Auto-detected if not specified.
             
         Returns:
             Transcribed text or None if transcription failed.
+
+        Raises:
+            TranscriptionQueueFull: If too many transcriptions are already pending
         """
         try:
-            logger.info(f"Transcribing audio file: {audio_path}")
-            
-            if not os.path.exists(audio_path):
-                logger.error(f"Audio file not found: {audio_path}")
-                return None
-            
-            # Transcribe using Whisper
-            options = {}
-            if language:
-                options["language"] = language
+            if isinstance(audio, str):
+                logger.info(f"Transcribing audio file: {audio}")
+                
+                if not os.path.exists(audio):
+                    logger.error(f"Audio file not found: {audio}")
+                    return None
+            else:
+                logger.info(f"Transcribing {audio.size / WHISPER_SAMPLE_RATE:.1f}s of in-memory audio")
             
-            result = self._model.transcribe(audio_path, **options)
+            # Transcribe using Whisper in a pool worker
+            result = await self._pool.transcribe(audio, language=language)
             
-            transcribed_text = result.get("text", "").strip()
-            detected_language = result.get("language", "unknown")
+            logger.info(f"Transcription complete. Language: {result.language}, Length: {len(result.text)} chars")
             
-            logger.info(f"Transcription complete. Language: {detected_language}, Length: {len(transcribed_text)} chars")
-            
-            return transcribed_text
+            return result.text
             
+        except TranscriptionQueueFull:
+            raise
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
             logger.error(f"Transcription failed: {str(e)}\n{error_details}")
             return None
     
+    def warm_up(self):
+        """Start the transcription workers so the first voice message does not wait for Whisper to load."""
+        self._pool.warm_up()
+    
     def get_model_info(self) -> dict:
         """Get information about the loaded model."""
+        pool_stats = self._pool.stats()
         return {
             "model_size": self.model_size,
-            "loaded": self._model is not None
+            "loaded": pool_stats["started"],
+            "pool": pool_stats
         }
 
 
@@ -0,0 +1,103 @@
+"""
+NumPy helpers for raw voice input.
+
+Chainlit streams microphone audio as little-endian 16-bit mono PCM (at the
+configured sample rate, 24 kHz by default); Whisper expects float32 samples
+in [-1, 1] at 16 kHz.
+"""
+from functools import lru_cache
+from math import gcd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Sample rate Whisper models are trained on
+WHISPER_SAMPLE_RATE = 16000
+
+# Floor for energy values in dBFS (digital silence)
+SILENCE_DB = -100.0
+
+# Largest up/down factor resampled with the polyphase filter; other ratios interpolate
+MAX_POLYPHASE_FACTOR = 64
+
+# Filter half-length in input periods of the slower rate, and Kaiser window shape
+FILTER_HALF_PERIODS = 16
+KAISER_BETA = 8.0
+
+
+def pcm16_to_float32(data) -> np.ndarray:
+    """
+    Convert little-endian 16-bit PCM to float32 samples in [-1, 1].
+
+    Accepts any buffer (bytes, bytearray, memoryview); the int16 view is
+    taken without copying and the only allocation is the float32 result.
+    """
+    samples = np.frombuffer(data, dtype="<i2")
+    audio = samples.astype(np.float32)
+    audio *= 1.0 / 32768.0
+    return audio
+
+
+@lru_cache(maxsize=8)
+def _polyphase_filter(up: int, down: int) -> tuple[np.ndarray, int]:
+    """Kaiser-windowed sinc low-pass for rational resampling, and its half length."""
+    factor = max(up, down)
+    half_length = FILTER_HALF_PERIODS * factor
+    n = np.arange(-half_length, half_length + 1, dtype=np.float64)
+    cutoff = 1.0 / factor
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(n.size, KAISER_BETA)
+    # Zero-stuffing by `up` divides the signal energy by `up`; compensate in the gain
+    return (taps * up).astype(np.float32), half_length
+
+
+def _resample_poly(audio: np.ndarray, up: int, down: int) -> np.ndarray:
+    """
+    Resample by up/down with a polyphase FIR.
+
+    Output sample m sits at position m*down of the signal upsampled by `up`.
+    Only every `up`-th tap meets a non-zero sample there, so each output is
+    a dot product with one of `up` short sub-filters. Outputs m, m+up, m+2*up
+    share a sub-filter and read input windows `down` samples apart, so each
+    phase is one strided matrix-vector product over a sliding-window view.
+    """
+    taps, half_length = _polyphase_filter(up, down)
+    size = -(-audio.size * up // down)
+    out = np.empty(size, dtype=np.float32)
+    for first in range(min(up, size)):
+        position = first * down + half_length
+        phase = position % up
+        sub_filter = taps[phase::up][::-1]
+        padded = np.pad(audio, (sub_filter.size - 1, sub_filter.size - 1))
+        windows = sliding_window_view(padded, sub_filter.size)
+        start = (position - phase) // up
+        count = len(range(first, size, up))
+        out[first::up] = windows[start:start + down * count:down] @ sub_filter
+    return out
+
+
+def resample(audio: np.ndarray, source_rate: int, target_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    Resample mono float32 audio.
+
+    Rational ratios with small factors (24 kHz to 16 kHz is 2/3) use a
+    band-limited polyphase filter; anything else falls back to linear
+    interpolation.
+    """
+    if source_rate == target_rate or audio.size == 0:
+        return audio.astype(np.float32, copy=False)
+    divisor = gcd(source_rate, target_rate)
+    up, down = target_rate // divisor, source_rate // divisor
+    if max(up, down) <= MAX_POLYPHASE_FACTOR:
+        return _resample_poly(audio.astype(np.float32, copy=False), up, down)
+    duration = audio.size / source_rate
+    target_size = int(round(duration * target_rate))
+    positions = np.arange(target_size, dtype=np.float64) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(audio.size), audio).astype(np.float32)
+
+
+def frame_energy_db(frames: np.ndarray) -> np.ndarray:
+    """RMS energy in dBFS of each row of a (n_frames, frame_length) array."""
+    if frames.size == 0:
+        return np.empty(0, dtype=np.float32)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    with np.errstate(divide="ignore"):
+        return np.maximum(20.0 * np.log10(rms), SILENCE_DB)
@@ -0,0 +1,478 @@
+"""
+SQLite-backed LangGraph checkpointer with write-behind batching and
+per-thread caps.
+
+Recently used threads are served from the in-memory MemorySaver structures;
+every change is also queued and written to SQLite by a background thread in
+batched transactions, so the graph never waits on disk. Each thread keeps at
+most a fixed number of checkpoints, and only a bounded number of threads stay
+in memory; others are reloaded from SQLite on demand, so memory stays flat
+and conversations survive restarts.
+
+In shared mode (several app worker processes on one database), every
+checkpoint is written through before put() returns and a resident thread is
+revalidated against SQLite on read, so a conversation can continue on any
+worker.
+"""
+import asyncio
+import atexit
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+from src.utils.shared_state import connect_shared_sqlite, shared_state_enabled
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# Checkpoint database, next to the Olist database
+CHECKPOINT_DB_PATH = Path(os.environ.get(
+    "CHECKPOINT_DB_PATH",
+    Path(__file__).parent.parent.parent / "data" / "checkpoints.sqlite"
+))
+
+# Checkpoints kept per conversation thread (older ones are pruned)
+MAX_CHECKPOINTS_PER_THREAD = int(os.environ.get("CHECKPOINT_MAX_PER_THREAD", "10"))
+
+# Conversation threads kept in memory; others are reloaded from SQLite
+MAX_CACHED_THREADS = int(os.environ.get("CHECKPOINT_CACHED_THREADS", "128"))
+
+# Write-behind flush interval (seconds) and batch size
+FLUSH_INTERVAL = float(os.environ.get("CHECKPOINT_FLUSH_INTERVAL", "0.5"))
+FLUSH_BATCH_SIZE = int(os.environ.get("CHECKPOINT_FLUSH_BATCH", "256"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    checkpoint_type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    value_type TEXT,
+    value BLOB,
+    task_path TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version,
+    value_type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+"""
+
+_UPSERT_CHECKPOINT = "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_UPSERT_WRITE = "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_UPSERT_BLOB = "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)"
+_DELETE_CHECKPOINT = "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+_DELETE_CHECKPOINT_WRITES = "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+_DELETE_BLOB = "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?"
+_DELETE_THREAD = [
+    "DELETE FROM checkpoints WHERE thread_id = ?",
+    "DELETE FROM writes WHERE thread_id = ?",
+    "DELETE FROM blobs WHERE thread_id = ?",
+]
+
+
+class SQLiteCheckpointer(MemorySaver):
+    """
+    MemorySaver with a bounded in-memory working set and SQLite persistence.
+
+    Reads and writes go through the MemorySaver structures, which hold the
+    serialized checkpoints of recently used threads. put()/put_writes() also
+    queue the same serialized rows for the background writer. A thread not in
+    memory is loaded from SQLite (after flushing queued rows) on first access.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = CHECKPOINT_DB_PATH,
+        max_checkpoints_per_thread: int = MAX_CHECKPOINTS_PER_THREAD,
+        max_cached_threads: int = MAX_CACHED_THREADS,
+        flush_interval: float = FLUSH_INTERVAL,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        shared: Optional[bool] = None
+    ):
+        """
+        Args:
+            db_path: SQLite file for checkpoints
+            max_checkpoints_per_thread: Checkpoints kept per thread (minimum 2)
+            max_cached_threads: Threads kept in memory
+            flush_interval: Seconds between background flushes
+            batch_size: Queued rows that trigger an early flush
+            shared: Other processes write the same database (defaults to shared_state_enabled())
+        """
+        super().__init__()
+        self.db_path = Path(db_path)
+        self.max_checkpoints_per_thread = max(2, max_checkpoints_per_thread)
+        self.max_cached_threads = max(1, max_cached_threads)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.shared = shared_state_enabled() if shared is None else shared
+
+        # Serializes access to the in-memory structures and the write queue
+        self._lock = threading.RLock()
+        # Serializes SQLite access (writer thread vs. synchronous flush/load)
+        self._db_lock = threading.Lock()
+        self._conn = connect_shared_sqlite(self.db_path)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        self._pending: list[tuple[str, tuple]] = []
+        self._threads: OrderedDict[str, None] = OrderedDict()
+        self._blob_keys: dict[str, set] = defaultdict(set)
+        self._write_keys: dict[str, set] = defaultdict(set)
+        # (thread_id, checkpoint_ns, checkpoint_id) -> channel_versions, for blob pruning
+        self._versions: dict[tuple[str, str, str], dict] = {}
+
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+        logger.info(f"SQLite checkpointer using {self.db_path}{' (shared)' if self.shared else ''}")
+
+    # ============================================================================
+    # Write-behind
+    # ============================================================================
+
+    def _enqueue(self, sql: str, params: tuple):
+        """Queue a statement for the background writer. Caller holds the lock."""
+        self._pending.append((sql, params))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _write_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Checkpoint flush failed: {str(e)}")
+
+    def flush(self) -> int:
+        """Write every queued statement to SQLite in one transaction. Returns the count."""
+        with self._db_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                with self._conn:
+                    # Group consecutive statements of the same kind for executemany
+                    start = 0
+                    for end in range(1, len(batch) + 1):
+                        if end == len(batch) or batch[end][0] != batch[start][0]:
+                            self._conn.executemany(batch[start][0], [params for _, params in batch[start:end]])
+                            start = end
+            except sqlite3.Error:
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+            logger.debug(f"Flushed {len(batch)} checkpoint rows")
+            return len(batch)
+
+    def close(self):
+        """Flush queued rows and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=5)
+        try:
+            self.flush()
+        finally:
+            with self._db_lock:
+                self._conn.close()
+
+    # ============================================================================
+    # Working Set
+    # ============================================================================
+
+    def _ensure_loaded(self, thread_id: str, revalidate: bool = False):
+        """
+        Make a thread's checkpoints resident, loading them from SQLite if needed.
+
+        With revalidate, a resident thread is reloaded when SQLite holds a
+        newer checkpoint than memory (written by another worker).
+        """
+        with self._lock:
+            resident = thread_id in self._threads
+            if resident:
+                self._threads.move_to_end(thread_id)
+                if not revalidate:
+                    return
+        self.flush()
+        if resident:
+            if self._is_current(thread_id):
+                return
+            logger.debug(f"Thread {thread_id} changed in another worker, reloading")
+            with self._lock:
+                self._threads.pop(thread_id, None)
+                self._forget_thread(thread_id)
+        with self._db_lock:
+            checkpoints = self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, "
+                "metadata_type, metadata FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            ).fetchall()
+            writes = self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path "
+                "FROM writes WHERE thread_id = ?", (thread_id,)
+            ).fetchall()
+            blobs = self._conn.execute(
+                "SELECT checkpoint_ns, channel, version, value_type, value FROM blobs WHERE thread_id = ?",
+                (thread_id,)
+            ).fetchall()
+
+        with self._lock:
+            if thread_id in self._threads:
+                return
+            for ns, checkpoint_id, parent_id, c_type, c_value, m_type, m_value in checkpoints:
+                self.storage[thread_id][ns][checkpoint_id] = ((c_type, c_value), (m_type, m_value), parent_id)
+                self._versions[(thread_id, ns, checkpoint_id)] = dict(
+                    self.serde.loads_typed((c_type, c_value)).get("channel_versions", {})
+                )
+            for ns, checkpoint_id, task_id, idx, channel, v_type, v_value, task_path in writes:
+                outer_key = (thread_id, ns, checkpoint_id)
+                self.writes[outer_key][(task_id, idx)] = (task_id, channel, (v_type, v_value), task_path)
+                self._write_keys[thread_id].add(outer_key)
+            for ns, channel, version, v_type, v_value in blobs:
+                key = (thread_id, ns, channel, version)
+                self.blobs[key] = (v_type, v_value)
+                self._blob_keys[thread_id].add(key)
+            self._threads[thread_id] = None
+            if checkpoints:
+                logger.debug(f"Loaded {len(checkpoints)} checkpoints for thread {thread_id}")
+            self._evict_threads()
+
+    def _is_current(self, thread_id: str) -> bool:
+        """Whether memory holds the newest checkpoint SQLite has for a thread."""
+        with self._db_lock:
+            latest = dict(self._conn.execute(
+                "SELECT checkpoint_ns, MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns",
+                (thread_id,)
+            ).fetchall())
+        with self._lock:
+            resident = {ns: max(checkpoints) for ns, checkpoints in self.storage.get(thread_id, {}).items() if checkpoints}
+        return latest == resident
+
+    def _evict_threads(self):
+        """Drop least recently used threads from memory. Caller holds the lock."""
+        while len(self._threads) > self.max_cached_threads:
+            thread_id, _ = self._threads.popitem(last=False)
+            self._forget_thread(thread_id)
+
+    def _forget_thread(self, thread_id: str):
+        """Remove a thread from the in-memory structures only. Caller holds the lock."""
+        self.storage.pop(thread_id, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        for key in [key for key in self._versions if key[0] == thread_id]:
+            del self._versions[key]
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        """Keep only the newest checkpoints of a thread and the blobs they use. Caller holds the lock."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints_per_thread:
+            return
+        ordered = sorted(checkpoints)
+        dropped = ordered[:-self.max_checkpoints_per_thread]
+        for checkpoint_id in dropped:
+            del checkpoints[checkpoint_id]
+            outer_key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(outer_key, None)
+            self._write_keys[thread_id].discard(outer_key)
+            self._versions.pop(outer_key, None)
+            self._enqueue(_DELETE_CHECKPOINT, outer_key)
+            self._enqueue(_DELETE_CHECKPOINT_WRITES, outer_key)
+
+        referenced = set()
+        for checkpoint_id in checkpoints:
+            versions = self._versions.get((thread_id, checkpoint_ns, checkpoint_id), {})
+            referenced.update(versions.items())
+        for key in [key for key in self._blob_keys[thread_id] if key[1] == checkpoint_ns]:
+            if (key[2], key[3]) not in referenced:
+                self.blobs.pop(key, None)
+                self._blob_keys[thread_id].discard(key)
+                self._enqueue(_DELETE_BLOB, key)
+
+    # ============================================================================
+    # BaseCheckpointSaver
+    # ============================================================================
+
+    def get_tuple(self, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        self._ensure_loaded(thread_id, revalidate=self.shared)
+        with self._lock:
+            return super().get_tuple(config)
+
+    def get_delta_channel_history(self, *, config: RunnableConfig, channels: Sequence[str]):
+        self._ensure_loaded(config["configurable"]["thread_id"])
+        with self._lock:
+            return super().get_delta_channel_history(config=config, channels=channels)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> Iterator:
+        if config is not None:
+            thread_ids = [config["configurable"]["thread_id"]]
+        else:
+            self.flush()
+            with self._db_lock:
+                thread_ids = [row[0] for row in self._conn.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+        for thread_id in thread_ids:
+            self._ensure_loaded(thread_id)
+            thread_config = config or {"configurable": {"thread_id": thread_id}}
+            with self._lock:
+                items = list(super().list(thread_config, filter=filter, before=before, limit=limit))
+            for item in items:
+                yield item
+                if limit is not None:
+                    limit -= 1
+            if limit is not None and limit <= 0:
+                return
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        self._ensure_loaded(thread_id)
+        with self._lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            checkpoint_id = checkpoint["id"]
+            (c_type, c_value), (m_type, m_value), parent_id = self.storage[thread_id][checkpoint_ns][checkpoint_id]
+            self._enqueue(_UPSERT_CHECKPOINT, (
+                thread_id, checkpoint_ns, checkpoint_id, parent_id, c_type, c_value, m_type, m_value
+            ))
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                v_type, v_value = self.blobs[key]
+                self._blob_keys[thread_id].add(key)
+                self._enqueue(_UPSERT_BLOB, key + (v_type, v_value))
+            self._versions[(thread_id, checkpoint_ns, checkpoint_id)] = dict(checkpoint.get("channel_versions", {}))
+            self._prune(thread_id, checkpoint_ns)
+        if self.shared:
+            self.flush()
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        self._ensure_loaded(thread_id)
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            outer_key = (thread_id, checkpoint_ns, checkpoint_id)
+            self._write_keys[thread_id].add(outer_key)
+            for (w_task_id, idx), (_, channel, (v_type, v_value), w_path) in self.writes.get(outer_key, {}).items():
+                if w_task_id == task_id:
+                    self._enqueue(_UPSERT_WRITE, outer_key + (w_task_id, idx, channel, v_type, v_value, w_path))
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+            self._forget_thread(thread_id)
+            for sql in _DELETE_THREAD:
+                self._enqueue(sql, (thread_id,))
+        if self.shared:
+            self.flush()
+
+    # ============================================================================
+    # Async API
+    # ============================================================================
+    # MemorySaver's async methods call the sync ones on the event loop. Cold
+    # thread loads, shared-mode revalidation and write-through commits can
+    # wait on SQLite (up to the busy timeout under contention), so they run
+    # in a worker thread instead of stalling every session in the process.
+
+    async def aget_tuple(self, config: RunnableConfig):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def aget_delta_channel_history(self, *, config: RunnableConfig, channels: Sequence[str]):
+        return await asyncio.to_thread(self.get_delta_channel_history, config=config, channels=channels)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cached_threads": len(self._threads),
+                "cached_checkpoints": sum(
+                    len(checkpoints) for namespaces in self.storage.values() for checkpoints in namespaces.values()
+                ),
+                "cached_blobs": len(self.blobs),
+                "pending_rows": len(self._pending),
+            }
+
+
+_checkpointer: Optional[SQLiteCheckpointer] = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer(db_path: Path = CHECKPOINT_DB_PATH) -> SQLiteCheckpointer:
+    """Get or create the process-wide SQLite checkpointer."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = SQLiteCheckpointer(db_path)
+    return _checkpointer
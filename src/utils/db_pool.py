@@ -0,0 +1,278 @@
+"""
+Read-only SQLite connection pool shared by every tool call and chat session.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Optional
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# ===============================
+# Pool Configuration
+# ===============================
+
+DEFAULT_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "8"))
+DEFAULT_CACHE_SIZE_KIB = int(os.environ.get("SQLITE_CACHE_SIZE_KIB", "65536"))
+DEFAULT_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.environ.get("SQLITE_POOL_TIMEOUT", "30"))
+
+
+@dataclass
+class PoolStats:
+    """Snapshot of pool counters, used to size the pool."""
+    hits: int = 0
+    misses: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+    open_connections: int = 0
+    in_use: int = 0
+    max_connections: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# ===============================
+# Connection Pool
+# ===============================
+
+class SQLiteConnectionPool:
+    """
+    Bounded pool of read-only SQLite connections.
+
+    Connections are opened with ``mode=ro`` and ``PRAGMA query_only`` so the
+    agent can never modify the database, and they keep their page cache and
+    parsed schema between tool calls. A released connection remembers the
+    thread that last used it, so each worker thread keeps getting back the
+    same warm connection.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_connections: int = DEFAULT_POOL_SIZE,
+        cache_size_kib: int = DEFAULT_CACHE_SIZE_KIB,
+        mmap_size: int = DEFAULT_MMAP_SIZE,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT
+    ):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            max_connections: Maximum number of open connections
+            cache_size_kib: Page cache per connection, in KiB
+            mmap_size: Bytes of the database file to memory-map
+            acquire_timeout: Seconds to wait for a free connection before failing
+        """
+        self.db_path = Path(db_path).resolve()
+        self.max_connections = max(1, max_connections)
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle: dict[int, sqlite3.Connection] = {}
+        self._owners: dict[int, int] = {}
+        self._all: set[int] = set()
+        self._opening = 0
+        self._stats = PoolStats(max_connections=self.max_connections)
+        self._hooks: list[Callable[[str, PoolStats], None]] = []
+        self._closed = False
+
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a new read-only connection with tuned pragmas."""
+        uri = f"{self.db_path.as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        logger.info(f"Opened read-only SQLite connection to {self.db_path.name}")
+        return conn
+
+    def _take_idle(self) -> Optional[sqlite3.Connection]:
+        """Pop an idle connection, preferring the one this thread used last."""
+        thread_id = threading.get_ident()
+        for key, owner in self._owners.items():
+            if owner == thread_id and key in self._idle:
+                return self._idle.pop(key)
+        if self._idle:
+            key = next(iter(self._idle))
+            return self._idle.pop(key)
+        return None
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Check out a connection, opening one if the pool is not yet full.
+
+        Raises:
+            sqlite3.OperationalError: If no connection frees up within acquire_timeout
+        """
+        waited = False
+        start = time.perf_counter()
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.OperationalError("Connection pool is closed")
+
+                conn = self._take_idle()
+                if conn is not None:
+                    self._stats.hits += 1
+                    break
+
+                if len(self._all) + self._opening < self.max_connections:
+                    self._opening += 1
+                    self._stats.misses += 1
+                    conn = None
+                    break
+
+                if not waited:
+                    waited = True
+                    self._stats.waits += 1
+                remaining = self.acquire_timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    raise sqlite3.OperationalError("Timed out waiting for a database connection")
+                self._cond.wait(timeout=remaining)
+
+            if waited:
+                self._stats.wait_time += time.perf_counter() - start
+
+        if conn is None:
+            try:
+                conn = self._open_connection()
+            finally:
+                with self._cond:
+                    self._opening -= 1
+                    if conn is not None:
+                        self._all.add(id(conn))
+                    self._stats.open_connections = len(self._all)
+                    self._cond.notify()
+
+        with self._cond:
+            self._owners[id(conn)] = threading.get_ident()
+            self._stats.in_use += 1
+
+        self._emit("acquire")
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            self._stats.in_use -= 1
+            if self._closed:
+                self._all.discard(id(conn))
+                self._owners.pop(id(conn), None)
+                conn.close()
+            else:
+                self._idle[id(conn)] = conn
+            self._stats.open_connections = len(self._all)
+            self._cond.notify()
+        self._emit("release")
+
+    def discard(self, conn: sqlite3.Connection):
+        """Close a connection that is no longer usable instead of returning it."""
+        with self._cond:
+            self._stats.in_use -= 1
+            self._all.discard(id(conn))
+            self._owners.pop(id(conn), None)
+            self._stats.open_connections = len(self._all)
+            self._cond.notify()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self._emit("discard")
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            # A bare DatabaseError means the file itself is unusable (e.g. corrupt)
+            if type(e) is sqlite3.DatabaseError:
+                self.discard(conn)
+            else:
+                self.release(conn)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    # ===============================
+    # Stats Hooks
+    # ===============================
+
+    def stats(self) -> PoolStats:
+        """Return a snapshot of the pool counters."""
+        with self._cond:
+            return PoolStats(**self._stats.to_dict())
+
+    def add_stats_hook(self, hook: Callable[[str, PoolStats], None]):
+        """
+        Register a callback invoked with (event, stats) on acquire/release/discard.
+
+        Args:
+            hook: Callable receiving the event name and a stats snapshot
+        """
+        self._hooks.append(hook)
+
+    def _emit(self, event: str):
+        if not self._hooks:
+            return
+        snapshot = self.stats()
+        for hook in self._hooks:
+            try:
+                hook(event, snapshot)
+            except Exception as e:
+                logger.error(f"Pool stats hook failed: {str(e)}")
+
+    def close(self):
+        """Close idle connections; in-use connections are closed on release."""
+        with self._cond:
+            self._closed = True
+            for conn in self._idle.values():
+                self._all.discard(id(conn))
+                self._owners.pop(id(conn), None)
+                conn.close()
+            self._idle.clear()
+            self._stats.open_connections = len(self._all)
+            self._cond.notify_all()
+        logger.info(f"Connection pool for {self.db_path.name} closed")
+
+
+# ===============================
+# Process-wide Pools
+# ===============================
+
+_pools: dict[Path, SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(db_path: Path, **kwargs) -> SQLiteConnectionPool:
+    """Get or create the process-wide pool for a database file."""
+    key = Path(db_path).resolve()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = SQLiteConnectionPool(key, **kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """Close every pool, e.g. before the database file is rebuilt."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -3,14 +3,23 @@ LangGraph utility functions for agent workflows.
 """
 import os
 from typing import Optional, Sequence
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import BaseMessage, SystemMessage, AIMessage
+from langchain_core.messages import BaseMessage, SystemMessage, AIMessage, HumanMessage, ToolMessage, RemoveMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import MessagesState
+from src.utils.model_registry import get_model_registry
 from src.logger import setup_application_logger
 
 logger = setup_application_logger(__name__)
 
+# Recent turns whose tool outputs are kept verbatim
+HISTORY_KEEP_TURNS = int(os.environ.get("HISTORY_KEEP_TURNS", "2"))
+
+# Older tool outputs are trimmed to this many characters
+HISTORY_TOOL_MESSAGE_CHARS = int(os.environ.get("HISTORY_TOOL_MESSAGE_CHARS", "400"))
+
+# Turns kept in the conversation state; older turns are removed
+HISTORY_MAX_TURNS = int(os.environ.get("HISTORY_MAX_TURNS", "20"))
+
 
 # ================================================================================
 # Model Configuration
@@ -80,14 +89,9 @@ async def call_model(
         
         logger.info(f"Calling model: {model_name}")
         
-        # Initialize the model
+        # Reuse the initialized (and tool-bound) model from the registry
         model_config = get_model_config(model_name)
-        chat_model = init_chat_model(**model_config)
-        
-        # Bind tools if provided
-        if tools:
-            logger.info(f"Binding {len(tools)} tools to model")
-            chat_model = chat_model.bind_tools(tools)
+        chat_model = get_model_registry().get(model_name, model_config, tools=tools)
         
         # Build messages list
         messages = []
@@ -109,6 +113,68 @@ async def call_model(
         raise
 
 
+# ================================================================================
+# History Compaction
+# ================================================================================
+
+def _split_turns(messages: Sequence[BaseMessage]) -> list[list[BaseMessage]]:
+    """Split a history into turns, each starting at a HumanMessage."""
+    turns: list[list[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def trim_text(text: str, max_chars: int) -> str:
+    """Cut text to max_chars, noting how much was dropped."""
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars].rstrip()}\n... [{len(text) - max_chars} characters trimmed from an earlier turn]"
+
+
+def compact_messages(
+    messages: Sequence[BaseMessage],
+    keep_turns: int = HISTORY_KEEP_TURNS,
+    max_tool_chars: int = HISTORY_TOOL_MESSAGE_CHARS,
+    max_turns: int = HISTORY_MAX_TURNS
+) -> list[BaseMessage]:
+    """
+    Compute state updates that keep a conversation history bounded.
+
+    Tool outputs older than the last ``keep_turns`` turns are replaced (by
+    message id) with trimmed copies, and whole turns beyond ``max_turns`` are
+    removed, so AI tool calls and their ToolMessages always stay paired.
+
+    Args:
+        messages: Current conversation history
+        keep_turns: Recent turns left untouched
+        max_tool_chars: Length older tool outputs are trimmed to
+        max_turns: Turns kept in the state
+
+    Returns:
+        Messages to apply through the add_messages reducer (empty if nothing changes)
+    """
+    turns = _split_turns(messages)
+    updates: list[BaseMessage] = []
+
+    removed = turns[:-max_turns] if max_turns and len(turns) > max_turns else []
+    for turn in removed:
+        updates.extend(RemoveMessage(id=message.id) for message in turn if message.id)
+
+    old_turns = turns[len(removed):-keep_turns] if keep_turns else turns[len(removed):]
+    for turn in old_turns:
+        for message in turn:
+            if (isinstance(message, ToolMessage) and message.id
+                    and isinstance(message.content, str) and len(message.content) > max_tool_chars):
+                updates.append(message.model_copy(update={"content": trim_text(message.content, max_tool_chars)}))
+
+    if updates:
+        logger.info(f"Compacting history: {len(updates)} message updates across {len(turns)} turns")
+    return updates
+
+
 # ================================================================================
 # Conditional Edge Functions
 # ================================================================================
@@ -0,0 +1,185 @@
+"""
+Registry of initialized chat models, shared across turns and sessions.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict, Counter
+from typing import Any, Optional, Sequence
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# Maximum number of cached model instances (base and bound)
+DEFAULT_MAX_MODELS = int(os.environ.get("MODEL_REGISTRY_SIZE", "16"))
+
+
+def _provider(model_name: str) -> str:
+    return model_name.split(":")[0] if ":" in model_name else model_name
+
+
+def _config_key(model_config: dict) -> str:
+    """Stable digest of the init parameters (API keys are hashed, never stored)."""
+    items = sorted((key, repr(value)) for key, value in model_config.items())
+    return hashlib.sha256(repr(items).encode()).hexdigest()[:16]
+
+
+def _tools_key(tools: Optional[Sequence]) -> tuple:
+    if not tools:
+        return ()
+    names = []
+    for tool in tools:
+        name = getattr(tool, "name", None) or getattr(tool, "__name__", None)
+        if name is None and isinstance(tool, dict):
+            name = tool.get("name") or tool.get("function", {}).get("name")
+        names.append(name or repr(tool))
+    return tuple(names)
+
+
+def _schema_key(structured_output: Any) -> Optional[str]:
+    if structured_output is None:
+        return None
+    return getattr(structured_output, "__qualname__", None) or repr(structured_output)
+
+
+class ModelRegistry:
+    """
+    LRU cache of ready-to-use chat models.
+
+    Keyed by (provider, model name, init config, tool set, output schema), so
+    each ReAct iteration reuses the same client and its open HTTP
+    connections instead of rebuilding them and re-converting tool schemas.
+    Sessions retain the model they use; when the last session releases a
+    model, its instances are evicted.
+    """
+
+    def __init__(self, max_models: int = DEFAULT_MAX_MODELS):
+        self.max_models = max_models
+        self._lock = threading.Lock()
+        self._models: OrderedDict[tuple, Any] = OrderedDict()
+        self._sessions: Counter[str] = Counter()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        model_name: str,
+        model_config: dict,
+        tools: Optional[Sequence] = None,
+        structured_output: Any = None
+    ):
+        """
+        Return a cached chat model, initializing and binding it on first use.
+
+        Args:
+            model_name: Model string in format "provider:model_name"
+            model_config: Keyword arguments for init_chat_model
+            tools: Optional tools to bind
+            structured_output: Optional schema for with_structured_output
+
+        Returns:
+            The (possibly bound) chat model
+        """
+        base_key = (_provider(model_name), model_name, _config_key(model_config))
+        key = base_key + (_tools_key(tools), _schema_key(structured_output))
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+            self.misses += 1
+
+            base = self._models.get(base_key)
+            if base is None:
+                # Imported on first use: it pulls in every provider integration module
+                from langchain.chat_models import init_chat_model
+
+                logger.info(f"Initializing chat model: {model_name}")
+                base = init_chat_model(**model_config)
+                self._store(base_key, base)
+
+            model = base
+            if tools:
+                logger.info(f"Binding {len(tools)} tools to model {model_name}")
+                model = model.bind_tools(tools)
+            if structured_output:
+                logger.info(f"Configuring structured output for model {model_name}")
+                model = model.with_structured_output(structured_output, include_raw=True)
+            if model is not base:
+                self._store(key, model)
+            return model
+
+    def register(self, model_name: str, model_config: dict, model: Any):
+        """
+        Install a pre-built base model (e.g. a scripted model for benchmarks).
+
+        Later get() calls with the same name and config return it, binding
+        tools through the model's own bind_tools.
+        """
+        base_key = (_provider(model_name), model_name, _config_key(model_config))
+        with self._lock:
+            for key in [key for key in self._models if key[:3] == base_key]:
+                del self._models[key]
+            self._store(base_key, model)
+
+    def _store(self, key: tuple, model: Any):
+        """Insert a model and evict the least recently used beyond the cap. Caller holds the lock."""
+        self._models[key] = model
+        self._models.move_to_end(key)
+        while len(self._models) > self.max_models:
+            evicted_key, _ = self._models.popitem(last=False)
+            logger.info(f"Evicted chat model from registry: {evicted_key[1]}")
+
+    def retain(self, model_name: str):
+        """Record that a session is using a model."""
+        with self._lock:
+            self._sessions[model_name] += 1
+
+    def release(self, model_name: str):
+        """Record that a session stopped using a model; evict it when unused."""
+        with self._lock:
+            if self._sessions[model_name] > 0:
+                self._sessions[model_name] -= 1
+            if self._sessions[model_name] > 0:
+                return
+            del self._sessions[model_name]
+        self.evict(model_name)
+
+    def evict(self, model_name: str) -> int:
+        """Drop every cached instance of a model. Returns the number removed."""
+        with self._lock:
+            keys = [key for key in self._models if key[1] == model_name]
+            for key in keys:
+                del self._models[key]
+        if keys:
+            logger.info(f"Evicted {len(keys)} cached instances of {model_name}")
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "hits": self.hits,
+                "misses": self.misses,
+                "sessions": dict(self._sessions),
+            }
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Get or create the model registry singleton."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
@@ -1,8 +1,8 @@
 import os
 from typing import Optional
-from langchain.chat_models import init_chat_model
 from langchain_core.callbacks import UsageMetadataCallbackHandler
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from src.utils.model_registry import get_model_registry
 from src.logger import setup_application_logger
 
 logger = setup_application_logger(__name__)
@@ -73,15 +73,12 @@ async def invoke_chat_model(
         
         init_params = {k: v for k, v in model_config.items() if k not in ['tools', 'structured_output']}
         
-        chat_model = init_chat_model(**init_params)
-        
-        if tools:
-            logger.info(f"Binding tools to chat model: {tools}")
-            chat_model = chat_model.bind_tools(tools)
-        
-        if structured_output:
-            logger.info(f"Configuring structured output: {structured_output}")
-            chat_model = chat_model.with_structured_output(structured_output, include_raw=True)
+        chat_model = get_model_registry().get(
+            model,
+            init_params,
+            tools=tools,
+            structured_output=structured_output
+        )
 
         callback = UsageMetadataCallbackHandler()
 
@@ -121,15 +118,12 @@ async def stream_chat_model(
         
         init_params = {k: v for k, v in model_config.items() if k not in ['tools', 'structured_output']}
         
-        chat_model = init_chat_model(**init_params)
-        
-        if tools:
-            logger.info(f"Binding tools to chat model: {tools}")
-            chat_model = chat_model.bind_tools(tools)
-        
-        if structured_output:
-            logger.info(f"Configuring structured output: {structured_output}")
-            chat_model = chat_model.with_structured_output(structured_output, include_raw=True)
+        chat_model = get_model_registry().get(
+            model,
+            init_params,
+            tools=tools,
+            structured_output=structured_output
+        )
 
         callback = UsageMetadataCallbackHandler()
 
@@ -0,0 +1,297 @@
+"""
+Query-result cache keyed on normalized SQL and the database file fingerprint.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Hashable, Optional
+from src.utils.sql_parser import tokenize
+from src.utils.shared_state import SharedStore, digest_key, get_shared_store, shared_state_enabled
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# ===============================
+# Cache Configuration
+# ===============================
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "512"))
+DEFAULT_MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_TTL = float(os.environ.get("QUERY_CACHE_TTL", "3600"))
+
+# Namespace of cached results in the shared state store
+SHARED_NAMESPACE = "query_results"
+
+# Functions whose result changes between calls - queries using them are never cached
+_NONDETERMINISTIC = re.compile(
+    r"\b(random|randomblob|changes|last_insert_rowid|total_changes|current_(date|time|timestamp))\b"
+    r"|'now'",
+    re.IGNORECASE
+)
+
+def normalize_sql(query: str) -> str:
+    """
+    Canonicalize a query so formatting differences map to the same cache key.
+
+    Comments are dropped, whitespace collapsed, keywords and identifiers
+    lower-cased (SQLite treats them case-insensitively), numeric literals
+    rewritten in canonical form and trailing semicolons removed. String
+    literals and quoted identifiers are kept verbatim because their case is
+    significant.
+    """
+    tokens = []
+    for token in tokenize(query):
+        kind = token.kind
+        text = token.text
+        if kind == "word":
+            tokens.append(text.lower())
+        elif kind == "quoted":
+            # Kept verbatim: SQLite falls back to treating "x" as a string literal
+            tokens.append(text)
+        elif kind == "number":
+            tokens.append(_canonical_number(text))
+        else:
+            tokens.append(text)
+
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def _canonical_number(text: str) -> str:
+    """Rewrite a numeric literal without changing its SQLite type."""
+    if re.fullmatch(r"\d+", text):
+        return str(int(text))
+    try:
+        return repr(float(text))
+    except ValueError:
+        return text
+
+
+def is_cacheable(query: str) -> bool:
+    """Return False for queries whose results depend on when they run."""
+    return not _NONDETERMINISTIC.search(query)
+
+
+def database_fingerprint(db_path: Path) -> tuple:
+    """
+    Identify the current contents of a database file.
+
+    Uses inode, size and mtime of the file and its WAL, so replacing or
+    rewriting ``data/olist.sqlite`` yields a new fingerprint. PRAGMA
+    data_version is not used because its value is only comparable within one
+    connection.
+    """
+    path = Path(db_path)
+    try:
+        stat = path.stat()
+    except OSError:
+        return (str(path), None)
+    fingerprint = (str(path), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    wal = path.with_name(path.name + "-wal")
+    try:
+        wal_stat = wal.stat()
+        fingerprint += (wal_stat.st_size, wal_stat.st_mtime_ns)
+    except OSError:
+        pass
+    return fingerprint
+
+
+@dataclass
+class CacheStats:
+    """Snapshot of cache counters."""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    shared_hits: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["hit_rate"] = round(self.hit_rate, 4)
+        return data
+
+
+# ===============================
+# Result Cache
+# ===============================
+
+class QueryResultCache:
+    """
+    Thread-safe LRU + TTL cache for query results.
+
+    Entries are bounded both by count and by an estimate of their size in
+    bytes. The cache remembers the database fingerprint it was filled under
+    and drops everything when the file changes.
+
+    With a shared store, local misses fall back to results stored by other
+    worker processes, and every result is also written there. Shared keys
+    include the fingerprint, so results from an older database never match.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL,
+        shared: Optional[SharedStore] = None
+    ):
+        """
+        Args:
+            db_path: Database file whose fingerprint guards the cache
+            max_entries: Maximum number of cached results
+            max_bytes: Approximate memory budget for cached results
+            ttl: Seconds before an entry expires
+            shared: Store shared with other worker processes, if any
+        """
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self._fingerprint = database_fingerprint(self.db_path)
+        self._stats = CacheStats()
+
+    def make_key(self, query: str, *params: Hashable) -> Hashable:
+        """Build a cache key from the normalized query and extra parameters."""
+        return (normalize_sql(query),) + params
+
+    def _check_fingerprint(self):
+        """Invalidate everything if the database file changed. Caller holds the lock."""
+        fingerprint = database_fingerprint(self.db_path)
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                logger.info(f"Database {self.db_path.name} changed, invalidating {len(self._entries)} cached results")
+            self._entries.clear()
+            self._bytes = 0
+            self._fingerprint = fingerprint
+            self._stats.invalidations += 1
+
+    def _shared_key(self, key: Hashable) -> str:
+        """Shared-store key for a cache key under the current fingerprint. Caller holds the lock."""
+        return digest_key((self._fingerprint, key))
+
+    def _get_shared(self, key: Hashable, shared_key: str) -> Optional[Any]:
+        """Look a key up in the shared store and promote a hit to the local cache."""
+        value = self.shared.get(SHARED_NAMESPACE, shared_key)
+        with self._lock:
+            if value is None:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+            self._stats.shared_hits += 1
+        self.put(key, value, publish=False)
+        return value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            self._check_fingerprint()
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, size, value = entry
+                if time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats.hits += 1
+                    return value
+                del self._entries[key]
+                self._bytes -= size
+                self._stats.expirations += 1
+
+            if self.shared is None:
+                self._stats.misses += 1
+                return None
+            shared_key = self._shared_key(key)
+        return self._get_shared(key, shared_key)
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None, publish: bool = True):
+        """
+        Store a value, evicting least recently used entries to stay in budget.
+
+        With a shared store the value is also published to the other workers,
+        unless publish is False (the value came from there).
+        """
+        size = _estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_fingerprint()
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+
+            self._entries[key] = (time.monotonic(), size, value)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats.evictions += 1
+            shared_key = self._shared_key(key) if self.shared is not None and publish else None
+
+        if shared_key is not None:
+            self.shared.put(SHARED_NAMESPACE, shared_key, value, ttl=self.ttl)
+
+    def clear(self):
+        """Drop every entry, including the shared ones."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._stats.invalidations += 1
+        if self.shared is not None:
+            self.shared.clear(SHARED_NAMESPACE)
+
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            snapshot = CacheStats(**asdict(self._stats))
+            snapshot.entries = len(self._entries)
+            snapshot.bytes = self._bytes
+            return snapshot
+
+
+def _estimate_size(value: Any) -> int:
+    """Rough deep size of a cached result (rows of scalars)."""
+    rows = getattr(value, "rows", None)
+    size = sys.getsizeof(value)
+    if rows is None:
+        return size
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(item) for item in row)
+    columns = getattr(value, "columns", None) or []
+    size += sum(sys.getsizeof(column) for column in columns)
+    return size
+
+
+_caches: dict[Path, QueryResultCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_query_cache(db_path: Path) -> QueryResultCache:
+    """Get or create the process-wide result cache for a database file."""
+    key = Path(db_path).resolve()
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = QueryResultCache(key, shared=get_shared_store() if shared_state_enabled() else None)
+            _caches[key] = cache
+        return cache
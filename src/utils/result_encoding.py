@@ -0,0 +1,166 @@
+"""
+Token-efficient encodings of query results for the model.
+
+Python tuple reprs spend tokens on quotes, parentheses and full-precision
+floats such as -23.54562128115268, and every later turn pays for them
+again. The encodings here round floats to a fixed number of significant
+digits (never fewer than two decimals, so amounts keep their cents),
+shorten long text and lay rows out as:
+
+- tsv: a header row and one tab-separated line per row (default)
+- columns: one line per column with its values as an array
+- tuples: the original Python tuple reprs
+
+The number of rows shown adapts to the model's context window: rows are
+added while the encoded result fits a share of it.
+"""
+import json
+import math
+import os
+from typing import Any, Optional, Sequence
+from src.utils.token_utils import estimate_tokens
+
+RESULT_FORMATS = ("tsv", "columns", "tuples")
+
+RESULT_FORMAT = os.environ.get("RESULT_FORMAT", "tsv").lower()
+
+# Significant digits kept for floats (at least two decimals are always kept)
+RESULT_FLOAT_DIGITS = int(os.environ.get("RESULT_FLOAT_DIGITS", "6"))
+
+# Text values longer than this are shortened
+RESULT_TEXT_CHARS = int(os.environ.get("RESULT_TEXT_CHARS", "80"))
+
+# Share of the model's context window one query result may use
+RESULT_CONTEXT_SHARE = float(os.environ.get("RESULT_CONTEXT_SHARE", "0.04"))
+
+# Upper bound on the tokens of one result, whatever the context window
+RESULT_MAX_TOKENS = int(os.environ.get("RESULT_MAX_TOKENS", "1500"))
+
+# Rows always shown when the query returned them, even over the token budget
+RESULT_MIN_ROWS = int(os.environ.get("RESULT_MIN_ROWS", "5"))
+
+# Context window assumed per provider; MODEL_CONTEXT_TOKENS overrides it
+CONTEXT_WINDOWS = {
+    "anthropic": 200_000,
+    "openai": 128_000,
+    "azure_openai": 128_000,
+    "google_genai": 1_000_000,
+    "ollama": 8_192,
+}
+DEFAULT_CONTEXT_WINDOW = 8_192
+
+
+# ================================================================================
+# Values and Formats
+# ================================================================================
+
+def format_value(value: Any) -> str:
+    """Render a single value compactly: NULL, rounded floats, shortened text."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, float):
+        if not math.isfinite(value) or value == 0:
+            return repr(value)
+        decimals = max(2, RESULT_FLOAT_DIGITS - 1 - math.floor(math.log10(abs(value))))
+        return repr(round(value, decimals))
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    text = str(value).replace("\t", " ").replace("\r", " ").replace("\n", " ")
+    if len(text) > RESULT_TEXT_CHARS:
+        return f"{text[:RESULT_TEXT_CHARS]}…(+{len(text) - RESULT_TEXT_CHARS} chars)"
+    return text
+
+
+def _json_value(value: Any) -> Any:
+    """A JSON-friendly compact value for the columns format."""
+    if value is None or isinstance(value, (bool, int)):
+        return value
+    if isinstance(value, float):
+        return float(format_value(value)) if math.isfinite(value) else format_value(value)
+    return format_value(value)
+
+
+def encode_rows(columns: Sequence[str], rows: Sequence[tuple], fmt: str = RESULT_FORMAT) -> str:
+    """
+    Encode result rows in one of RESULT_FORMATS.
+
+    Args:
+        columns: Column names
+        rows: Rows to encode
+        fmt: "tsv", "columns" or "tuples"
+
+    Returns:
+        The encoded rows (tsv and columns include the column names)
+    """
+    if fmt == "tuples":
+        return "".join(f"{row}\n" for row in rows)
+    if fmt == "columns":
+        lines = []
+        for index, column in enumerate(columns):
+            values = [_json_value(row[index]) for row in rows]
+            lines.append(f"{column}: {json.dumps(values, ensure_ascii=False)}")
+        return "\n".join(lines) + "\n"
+    if fmt != "tsv":
+        raise ValueError(f"Unknown result format: {fmt}")
+    lines = ["\t".join(columns)]
+    lines.extend("\t".join(format_value(value) for value in row) for row in rows)
+    return "\n".join(lines) + "\n"
+
+
+def measure_formats(columns: Sequence[str], rows: Sequence[tuple]) -> dict[str, int]:
+    """Return the token count of the rows in every format."""
+    return {fmt: estimate_tokens(encode_rows(columns, rows, fmt)) for fmt in RESULT_FORMATS}
+
+
+# ================================================================================
+# Row Budget
+# ================================================================================
+
+def context_window(model_name: Optional[str]) -> int:
+    """Context window of a "provider:model" string, in tokens."""
+    override = os.environ.get("MODEL_CONTEXT_TOKENS")
+    if override:
+        return int(override)
+    if not model_name:
+        return DEFAULT_CONTEXT_WINDOW
+    provider = model_name.split(":")[0] if ":" in model_name else model_name
+    return CONTEXT_WINDOWS.get(provider, DEFAULT_CONTEXT_WINDOW)
+
+
+def result_token_budget(model_name: Optional[str]) -> int:
+    """Tokens one query result may use for a model."""
+    return min(RESULT_MAX_TOKENS, int(context_window(model_name) * RESULT_CONTEXT_SHARE))
+
+
+def encode_result(
+    columns: Sequence[str],
+    rows: Sequence[tuple],
+    token_budget: int,
+    fmt: str = RESULT_FORMAT,
+    min_rows: int = RESULT_MIN_ROWS
+) -> tuple[str, int]:
+    """
+    Encode as many leading rows as fit the token budget.
+
+    Args:
+        columns: Column names
+        rows: Rows available to show
+        token_budget: Tokens the encoded rows may use
+        fmt: "tsv", "columns" or "tuples"
+        min_rows: Rows shown even if they exceed the budget
+
+    Returns:
+        (encoded rows, number of rows encoded)
+    """
+    if estimate_tokens(encode_rows(columns, rows, fmt)) <= token_budget:
+        return encode_rows(columns, rows, fmt), len(rows)
+
+    # Largest row count that fits, by binary search (token counts grow with rows)
+    low, high = min(min_rows, len(rows)), len(rows)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(encode_rows(columns, rows[:middle], fmt)) <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    return encode_rows(columns, rows[:low], fmt), low
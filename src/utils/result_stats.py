@@ -0,0 +1,276 @@
+"""
+Single-pass column summaries of a query's full result stream.
+
+The model only sees the first rows of a large result, so insights written
+from them describe a biased sample. The SQL engine feeds every fetched
+batch to a ResultSummarizer, which keeps per-column statistics in bounded
+memory, vectorized with NumPy per batch:
+
+- null counts, and min / max (numbers and text, e.g. date ranges)
+- mean and quantiles of numeric values; quantiles come from a uniform
+  sample of at most SAMPLE_SIZE values (bottom-k by random priority)
+- distinct counts: exact up to EXACT_DISTINCT_LIMIT values, then a
+  HyperLogLog estimate
+- the most frequent text values (Misra-Gries counters)
+"""
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from src.utils.result_encoding import format_value
+
+# Set to 0 to stop summarizing results
+RESULT_STATS_ENABLED = os.environ.get("RESULT_STATS", "1") == "1"
+
+# Numeric values sampled per column for quantiles
+SAMPLE_SIZE = 4096
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+# Distinct values tracked exactly before switching to HyperLogLog
+EXACT_DISTINCT_LIMIT = 2048
+
+# HyperLogLog registers = 2 ** HLL_PRECISION (about 1.6% standard error at 12)
+HLL_PRECISION = 12
+
+# Counters kept per text column, and values reported
+TOP_K_COUNTERS = 64
+TOP_K = 5
+
+_NUMBER_TYPES = (int, float)
+
+
+@dataclass
+class ColumnSummary:
+    """Statistics of one result column; approximate values are flagged."""
+    name: str
+    nulls: int = 0
+    minimum: Any = None
+    maximum: Any = None
+    mean: Optional[float] = None
+    quantiles: dict[float, float] = field(default_factory=dict)
+    quantiles_exact: bool = True
+    distinct: int = 0
+    distinct_exact: bool = True
+    top: list[tuple[str, int]] = field(default_factory=list)
+    top_exact: bool = True
+
+
+# ================================================================================
+# Sketches
+# ================================================================================
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: spread 64-bit keys uniformly over all bits."""
+    x = values.astype(np.uint64, copy=True)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def _leading_zeros(values: np.ndarray) -> np.ndarray:
+    """Count leading zero bits of non-zero uint64 values."""
+    x = values.copy()
+    zeros = np.zeros(len(x), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = (x >> np.uint64(64 - shift)) == 0
+        zeros[empty] += shift
+        x[empty] <<= np.uint64(shift)
+    return zeros
+
+
+class _HyperLogLog:
+    """HyperLogLog distinct counter over 64-bit hashes."""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        hashes = _mix64(hashes)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        # A sentinel bit below the remaining bits bounds the rank
+        rest = (hashes << np.uint64(self.precision)) | np.uint64(1 << (self.precision - 1))
+        np.maximum.at(self.registers, index, _leading_zeros(rest) + 1)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and empty:
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+
+def _hashes(values: list) -> np.ndarray:
+    """64-bit keys for values; equal numbers (1 and 1.0) share a key, as in SQL."""
+    numbers = [float(v) for v in values if isinstance(v, _NUMBER_TYPES)]
+    others = [hash(v) for v in values if not isinstance(v, _NUMBER_TYPES)]
+    return np.concatenate([
+        np.asarray(numbers, dtype=np.float64).view(np.uint64),
+        np.asarray(others, dtype=np.int64).view(np.uint64),
+    ])
+
+
+# ================================================================================
+# Column Accumulator
+# ================================================================================
+
+class _ColumnAccumulator:
+    def __init__(self, name: str, seed: int):
+        self.name = name
+        self.nulls = 0
+        self.count = 0
+        self.total = 0.0
+        self.number_min = self.number_max = None
+        self.text_min = self.text_max = None
+        self.rng = np.random.default_rng(seed)
+        self.sample = np.empty(0, dtype=np.float64)
+        self.priorities = np.empty(0, dtype=np.float64)
+        self.sampled_all = True
+        self.exact: Optional[set] = set()
+        self.hll: Optional[_HyperLogLog] = None
+        self.counters: Counter = Counter()
+        # Misra-Gries undercounts every value by at most the total subtracted
+        self.counter_error = 0
+
+    def update(self, values: Sequence):
+        present = [value for value in values if value is not None]
+        self.nulls += len(values) - len(present)
+        numbers = [value for value in present if isinstance(value, _NUMBER_TYPES)]
+        texts = [value for value in present if isinstance(value, str)]
+        if numbers:
+            self._update_numbers(numbers)
+        if texts:
+            self._update_texts(texts)
+        self._update_distinct(present)
+
+    def _update_numbers(self, numbers: list):
+        batch_min, batch_max = min(numbers), max(numbers)
+        self.number_min = batch_min if self.number_min is None else min(self.number_min, batch_min)
+        self.number_max = batch_max if self.number_max is None else max(self.number_max, batch_max)
+        array = np.asarray(numbers, dtype=np.float64)
+        self.count += len(array)
+        self.total += float(np.sum(array))
+
+        # Bottom-k by random priority is a uniform sample of everything seen so far
+        self.sample = np.concatenate([self.sample, array])
+        self.priorities = np.concatenate([self.priorities, self.rng.random(len(array))])
+        if len(self.sample) > SAMPLE_SIZE:
+            keep = np.argpartition(self.priorities, SAMPLE_SIZE)[:SAMPLE_SIZE]
+            self.sample, self.priorities = self.sample[keep], self.priorities[keep]
+            self.sampled_all = False
+
+    def _update_texts(self, texts: list):
+        batch_min, batch_max = min(texts), max(texts)
+        self.text_min = batch_min if self.text_min is None else min(self.text_min, batch_min)
+        self.text_max = batch_max if self.text_max is None else max(self.text_max, batch_max)
+
+        self.counters.update(texts)
+        if len(self.counters) > TOP_K_COUNTERS:
+            # Misra-Gries: subtract the (k+1)-th largest count and drop what reaches zero
+            cut = sorted(self.counters.values(), reverse=True)[TOP_K_COUNTERS]
+            self.counters = Counter({value: count - cut for value, count in self.counters.items() if count > cut})
+            self.counter_error += cut
+
+    def _update_distinct(self, present: list):
+        if self.exact is not None:
+            self.exact.update(present)
+            if len(self.exact) <= EXACT_DISTINCT_LIMIT:
+                return
+            # Adding every distinct value seen so far gives the sketch the same state
+            self.hll = _HyperLogLog()
+            self.hll.add(_hashes(list(self.exact)))
+            self.exact = None
+            return
+        self.hll.add(_hashes(present))
+
+    def finish(self) -> ColumnSummary:
+        summary = ColumnSummary(self.name, nulls=self.nulls)
+        if self.count:
+            summary.minimum, summary.maximum = self.number_min, self.number_max
+            summary.mean = self.total / self.count
+            quantiles = np.quantile(self.sample, QUANTILES)
+            summary.quantiles = {q: float(value) for q, value in zip(QUANTILES, quantiles)}
+            summary.quantiles_exact = self.sampled_all
+        elif self.text_min is not None:
+            summary.minimum, summary.maximum = self.text_min, self.text_max
+        if self.exact is not None:
+            summary.distinct = len(self.exact)
+        else:
+            summary.distinct, summary.distinct_exact = self.hll.estimate(), False
+        if self.counters and not self.count:
+            # Only values counted above the error bound are known to be frequent
+            summary.top = [
+                (value, count) for value, count in self.counters.most_common(TOP_K)
+                if count > self.counter_error and (count > 1 or len(self.counters) == 1)
+            ]
+            summary.top_exact = self.counter_error == 0
+        return summary
+
+
+class ResultSummarizer:
+    """Accumulates column summaries over the batches of one result stream."""
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+        self.rows = 0
+        self._columns = [_ColumnAccumulator(name, seed) for seed, name in enumerate(self.columns)]
+
+    def update(self, batch: Sequence[tuple]):
+        """Add a batch of rows."""
+        if not batch:
+            return
+        self.rows += len(batch)
+        for accumulator, values in zip(self._columns, zip(*batch)):
+            accumulator.update(values)
+
+    def finish(self) -> list[ColumnSummary]:
+        return [accumulator.finish() for accumulator in self._columns]
+
+
+# ================================================================================
+# Formatting
+# ================================================================================
+
+def format_summaries(summaries: list[ColumnSummary], rows: int, complete: bool) -> str:
+    """
+    Render column summaries for the model.
+
+    Args:
+        summaries: Summaries from ResultSummarizer.finish()
+        rows: Rows the summaries cover
+        complete: Whether those rows are the whole result
+
+    Returns:
+        One line per column; approximate figures are marked with ~
+    """
+    scope = f"all {rows} rows" if complete else f"first {rows} rows"
+    lines = [f"Column summary ({scope}):"]
+    for summary in summaries:
+        parts = []
+        if summary.nulls:
+            parts.append(f"{summary.nulls} NULL")
+        if summary.minimum is not None:
+            parts.append(f"min {format_value(summary.minimum)}")
+            parts.append(f"max {format_value(summary.maximum)}")
+        if summary.mean is not None:
+            parts.append(f"mean {format_value(summary.mean)}")
+            mark = "" if summary.quantiles_exact else "~"
+            parts.extend(f"{mark}p{round(q * 100)} {format_value(value)}" for q, value in summary.quantiles.items())
+        parts.append(f"distinct {'' if summary.distinct_exact else '~'}{summary.distinct}")
+        if summary.top:
+            mark = "" if summary.top_exact else "~"
+            top = ", ".join(f"{format_value(value)} ({mark}{count})" for value, count in summary.top)
+            parts.append(f"top {top}")
+        lines.append(f"{summary.name}: {', '.join(parts)}")
+    return "\n".join(lines)
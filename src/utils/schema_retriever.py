@@ -0,0 +1,396 @@
+"""
+Schema retrieval for the analyst prompt.
+
+Indexes the per-table sections of data/schema_output.md with BM25 and picks
+the tables relevant to a question, plus the tables needed to join them, so
+the system prompt only carries the schema slices a question actually needs.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+from src.prompts import SCHEMA_PATH
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# Set SCHEMA_RETRIEVAL=0 to always send the full schema
+RETRIEVAL_ENABLED = os.environ.get("SCHEMA_RETRIEVAL", "1") != "0"
+
+# Maximum tables picked by relevance (join tables are added on top)
+DEFAULT_TOP_K = int(os.environ.get("SCHEMA_TOP_K", "4"))
+
+# Example rows kept per table in the compact rendering
+DEFAULT_EXAMPLE_ROWS = int(os.environ.get("SCHEMA_EXAMPLE_ROWS", "1"))
+
+# Tables scoring below this fraction of the best match are dropped
+MIN_SCORE_RATIO = 0.3
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Tables used when nothing in the question matches
+DEFAULT_TABLES = ("orders", "order_items", "customers", "products")
+
+# Internal tables never shown to the model
+EXCLUDED_TABLES = {"sqlite_sequence"}
+
+
+# ================================================================================
+# Table Descriptions and Join Graph
+# ================================================================================
+
+# Business vocabulary per table, indexed next to the table and column names
+TABLE_DESCRIPTIONS = {
+    "customers": "customer customers buyer client city state location region unique",
+    "geolocation": "geolocation geography latitude longitude lat lng map zip coordinates location",
+    "leads_closed": "lead leads closed won deal marketing funnel sdr representative business segment onboarding",
+    "leads_qualified": "lead leads qualified marketing funnel mql first contact landing page origin channel campaign",
+    "order_items": "revenue sales sold price item items product quantity freight shipping seller gmv spend units",
+    "order_payments": "payment payments paid installments credit card boleto voucher debit method value",
+    "order_reviews": "review reviews rating score satisfaction comment feedback",
+    "orders": "order orders purchase date time day daily week weekly month monthly year yearly annual quarter trend status delivery delivered shipped estimated late approved",
+    "posts": "post posts blog content published title",
+    "product_category_name_translation": "category categories english translation name",
+    "products": "product products category categories weight dimensions photos size description",
+    "sellers": "seller sellers vendor merchant store city state",
+    "users": "user users username email account",
+}
+
+# Dimension terms -> tables owning such a column, preferred first. The first
+# owner is kept whatever its score, unless the question names another owner
+# ("seller city"), so "top 10 cities by number of orders" gets customer_city.
+DIMENSION_TABLES = {
+    "city": ("customers", "sellers", "geolocation"),
+    "state": ("customers", "sellers", "geolocation"),
+    "zip": ("customers", "sellers", "geolocation"),
+    "category": ("products", "product_category_name_translation"),
+    "status": ("orders",),
+    "day": ("orders",),
+    "week": ("orders",),
+    "month": ("orders",),
+    "quarter": ("orders",),
+    "year": ("orders",),
+}
+
+# Joinable table pairs, following "Key Table Relationships" in the system prompt
+JOIN_EDGES = [
+    ("orders", "customers"),
+    ("orders", "order_items"),
+    ("orders", "order_payments"),
+    ("orders", "order_reviews"),
+    ("order_items", "products"),
+    ("order_items", "sellers"),
+    ("products", "product_category_name_translation"),
+    ("leads_closed", "sellers"),
+    ("leads_closed", "leads_qualified"),
+    ("posts", "users"),
+]
+
+_WORD = re.compile(r"[a-z0-9]+")
+_HEX_ID = re.compile(r"^[0-9a-f]{16,}$")
+_YEAR = re.compile(r"^(?:19|20)\d\d$")
+
+
+def _stem(word: str) -> str:
+    """Crude plural folding so 'sellers' matches 'seller' and 'categories' 'category'."""
+    if _YEAR.match(word):
+        return "year"
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize_text(text: str) -> list[str]:
+    """Lowercase, split on non-alphanumerics (including underscores) and stem."""
+    return [_stem(word) for word in _WORD.findall(text.lower())]
+
+
+# ================================================================================
+# Schema Parsing
+# ================================================================================
+
+@dataclass
+class TableSchema:
+    """One table section of schema_output.md."""
+    name: str
+    columns: list[tuple[str, str]] = field(default_factory=list)
+    example_header: list[str] = field(default_factory=list)
+    examples: list[list[str]] = field(default_factory=list)
+
+    def render(self, example_rows: int = DEFAULT_EXAMPLE_ROWS) -> str:
+        """Render a compact markdown slice: column list plus a few example rows."""
+        lines = [f"### Table: `{self.name}`"]
+        lines.append(", ".join(f"{name} {col_type}".strip() for name, col_type in self.columns))
+        if example_rows and self.examples:
+            lines.append("Example: " + " | ".join(self.example_header))
+            for row in self.examples[:example_rows]:
+                lines.append("         " + " | ".join(row))
+        return "\n".join(lines)
+
+    def anchor_terms(self) -> set[str]:
+        """Terms from the table name and description; a question must hit one of these."""
+        return set(tokenize_text(self.name)) | set(tokenize_text(TABLE_DESCRIPTIONS.get(self.name, "")))
+
+    def index_terms(self) -> list[str]:
+        """Terms indexed for this table; the table name is weighted up."""
+        terms = tokenize_text(self.name) * 3
+        for name, _ in self.columns:
+            terms.extend(tokenize_text(name))
+        terms.extend(tokenize_text(TABLE_DESCRIPTIONS.get(self.name, "")))
+        # Categorical sample values (states, categories, payment types) help matching
+        for row in self.examples:
+            for value in row:
+                if value and value != "NULL" and not _HEX_ID.match(value):
+                    terms.extend(term for term in tokenize_text(value) if not term.isdigit())
+        return terms
+
+
+def _table_cells(line: str) -> list[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_schema_markdown(text: str) -> list[TableSchema]:
+    """Split schema_output.md into per-table schemas."""
+    tables = []
+    for section in re.split(r"^## Table: ", text, flags=re.MULTILINE)[1:]:
+        header, _, body = section.partition("\n")
+        table = TableSchema(name=header.strip().strip("`"))
+        part = None
+        for line in body.splitlines():
+            if line.startswith("### Schema"):
+                part = "schema"
+            elif line.startswith("### Example"):
+                part = "examples"
+            elif not line.startswith("|") or line.startswith("|-"):
+                continue
+            elif part == "schema":
+                cells = _table_cells(line)
+                if cells[0] != "Column":
+                    table.columns.append((cells[0], cells[1] if len(cells) > 1 else ""))
+            elif part == "examples":
+                cells = _table_cells(line)
+                if not table.example_header:
+                    table.example_header = cells
+                else:
+                    table.examples.append(cells)
+        tables.append(table)
+    return tables
+
+
+# ================================================================================
+# Retriever
+# ================================================================================
+
+@dataclass
+class SchemaSelection:
+    """Tables chosen for a question and the rendered schema section."""
+    tables: list[str]
+    schema: str
+    scores: dict[str, float]
+    matched: bool = True
+
+
+class SchemaRetriever:
+    """
+    BM25 index over table names, column names, business descriptions and
+    categorical sample values. The index is built once from the schema file.
+
+    Column names and sample values only rank a table; it is a candidate only
+    when the question mentions its name or description vocabulary, so a
+    question about "monthly revenue" does not pull in
+    leads_closed.declared_monthly_revenue.
+    """
+
+    def __init__(
+        self,
+        schema_path: Path = SCHEMA_PATH,
+        top_k: int = DEFAULT_TOP_K,
+        example_rows: int = DEFAULT_EXAMPLE_ROWS,
+        cache_size: int = 256
+    ):
+        """
+        Args:
+            schema_path: Path to the schema markdown file
+            top_k: Maximum tables picked by relevance
+            example_rows: Example rows kept per table
+            cache_size: Number of question selections remembered
+        """
+        self.top_k = top_k
+        self.example_rows = example_rows
+        self.cache_size = cache_size
+        self.tables: dict[str, TableSchema] = {}
+        for table in parse_schema_markdown(Path(schema_path).read_text(encoding="utf-8")):
+            if table.name not in EXCLUDED_TABLES:
+                self.tables[table.name] = table
+
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, SchemaSelection] = OrderedDict()
+        self._build_index()
+        self._graph: dict[str, set[str]] = {name: set() for name in self.tables}
+        for left, right in JOIN_EDGES:
+            if left in self._graph and right in self._graph:
+                self._graph[left].add(right)
+                self._graph[right].add(left)
+        logger.info(f"Schema retriever indexed {len(self.tables)} tables")
+
+    def _build_index(self):
+        self._term_freqs: dict[str, Counter] = {}
+        self._doc_lengths: dict[str, int] = {}
+        self._anchors = {name: table.anchor_terms() for name, table in self.tables.items()}
+        doc_freq: Counter = Counter()
+        for name, table in self.tables.items():
+            terms = table.index_terms()
+            self._term_freqs[name] = Counter(terms)
+            self._doc_lengths[name] = len(terms)
+            doc_freq.update(set(terms))
+        n_docs = len(self.tables) or 1
+        self._avg_length = sum(self._doc_lengths.values()) / n_docs
+        self._idf = {
+            term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def score(self, question: str) -> dict[str, float]:
+        """BM25 score of every candidate table against a question (0 for non-candidates)."""
+        query_terms = set(tokenize_text(question))
+        scores = {}
+        for name, freqs in self._term_freqs.items():
+            if not query_terms & self._anchors[name]:
+                scores[name] = 0.0
+                continue
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[name] / self._avg_length)
+            total = 0.0
+            for term in query_terms:
+                tf = freqs.get(term)
+                if tf:
+                    total += self._idf[term] * tf * (BM25_K1 + 1) / (tf + length_norm)
+            scores[name] = total
+        return scores
+
+    def _join_path(self, start: str, goal: str) -> list[str]:
+        """Shortest chain of tables joining start to goal (empty if unconnected)."""
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node == goal:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = previous[node]
+                return path
+            for neighbour in self._graph.get(node, ()):
+                if neighbour not in previous:
+                    previous[neighbour] = node
+                    queue.append(neighbour)
+        return []
+
+    def _dimension_tables(self, question: str) -> set[str]:
+        """Owners of the dimensions a question groups or filters by (city, state, category, month, ...)."""
+        terms = set(tokenize_text(question))
+        named = {name for name in self.tables if set(tokenize_text(name)) & terms}
+        tables = set()
+        for term, owners in DIMENSION_TABLES.items():
+            owners = [owner for owner in owners if owner in self.tables]
+            if term not in terms or not owners or named & set(owners):
+                continue
+            tables.add(owners[0])
+        return tables
+
+    def select_tables(self, question: str) -> tuple[list[str], dict[str, float]]:
+        """
+        Pick the tables relevant to a question and close them over join paths.
+
+        Falls back to DEFAULT_TABLES when nothing matches. Owners of the
+        dimensions the question mentions (DIMENSION_TABLES) are always kept.
+
+        Returns:
+            (table names in schema order, relevance scores)
+        """
+        scores = self.score(question)
+        ranked = sorted((s, name) for name, s in scores.items() if s > 0)
+        ranked.reverse()
+        if not ranked:
+            chosen = {name for name in DEFAULT_TABLES if name in self.tables}
+        else:
+            best = ranked[0][0]
+            chosen = {name for s, name in ranked[:self.top_k] if s >= best * MIN_SCORE_RATIO}
+        chosen.update(self._dimension_tables(question))
+
+        # Add bridge tables so every chosen table can be joined to the others
+        anchor = max(chosen, key=lambda name: scores.get(name, 0.0))
+        for name in list(chosen):
+            chosen.update(self._join_path(anchor, name))
+
+        return [name for name in self.tables if name in chosen], scores
+
+    def retrieve(self, question: str) -> SchemaSelection:
+        """Return the schema section for a question (cached per question)."""
+        key = " ".join(question.split()).lower()
+        with self._lock:
+            selection = self._cache.get(key)
+            if selection is not None:
+                self._cache.move_to_end(key)
+                return selection
+
+        tables, scores = self.select_tables(question)
+        schema = "\n\n".join(self.tables[name].render(self.example_rows) for name in tables)
+        selection = SchemaSelection(
+            tables=tables,
+            schema=schema,
+            scores=scores,
+            matched=any(score > 0 for score in scores.values())
+        )
+
+        with self._lock:
+            self._cache[key] = selection
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return selection
+
+    def merge(self, selections: list[SchemaSelection]) -> SchemaSelection:
+        """
+        Combine the selections of several questions of one conversation.
+
+        Tables of selections that matched nothing (the DEFAULT_TABLES
+        fallback) are only kept when no selection matched. The union is
+        closed over join paths so the tables can still be joined.
+        """
+        matched = [selection for selection in selections if selection.matched]
+        if len(matched) <= 1:
+            return matched[0] if matched else selections[0]
+
+        scores: dict[str, float] = {}
+        for selection in matched:
+            for name, score in selection.scores.items():
+                scores[name] = max(scores.get(name, 0.0), score)
+        chosen = {name for selection in matched for name in selection.tables}
+        anchor = max(chosen, key=lambda name: scores.get(name, 0.0))
+        for name in list(chosen):
+            chosen.update(self._join_path(anchor, name))
+
+        tables = [name for name in self.tables if name in chosen]
+        schema = "\n\n".join(self.tables[name].render(self.example_rows) for name in tables)
+        return SchemaSelection(tables=tables, schema=schema, scores=scores)
+
+
+_retriever: Optional[SchemaRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_schema_retriever() -> SchemaRetriever:
+    """Get or create the schema retriever singleton."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = SchemaRetriever()
+    return _retriever
@@ -0,0 +1,177 @@
+"""
+State shared between app worker processes.
+
+When the app runs as several worker processes (see asgi.py), each worker has
+its own memory. The query-result cache and the result handles keep their
+in-process LRU as the first level and fall back to this store, a namespaced
+key/value table in a WAL-mode SQLite file, so work done by one worker is
+visible to the others. Conversation state uses the SQLite checkpointer in
+shared mode (see src/utils/checkpointer.py).
+
+Values are pickled; the file is local to the host and only written by the app.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# ===============================
+# Deployment Configuration
+# ===============================
+
+# Worker processes serving the app (uvicorn reads the same variable for --workers)
+APP_WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# "on", "off" or "auto" (on when more than one worker is configured)
+SHARED_STATE = os.environ.get("SHARED_STATE", "auto").lower()
+
+SHARED_STATE_PATH = Path(os.environ.get(
+    "SHARED_STATE_PATH",
+    Path(__file__).parent.parent.parent / "data" / "shared_state.sqlite"
+))
+
+# Entries kept per namespace; older ones are pruned every PRUNE_EVERY writes
+MAX_ENTRIES_PER_NAMESPACE = int(os.environ.get("SHARED_STATE_MAX_ENTRIES", "4096"))
+PRUNE_EVERY = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL,
+    value BLOB,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS kv_age ON kv (namespace, stored_at);
+"""
+
+
+def connect_shared_sqlite(path: Path, timeout: float = 30.0) -> sqlite3.Connection:
+    """Open a writable SQLite connection in WAL mode, safe to share between processes."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=timeout, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def shared_state_enabled() -> bool:
+    """Whether caches should be backed by the shared store."""
+    if SHARED_STATE in ("on", "1", "true"):
+        return True
+    if SHARED_STATE in ("off", "0", "false"):
+        return False
+    return APP_WORKERS > 1
+
+
+def digest_key(value: Any) -> str:
+    """Stable text key for a hashable value (tuples of str/int/None)."""
+    return hashlib.sha1(repr(value).encode("utf-8")).hexdigest()
+
+
+class SharedStore:
+    """Namespaced key/value store in a SQLite file shared by worker processes."""
+
+    def __init__(self, db_path: Path = SHARED_STATE_PATH, max_entries: int = MAX_ENTRIES_PER_NAMESPACE):
+        """
+        Args:
+            db_path: SQLite file holding the shared entries
+            max_entries: Entries kept per namespace
+        """
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = connect_shared_sqlite(self.db_path)
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+        self._writes = 0
+        logger.info(f"Shared state store using {self.db_path}")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return the stored value, or None if missing, expired or unreadable."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT expires_at, value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared state read failed: {str(e)}")
+            return None
+        if row is None:
+            return None
+        expires_at, blob = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        try:
+            return pickle.loads(blob)
+        except Exception as e:
+            logger.warning(f"Dropping unreadable shared entry {namespace}/{key}: {str(e)}")
+            self.delete(namespace, key)
+            return None
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value, optionally expiring after ttl seconds."""
+        now = time.time()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            with self._lock:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?, ?)",
+                        (namespace, key, now, now + ttl if ttl is not None else None, blob)
+                    )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune(namespace, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared state write failed: {str(e)}")
+
+    def _prune(self, namespace: str, now: float):
+        """Drop expired and least recently stored entries. Caller holds the lock."""
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND expires_at < ?", (namespace, now)
+            )
+            self._conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key IN ("
+                "SELECT key FROM kv WHERE namespace = ? ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (namespace, namespace, self.max_entries)
+            )
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str):
+        """Drop every entry of a namespace."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM kv WHERE namespace = ?", (namespace,))
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM kv WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+
+_store: Optional[SharedStore] = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> SharedStore:
+    """Get or create the shared store for this process."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SharedStore()
+    return _store
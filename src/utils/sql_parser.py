@@ -0,0 +1,533 @@
+"""
+Minimal parser for the single-SELECT subset of SQLite the agent writes.
+
+It only understands what the query rewriters can act on: one SELECT with
+inner/left joins on column equalities, conjunctive WHERE predicates,
+GROUP BY, ORDER BY and LIMIT. Anything else raises SQLParseError, and
+callers fall back to running the query unchanged.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Optional, Union
+
+# Tokens: comments, string literals, quoted identifiers, numbers, words, operators
+TOKEN_PATTERN = re.compile(
+    r"(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<string>'(?:[^']|'')*')"
+    r"|(?P<quoted>\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])"
+    r"|(?P<number>\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)"
+    r"|(?P<word>[A-Za-z_][A-Za-z0-9_$]*)"
+    r"|(?P<op><=|>=|<>|!=|==|\|\||<<|>>|\S)"
+    r"|(?P<space>\s+)",
+    re.DOTALL
+)
+
+AGGREGATES = {"count", "sum", "avg", "min", "max", "total"}
+
+_KEYWORDS = {
+    "select", "from", "where", "group", "by", "order", "limit", "offset", "having",
+    "join", "inner", "left", "outer", "cross", "natural", "on", "using", "as", "and",
+    "or", "not", "in", "between", "is", "null", "asc", "desc", "distinct", "union",
+    "intersect", "except", "case", "when", "then", "else", "end", "like", "glob", "with",
+}
+
+
+class SQLParseError(ValueError):
+    """Raised when a query falls outside the supported subset."""
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+
+    @property
+    def lower(self) -> str:
+        return self.text.lower()
+
+
+def tokenize(query: str) -> list[Token]:
+    """Split a query into tokens, dropping comments and whitespace."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            continue
+        tokens.append(Token(kind, match.group(), match.start(), match.end()))
+    return tokens
+
+
+# ================================================================================
+# AST
+# ================================================================================
+
+@dataclass(frozen=True)
+class Column:
+    table: Optional[str]
+    name: str
+
+
+@dataclass(frozen=True)
+class Literal:
+    value: Any
+
+
+@dataclass(frozen=True)
+class Star:
+    pass
+
+
+@dataclass(frozen=True)
+class Func:
+    name: str
+    args: tuple
+    distinct: bool = False
+
+    @property
+    def is_aggregate(self) -> bool:
+        return self.name in AGGREGATES
+
+
+@dataclass(frozen=True)
+class BinOp:
+    op: str
+    left: Any
+    right: Any
+
+
+Expr = Union[Column, Literal, Star, Func, BinOp]
+
+
+@dataclass
+class SelectItem:
+    expr: Expr
+    alias: Optional[str]
+    text: str
+
+    @property
+    def output_name(self) -> str:
+        """The column name SQLite reports for this item."""
+        if self.alias:
+            return self.alias
+        if isinstance(self.expr, Column):
+            return self.expr.name
+        return self.text
+
+
+@dataclass
+class Join:
+    table: str
+    alias: Optional[str]
+    kind: str
+    on: list[tuple[Column, Column]]
+
+
+@dataclass
+class Predicate:
+    expr: Expr
+    op: str
+    values: tuple = ()
+
+
+@dataclass
+class OrderItem:
+    expr: Expr
+    descending: bool = False
+
+
+@dataclass
+class SelectQuery:
+    items: list[SelectItem]
+    table: str
+    alias: Optional[str]
+    joins: list[Join] = field(default_factory=list)
+    where: list[Predicate] = field(default_factory=list)
+    group_by: list[Expr] = field(default_factory=list)
+    order_by: list[OrderItem] = field(default_factory=list)
+    limit: Optional[int] = None
+    offset: Optional[int] = None
+    distinct: bool = False
+
+    def aliases(self) -> dict[str, str]:
+        """Map every alias and table name used in FROM/JOIN to its table."""
+        mapping = {self.table: self.table}
+        if self.alias:
+            mapping[self.alias] = self.table
+        for join in self.joins:
+            mapping[join.table] = join.table
+            if join.alias:
+                mapping[join.alias] = join.table
+        return mapping
+
+    @property
+    def tables(self) -> set[str]:
+        return {self.table} | {join.table for join in self.joins}
+
+    @property
+    def is_aggregate(self) -> bool:
+        return bool(self.group_by) or any(contains_aggregate(item.expr) for item in self.items)
+
+
+def contains_aggregate(expr: Expr) -> bool:
+    """Return True if the expression contains an aggregate function."""
+    if isinstance(expr, Func):
+        return expr.is_aggregate or any(contains_aggregate(arg) for arg in expr.args)
+    if isinstance(expr, BinOp):
+        return contains_aggregate(expr.left) or contains_aggregate(expr.right)
+    return False
+
+
+def columns_in(expr: Expr) -> list[Column]:
+    """Return every column referenced by an expression."""
+    if isinstance(expr, Column):
+        return [expr]
+    if isinstance(expr, Func):
+        return [column for arg in expr.args for column in columns_in(arg)]
+    if isinstance(expr, BinOp):
+        return columns_in(expr.left) + columns_in(expr.right)
+    return []
+
+
+# ================================================================================
+# Parser
+# ================================================================================
+
+class _Parser:
+    def __init__(self, query: str):
+        self.query = query
+        self.tokens = tokenize(query)
+        self.pos = 0
+
+    # Token helpers
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def at(self, *words: str) -> bool:
+        token = self.peek()
+        return token is not None and token.lower in words
+
+    def accept(self, *words: str) -> Optional[Token]:
+        if self.at(*words):
+            token = self.tokens[self.pos]
+            self.pos += 1
+            return token
+        return None
+
+    def expect(self, *words: str) -> Token:
+        token = self.accept(*words)
+        if token is None:
+            found = self.peek().text if self.peek() else "end of query"
+            raise SQLParseError(f"Expected {' or '.join(words)}, found {found}")
+        return token
+
+    def identifier(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise SQLParseError("Unexpected end of query")
+        if token.kind == "word" and token.lower not in _KEYWORDS:
+            self.pos += 1
+            return token.lower
+        if token.kind == "quoted" and token.text[0] in "`[":
+            self.pos += 1
+            return token.text[1:-1].lower()
+        raise SQLParseError(f"Expected identifier, found {token.text}")
+
+    # Grammar
+
+    def parse(self) -> SelectQuery:
+        self.expect("select")
+        distinct = self.accept("distinct") is not None
+        items = [self.select_item()]
+        while self.accept(","):
+            items.append(self.select_item())
+
+        self.expect("from")
+        table, alias = self.table_reference()
+        query = SelectQuery(items=items, table=table, alias=alias, distinct=distinct)
+
+        while self.at("join", "inner", "left"):
+            query.joins.append(self.join())
+
+        if self.accept("where"):
+            query.where = self.conjunction()
+        if self.accept("group"):
+            self.expect("by")
+            query.group_by = [self.expression()]
+            while self.accept(","):
+                query.group_by.append(self.expression())
+        if self.at("having"):
+            raise SQLParseError("HAVING is not supported")
+        if self.accept("order"):
+            self.expect("by")
+            query.order_by = [self.order_item()]
+            while self.accept(","):
+                query.order_by.append(self.order_item())
+        if self.accept("limit"):
+            query.limit = self.integer()
+            if self.accept("offset"):
+                query.offset = self.integer()
+            elif self.accept(","):
+                query.offset, query.limit = query.limit, self.integer()
+
+        while self.accept(";"):
+            pass
+        if self.peek() is not None:
+            raise SQLParseError(f"Unsupported syntax near {self.peek().text}")
+        return query
+
+    def integer(self) -> int:
+        token = self.peek()
+        if token is None or token.kind != "number" or not token.text.isdigit():
+            raise SQLParseError("Expected an integer")
+        self.pos += 1
+        return int(token.text)
+
+    def select_item(self) -> SelectItem:
+        start = self.peek()
+        if start is None:
+            raise SQLParseError("Unexpected end of query")
+        expr = self.expression()
+        end = self.tokens[self.pos - 1]
+        text = self.query[start.start:end.end]
+        alias = None
+        if self.accept("as"):
+            alias = self.alias_name()
+        elif self.peek() is not None and self.peek().kind in ("word", "quoted") and self.peek().lower not in _KEYWORDS:
+            alias = self.alias_name()
+        return SelectItem(expr=expr, alias=alias, text=text)
+
+    def alias_name(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise SQLParseError("Expected alias")
+        self.pos += 1
+        if token.kind == "quoted":
+            return token.text[1:-1]
+        if token.kind == "string":
+            return token.text[1:-1].replace("''", "'")
+        if token.kind == "word":
+            return token.text
+        raise SQLParseError(f"Invalid alias {token.text}")
+
+    def table_reference(self) -> tuple[str, Optional[str]]:
+        if self.at("("):
+            raise SQLParseError("Subqueries are not supported")
+        table = self.identifier()
+        if self.at("."):
+            raise SQLParseError("Schema-qualified tables are not supported")
+        alias = None
+        if self.accept("as"):
+            alias = self.identifier()
+        elif self.peek() is not None and self.peek().kind == "word" and self.peek().lower not in _KEYWORDS:
+            alias = self.identifier()
+        if self.at(","):
+            raise SQLParseError("Comma joins are not supported")
+        return table, alias
+
+    def join(self) -> Join:
+        kind = "inner"
+        if self.accept("left"):
+            kind = "left"
+            self.accept("outer")
+        else:
+            self.accept("inner")
+        self.expect("join")
+        table, alias = self.table_reference()
+        self.expect("on")
+        conditions = [self.join_condition()]
+        while self.accept("and"):
+            conditions.append(self.join_condition())
+        return Join(table=table, alias=alias, kind=kind, on=conditions)
+
+    def join_condition(self) -> tuple[Column, Column]:
+        left = self.expression()
+        self.expect("=", "==")
+        right = self.expression()
+        if not isinstance(left, Column) or not isinstance(right, Column):
+            raise SQLParseError("Join conditions must compare two columns")
+        return left, right
+
+    def conjunction(self) -> list[Predicate]:
+        predicates = [self.predicate()]
+        while self.accept("and"):
+            predicates.append(self.predicate())
+        if self.at("or"):
+            raise SQLParseError("OR predicates are not supported")
+        return predicates
+
+    def predicate(self) -> Predicate:
+        expr = self.expression()
+        if self.accept("is"):
+            if self.accept("not"):
+                self.expect("null")
+                return Predicate(expr, "is not null")
+            self.expect("null")
+            return Predicate(expr, "is null")
+        negated = self.accept("not") is not None
+        if self.accept("in"):
+            self.expect("(")
+            if self.at("select"):
+                raise SQLParseError("Subqueries are not supported")
+            values = [self.literal_value()]
+            while self.accept(","):
+                values.append(self.literal_value())
+            self.expect(")")
+            return Predicate(expr, "not in" if negated else "in", tuple(values))
+        if self.accept("between"):
+            low = self.literal_value()
+            self.expect("and")
+            high = self.literal_value()
+            return Predicate(expr, "not between" if negated else "between", (low, high))
+        if negated:
+            raise SQLParseError("Unsupported NOT predicate")
+        token = self.peek()
+        if token is None or token.text not in ("=", "==", "!=", "<>", "<", "<=", ">", ">="):
+            raise SQLParseError("Expected a comparison")
+        self.pos += 1
+        op = {"==": "=", "<>": "!="}.get(token.text, token.text)
+        return Predicate(expr, op, (self.literal_value(),))
+
+    def literal_value(self) -> Any:
+        expr = self.expression()
+        if not isinstance(expr, Literal):
+            raise SQLParseError("Only literal comparisons are supported")
+        return expr.value
+
+    def order_item(self) -> OrderItem:
+        expr = self.expression()
+        if self.accept("desc"):
+            return OrderItem(expr, True)
+        self.accept("asc")
+        return OrderItem(expr, False)
+
+    def expression(self) -> Expr:
+        left = self.term()
+        while self.peek() is not None and self.peek().text in ("+", "-"):
+            op = self.tokens[self.pos].text
+            self.pos += 1
+            left = BinOp(op, left, self.term())
+        return left
+
+    def term(self) -> Expr:
+        left = self.factor()
+        while self.peek() is not None and self.peek().text in ("*", "/"):
+            op = self.tokens[self.pos].text
+            self.pos += 1
+            left = BinOp(op, left, self.factor())
+        return left
+
+    def factor(self) -> Expr:
+        token = self.peek()
+        if token is None:
+            raise SQLParseError("Unexpected end of query")
+
+        if token.text == "-":
+            self.pos += 1
+            operand = self.factor()
+            if isinstance(operand, Literal) and isinstance(operand.value, (int, float)):
+                return Literal(-operand.value)
+            return BinOp("-", Literal(0), operand)
+        if token.text == "(":
+            self.pos += 1
+            if self.at("select"):
+                raise SQLParseError("Subqueries are not supported")
+            expr = self.expression()
+            self.expect(")")
+            return expr
+        if token.text == "*":
+            self.pos += 1
+            return Star()
+        if token.kind == "number":
+            self.pos += 1
+            if re.fullmatch(r"\d+", token.text):
+                return Literal(int(token.text))
+            return Literal(float(token.text))
+        if token.kind == "string":
+            self.pos += 1
+            return Literal(token.text[1:-1].replace("''", "'"))
+        if token.lower == "null":
+            self.pos += 1
+            return Literal(None)
+        if token.kind == "word" and token.lower in _KEYWORDS:
+            raise SQLParseError(f"Unsupported keyword {token.text}")
+        if token.kind == "quoted" and token.text[0] == '"':
+            raise SQLParseError("Double-quoted identifiers are not supported")
+
+        name = self.identifier()
+        if self.accept("("):
+            return self.function_call(name)
+        if self.accept("."):
+            if self.at("*"):
+                raise SQLParseError("table.* is not supported")
+            return Column(name, self.identifier())
+        return Column(None, name)
+
+    def function_call(self, name: str) -> Func:
+        distinct = self.accept("distinct") is not None
+        args = []
+        if not self.at(")"):
+            args.append(self.expression())
+            while self.accept(","):
+                args.append(self.expression())
+        self.expect(")")
+        return Func(name=name, args=tuple(args), distinct=distinct)
+
+
+def parse_select(query: str) -> SelectQuery:
+    """
+    Parse a query in the supported SELECT subset.
+
+    Raises:
+        SQLParseError: If the query uses anything outside the subset
+    """
+    return _Parser(query).parse()
+
+
+# ================================================================================
+# Rendering
+# ================================================================================
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def render_literal(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+def render_expr(expr: Expr) -> str:
+    """Render an expression back to SQL."""
+    if isinstance(expr, Column):
+        return f"{expr.table}.{expr.name}" if expr.table else expr.name
+    if isinstance(expr, Literal):
+        return render_literal(expr.value)
+    if isinstance(expr, Star):
+        return "*"
+    if isinstance(expr, Func):
+        args = ", ".join(render_expr(arg) for arg in expr.args)
+        return f"{expr.name.upper()}({'DISTINCT ' if expr.distinct else ''}{args})"
+    if isinstance(expr, BinOp):
+        return f"({render_expr(expr.left)} {expr.op} {render_expr(expr.right)})"
+    raise SQLParseError(f"Cannot render {expr!r}")
+
+
+def render_predicate(predicate: Predicate) -> str:
+    """Render a WHERE predicate back to SQL."""
+    expr = render_expr(predicate.expr)
+    if predicate.op in ("is null", "is not null"):
+        return f"{expr} {predicate.op.upper()}"
+    if predicate.op in ("in", "not in"):
+        values = ", ".join(render_literal(value) for value in predicate.values)
+        return f"{expr} {predicate.op.upper()} ({values})"
+    if predicate.op in ("between", "not between"):
+        low, high = predicate.values
+        return f"{expr} {predicate.op.upper()} {render_literal(low)} AND {render_literal(high)}"
+    return f"{expr} {predicate.op} {render_literal(predicate.values[0])}"
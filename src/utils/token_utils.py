@@ -0,0 +1,42 @@
+"""
+Token counting helpers for prompt budgeting.
+"""
+from functools import lru_cache
+from src.logger import setup_application_logger
+
+logger = setup_application_logger(__name__)
+
+# Rough characters-per-token ratio for English text and SQL/markdown
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tiktoken encoding if the package is installed."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        logger.debug("tiktoken not available, estimating tokens from character count")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Count (or estimate) the number of tokens in a text.
+
+    Uses tiktoken's cl100k_base encoding when available. Local models use
+    different tokenizers, so the result is an estimate either way.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Token count
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -0,0 +1,104 @@
+"""Shared fixtures: a small synthetic copy of the Olist database."""
+import datetime
+import random
+import shutil
+import sqlite3
+
+import pytest
+
+SCHEMA = """
+CREATE TABLE customers (customer_id TEXT, customer_unique_id TEXT, customer_zip_code_prefix INTEGER,
+    customer_city TEXT, customer_state TEXT);
+CREATE TABLE geolocation (geolocation_zip_code_prefix INTEGER, geolocation_lat REAL, geolocation_lng REAL,
+    geolocation_city TEXT, geolocation_state TEXT);
+CREATE TABLE orders (order_id TEXT, customer_id TEXT, order_status TEXT, order_purchase_timestamp TEXT,
+    order_approved_at TEXT, order_delivered_carrier_date TEXT, order_delivered_customer_date TEXT,
+    order_estimated_delivery_date TEXT);
+CREATE TABLE order_items (order_id TEXT, order_item_id INTEGER, product_id TEXT, seller_id TEXT,
+    shipping_limit_date TEXT, price REAL, freight_value REAL);
+CREATE TABLE order_payments (order_id TEXT, payment_sequential INTEGER, payment_type TEXT,
+    payment_installments INTEGER, payment_value REAL);
+CREATE TABLE order_reviews (review_id TEXT, order_id TEXT, review_score INTEGER, review_comment_title TEXT,
+    review_comment_message TEXT, review_creation_date TEXT, review_answer_timestamp TEXT);
+CREATE TABLE products (product_id TEXT, product_category_name TEXT, product_name_lenght REAL,
+    product_description_lenght REAL, product_photos_qty REAL, product_weight_g REAL, product_length_cm REAL,
+    product_height_cm REAL, product_width_cm REAL);
+CREATE TABLE sellers (seller_id TEXT, seller_zip_code_prefix INTEGER, seller_city TEXT, seller_state TEXT);
+CREATE TABLE product_category_name_translation (product_category_name TEXT, product_category_name_english TEXT);
+"""
+
+STATES = ["SP", "RJ", "MG", "RS", "PR", "BA"]
+CITIES = ["sao paulo", "rio de janeiro", "belo horizonte", "porto alegre", "curitiba", "salvador", "campinas"]
+CATEGORIES = ["beleza_saude", "informatica_acessorios", "esporte_lazer", "moveis_decoracao", None]
+PAYMENT_TYPES = ["credit_card", "boleto", "voucher", "debit_card"]
+ORDER_STATUSES = ["delivered", "shipped", "canceled"]
+
+
+def _timestamp(value: datetime.datetime) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_olist_database(path, orders: int = 2000, seed: int = 1):
+    """Write a small Olist-shaped database with NULL delivery dates, NULL categories and multi-item orders."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO product_category_name_translation VALUES (?, ?)",
+        [(category, f"{category}_en") for category in CATEGORIES if category]
+    )
+    customers = 600
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?, ?, ?)", [
+        (f"c{i}", f"u{i % 500}", 1000 + i % 300, rng.choice(CITIES), rng.choice(STATES)) for i in range(customers)
+    ])
+    conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        (f"p{i}", rng.choice(CATEGORIES), 40, 300, 2, rng.randint(100, 5000), 20, 10, 15) for i in range(120)
+    ])
+    conn.executemany("INSERT INTO sellers VALUES (?, ?, ?, ?)", [
+        (f"s{i}", 2000 + i, rng.choice(CITIES), rng.choice(STATES)) for i in range(40)
+    ])
+    conn.executemany("INSERT INTO geolocation VALUES (?, ?, ?, ?, ?)", [
+        (1000 + i % 300, -23.5 + rng.random(), -46.6 + rng.random(), rng.choice(CITIES), rng.choice(STATES))
+        for i in range(2000)
+    ])
+
+    start = datetime.datetime(2016, 9, 1)
+    for i in range(orders):
+        purchased = start + datetime.timedelta(seconds=rng.randint(0, 730 * 86400))
+        conn.execute("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+            f"o{i}", f"c{rng.randrange(customers)}", rng.choice(ORDER_STATUSES), _timestamp(purchased),
+            _timestamp(purchased + datetime.timedelta(hours=5)),
+            None if i % 7 == 0 else _timestamp(purchased + datetime.timedelta(days=2)),
+            None if i % 5 == 0 else _timestamp(purchased + datetime.timedelta(days=8)),
+            _timestamp(purchased + datetime.timedelta(days=15)),
+        ))
+        for item in range(rng.randint(1, 3)):
+            conn.execute("INSERT INTO order_items VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                f"o{i}", item + 1, f"p{rng.randrange(120)}", f"s{rng.randrange(40)}", _timestamp(purchased),
+                round(rng.uniform(5, 500), 2), round(rng.uniform(1, 50), 2),
+            ))
+        for sequential in range(rng.choice([1, 1, 1, 2])):
+            conn.execute("INSERT INTO order_payments VALUES (?, ?, ?, ?, ?)", (
+                f"o{i}", sequential + 1, rng.choice(PAYMENT_TYPES), rng.randint(1, 10), round(rng.uniform(5, 600), 2),
+            ))
+        conn.execute("INSERT INTO order_reviews VALUES (?, ?, ?, ?, ?, ?, ?)", (
+            f"r{i}", f"o{i}", rng.randint(1, 5), None, "ok" if i % 3 else None,
+            _timestamp(purchased), _timestamp(purchased),
+        ))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def olist_template(tmp_path_factory):
+    path = tmp_path_factory.mktemp("olist") / "olist.sqlite"
+    create_olist_database(path)
+    return path
+
+
+@pytest.fixture
+def olist_db(olist_template, tmp_path):
+    """A fresh copy of the synthetic database per test, so tests may migrate or modify it."""
+    path = tmp_path / "olist.sqlite"
+    shutil.copy(olist_template, path)
+    return path
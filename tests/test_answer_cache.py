@@ -0,0 +1,53 @@
+"""Tests for question matching in the answer cache."""
+import pytest
+
+from src.services.answer_cache import AnswerCache, question_signature
+
+
+@pytest.fixture
+def cache(tmp_path):
+    db_path = tmp_path / "olist.sqlite"
+    db_path.write_bytes(b"")
+    return AnswerCache(db_path)
+
+
+def test_rephrased_question_is_replayed(cache):
+    cache.put("Top 10 cities by number of orders?", "model", "answer")
+    entry = cache.get("show me the top 10 cities by orders number", "model")
+    assert entry is not None and entry.value == "answer"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    (
+        "Show monthly revenue by product category and payment type for customers in each city",
+        "Show monthly revenue by product category and payment type for customers in each state",
+    ),
+    ("Average review score by seller", "Average review score by customer"),
+    ("Monthly revenue per product category", "Weekly revenue per product category"),
+    ("Number of orders by status", "Number of orders by payment type"),
+])
+def test_different_dimension_is_not_replayed(cache, cached, asked):
+    cache.put(cached, "model", "answer")
+    assert cache.get(asked, "model") is None
+
+
+def test_dimension_words_are_part_of_the_key():
+    city = question_signature("revenue for customers in each city")
+    state = question_signature("revenue for customers in each state")
+    assert city.key != state.key
+    assert city.words == state.words
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Top 10 cities by number of orders", "Bottom 10 cities by number of orders"),
+    ("Top 10 cities by number of orders", "Top 5 cities by number of orders"),
+    ("Revenue in 2017", "Revenue in 2018"),
+])
+def test_different_polarity_or_slots_are_not_replayed(cache, cached, asked):
+    cache.put(cached, "model", "answer")
+    assert cache.get(asked, "model") is None
+
+
+def test_answers_are_kept_per_model(cache):
+    cache.put("Top 10 cities by number of orders", "model-a", "answer")
+    assert cache.get("Top 10 cities by number of orders", "model-b") is None
@@ -0,0 +1,104 @@
+"""Conversation state must survive a restart of the SQLite checkpointer."""
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from src.utils.checkpointer import SQLiteCheckpointer
+
+CONFIG = {"configurable": {"thread_id": "thread-1"}}
+
+
+def _compile(checkpointer):
+    graph = StateGraph(MessagesState)
+    graph.add_node("reply", lambda state: {"messages": [AIMessage(f"reply {len(state['messages'])}")]})
+    graph.add_edge(START, "reply")
+    graph.add_edge("reply", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def _contents(state):
+    return [message.content for message in state.values.get("messages", [])]
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_state_survives_restart(tmp_path, shared):
+    path = tmp_path / "checkpoints.sqlite"
+    checkpointer = SQLiteCheckpointer(path, shared=shared)
+    app = _compile(checkpointer)
+    app.invoke({"messages": [HumanMessage("first")]}, CONFIG)
+    app.invoke({"messages": [HumanMessage("second")]}, CONFIG)
+    before = _contents(app.get_state(CONFIG))
+    checkpointer.close()
+
+    reopened = SQLiteCheckpointer(path, shared=shared)
+    try:
+        app = _compile(reopened)
+        assert _contents(app.get_state(CONFIG)) == before == ["first", "reply 1", "second", "reply 3"]
+        app.invoke({"messages": [HumanMessage("third")]}, CONFIG)
+        assert _contents(app.get_state(CONFIG))[-2:] == ["third", "reply 5"]
+    finally:
+        reopened.close()
+
+
+def test_async_api_persists(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+
+    async def run():
+        checkpointer = SQLiteCheckpointer(path)
+        app = _compile(checkpointer)
+        await app.ainvoke({"messages": [HumanMessage("hello")]}, CONFIG)
+        checkpointer.close()
+
+        reopened = SQLiteCheckpointer(path)
+        try:
+            state = await _compile(reopened).aget_state(CONFIG)
+            return _contents(state)
+        finally:
+            reopened.close()
+
+    assert asyncio.run(run()) == ["hello", "reply 1"]
+
+
+def test_checkpoints_are_pruned_per_thread(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    checkpointer = SQLiteCheckpointer(path, max_checkpoints_per_thread=3)
+    app = _compile(checkpointer)
+    for turn in range(5):
+        app.invoke({"messages": [HumanMessage(f"turn {turn}")]}, CONFIG)
+    checkpointer.close()
+
+    reopened = SQLiteCheckpointer(path, max_checkpoints_per_thread=3)
+    try:
+        app = _compile(reopened)
+        assert len(list(app.get_state_history(CONFIG))) == 3
+        assert _contents(app.get_state(CONFIG))[-1] == "reply 9"
+    finally:
+        reopened.close()
+
+
+def test_deleted_thread_stays_deleted(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    checkpointer = SQLiteCheckpointer(path)
+    app = _compile(checkpointer)
+    app.invoke({"messages": [HumanMessage("forget me")]}, CONFIG)
+    checkpointer.delete_thread("thread-1")
+    checkpointer.close()
+
+    reopened = SQLiteCheckpointer(path)
+    try:
+        assert _contents(_compile(reopened).get_state(CONFIG)) == []
+    finally:
+        reopened.close()
+
+
+def test_evicted_thread_is_reloaded(tmp_path):
+    checkpointer = SQLiteCheckpointer(tmp_path / "checkpoints.sqlite", max_cached_threads=1)
+    try:
+        app = _compile(checkpointer)
+        app.invoke({"messages": [HumanMessage("one")]}, CONFIG)
+        app.invoke({"messages": [HumanMessage("two")]}, {"configurable": {"thread_id": "thread-2"}})
+        assert _contents(app.get_state(CONFIG)) == ["one", "reply 1"]
+    finally:
+        checkpointer.close()
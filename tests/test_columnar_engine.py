@@ -0,0 +1,68 @@
+"""The columnar engine must return exactly what SQLite returns for the queries it accepts."""
+import sqlite3
+import threading
+
+import pytest
+
+from src.services.columnar_engine import ColumnarEngine
+
+QUERIES = [
+    "SELECT c.customer_state, COUNT(*) AS n FROM orders o JOIN customers c ON o.customer_id = c.customer_id "
+    "GROUP BY c.customer_state ORDER BY n DESC, c.customer_state",
+    "SELECT strftime('%Y-%m', o.order_purchase_timestamp) AS m, ROUND(SUM(oi.price), 2) FROM orders o "
+    "JOIN order_items oi ON o.order_id = oi.order_id GROUP BY m ORDER BY m",
+    "SELECT payment_type, COUNT(*), MAX(payment_value) FROM order_payments GROUP BY payment_type ORDER BY 2 DESC, 1",
+    "SELECT COUNT(DISTINCT customer_id) FROM orders",
+    "SELECT review_score, COUNT(*) FROM order_reviews GROUP BY review_score ORDER BY review_score",
+    "SELECT COUNT(*) FROM orders WHERE order_status = 'delivered'",
+    "SELECT customer_city, COUNT(*) FROM customers GROUP BY customer_city ORDER BY 2 DESC, 1 LIMIT 10",
+    "SELECT AVG(review_score) FROM order_reviews",
+    "SELECT seller_state, COUNT(*) FROM sellers GROUP BY seller_state ORDER BY seller_state",
+    "SELECT COUNT(*) FROM order_items oi LEFT JOIN products p ON p.product_id = oi.product_id "
+    "WHERE p.product_category_name IS NULL",
+    "SELECT product_category_name, AVG(product_weight_g) FROM products GROUP BY 1 ORDER BY 1 LIMIT 5",
+    "SELECT order_status, COUNT(*) / 2 FROM orders GROUP BY order_status ORDER BY order_status",
+    "SELECT SUM(payment_installments) FROM order_payments WHERE payment_value > 100",
+    "SELECT customer_state, customer_city, COUNT(*) FROM customers GROUP BY 1, 2 ORDER BY 3 DESC, 1, 2 LIMIT 5",
+    "SELECT MIN(order_purchase_timestamp), MAX(order_purchase_timestamp) FROM orders",
+    "SELECT upper(customer_state) s, COUNT(*) FROM customers WHERE customer_state IN ('SP', 'RJ') GROUP BY s ORDER BY s",
+    "SELECT COUNT(*) FROM orders o JOIN customers c ON o.customer_id = c.customer_id "
+    "WHERE c.customer_state = 'SP' AND o.order_status != 'canceled'",
+    "SELECT order_status, COUNT(order_delivered_customer_date) FROM orders GROUP BY order_status ORDER BY 1",
+    "SELECT TOTAL(payment_installments), SUM(payment_installments), COUNT(*) FROM order_payments "
+    "WHERE payment_type = 'nothing'",
+]
+
+
+@pytest.fixture(scope="module")
+def engine(olist_template, tmp_path_factory):
+    columnar = ColumnarEngine(olist_template, tmp_path_factory.mktemp("columnar"), auto_refresh=False)
+    columnar.refresh(force=True)
+    return columnar
+
+
+@pytest.fixture(scope="module")
+def source(olist_template):
+    conn = sqlite3.connect(olist_template)
+    yield conn
+    conn.close()
+
+
+def _typed(rows):
+    """Rows with each value's type, so 1 and 1.0 do not compare equal."""
+    return [tuple((type(value).__name__, value) for value in row) for row in rows]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_result_matches_sqlite(engine, source, query):
+    result = engine.execute(query)
+    assert result is not None, "query fell back to SQLite"
+    cursor = source.execute(query)
+    assert result.columns == [column[0] for column in cursor.description]
+    assert _typed(result.rows) == _typed(cursor.fetchall())
+
+
+def test_cancelled_query_falls_back(engine):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    assert engine.execute(QUERIES[0], cancel_event=cancel_event) is None
@@ -0,0 +1,89 @@
+"""Rollup rewrites must return the same rows as the raw query."""
+import sqlite3
+
+import pytest
+
+from src.services.rollups import RollupManager
+
+REWRITTEN = [
+    "SELECT strftime('%Y-%m', o.order_purchase_timestamp) AS month, SUM(oi.price) AS revenue FROM orders o "
+    "JOIN order_items oi ON o.order_id = oi.order_id WHERE o.order_purchase_timestamp >= '2018-01-01' "
+    "GROUP BY month ORDER BY month",
+    "SELECT c.customer_state, COUNT(*) AS n FROM orders o JOIN customers c ON o.customer_id = c.customer_id "
+    "GROUP BY c.customer_state ORDER BY n DESC, c.customer_state LIMIT 5",
+    "SELECT payment_type, COUNT(*), AVG(payment_value) FROM order_payments GROUP BY payment_type ORDER BY 2 DESC",
+    "SELECT COUNT(*) FROM order_items",
+    "SELECT COUNT(*) FROM orders o JOIN order_payments op ON o.order_id = op.order_id",
+    "SELECT p.product_category_name, SUM(oi.price) FROM order_items oi JOIN products p ON p.product_id = oi.product_id "
+    "GROUP BY 1 ORDER BY 2 DESC",
+    "SELECT customer_state, COUNT(*) FROM orders o JOIN customers c ON o.customer_id = c.customer_id "
+    "WHERE order_status = 'delivered' GROUP BY customer_state",
+    "SELECT SUM(payment_installments) FROM order_payments",
+    "SELECT MAX(price) - MIN(price) FROM order_items",
+    "SELECT order_status, COUNT(*) FROM orders GROUP BY order_status ORDER BY order_status LIMIT 2 OFFSET 1",
+    "SELECT COUNT(*) FROM order_items oi JOIN orders o ON o.order_id = oi.order_id "
+    "WHERE date(o.order_purchase_timestamp) = '2018-01-05'",
+    "SELECT SUM(price) / COUNT(*) FROM order_items",
+]
+
+# Queries the rollups cannot answer exactly (fan-out counts, non-dimension filters, sub-day timestamps)
+NOT_REWRITTEN = [
+    "SELECT COUNT(DISTINCT o.order_id) FROM orders o JOIN order_items oi ON o.order_id = oi.order_id",
+    "SELECT COUNT(o.order_id) FROM orders o JOIN order_items oi ON o.order_id = oi.order_id",
+    "SELECT COUNT(customer_id) FROM orders",
+    "SELECT COUNT(*) FROM orders WHERE order_purchase_timestamp >= '2018-01-01 12:00:00'",
+    "SELECT COUNT(*) FROM orders WHERE order_purchase_timestamp BETWEEN '2018-01-01' AND '2018-01-31'",
+    "SELECT seller_id, COUNT(*) FROM order_items GROUP BY seller_id",
+    "SELECT * FROM orders",
+]
+
+
+def _normalize(rows):
+    """Round floats (rollup sums add in a different order) and ignore row order."""
+    return sorted(
+        (tuple(round(value, 4) if isinstance(value, float) else value for value in row) for row in rows),
+        key=repr
+    )
+
+
+@pytest.fixture(scope="module")
+def rollups(olist_template, tmp_path_factory):
+    manager = RollupManager(olist_template, tmp_path_factory.mktemp("rollups") / "rollups.sqlite", auto_refresh=False)
+    manager.refresh(force=True)
+    return manager
+
+
+def test_rollups_are_fresh_after_refresh(rollups):
+    assert rollups.is_fresh()
+    assert rollups.refresh() is False
+
+
+@pytest.mark.parametrize("query", REWRITTEN)
+def test_rewritten_query_matches_source(rollups, query):
+    rewrite = rollups.rewrite(query)
+    assert rewrite is not None
+
+    source = sqlite3.connect(rollups.source_path)
+    rollup = sqlite3.connect(rollups.rollup_path)
+    try:
+        expected = source.execute(query).fetchall()
+        actual = rollup.execute(rewrite.sql).fetchall()
+    finally:
+        source.close()
+        rollup.close()
+    assert _normalize(actual) == _normalize(expected)
+
+
+@pytest.mark.parametrize("query", NOT_REWRITTEN)
+def test_inexact_queries_are_not_rewritten(rollups, query):
+    assert rollups.rewrite(query) is None
+
+
+def test_stale_rollups_are_not_used(olist_db, tmp_path):
+    manager = RollupManager(olist_db, tmp_path / "rollups.sqlite", auto_refresh=False)
+    manager.refresh(force=True)
+    conn = sqlite3.connect(olist_db)
+    conn.execute("DELETE FROM order_items WHERE order_item_id > 1")
+    conn.commit()
+    conn.close()
+    assert manager.rewrite("SELECT COUNT(*) FROM order_items") is None
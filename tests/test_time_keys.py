@@ -0,0 +1,61 @@
+"""Time-key rewrites must return the same rows and columns as the raw query."""
+import sqlite3
+
+import pytest
+
+from src.services.db_migrations import get_schema_version, run_migrations
+from src.services.time_keys import rewrite_query
+
+QUERIES = [
+    "SELECT strftime('%Y-%m', order_purchase_timestamp) AS month, COUNT(*) FROM orders "
+    "WHERE strftime('%Y', order_purchase_timestamp) = '2018' GROUP BY month ORDER BY month",
+    "SELECT COUNT(*) FROM orders WHERE strftime('%Y-%m', order_purchase_timestamp) BETWEEN '2017-01' AND '2017-06'",
+    "SELECT * FROM orders WHERE strftime('%Y', order_purchase_timestamp) = '2018' ORDER BY order_id LIMIT 3",
+    "SELECT o.order_status, COUNT(*) FROM orders o JOIN order_items oi ON o.order_id = oi.order_id "
+    "WHERE date(o.order_purchase_timestamp) >= '2018-01-01' GROUP BY 1 ORDER BY 1",
+    "SELECT strftime('%Y-%W', order_delivered_customer_date) w, COUNT(*) FROM orders "
+    "WHERE strftime('%Y', order_delivered_customer_date) = '2017' GROUP BY w ORDER BY w LIMIT 5",
+    "SELECT order_id FROM orders WHERE strftime('%Y', order_purchase_timestamp) IN ('2016', '2017') "
+    "ORDER BY order_id LIMIT 5",
+    "SELECT COUNT(*) FROM orders WHERE strftime('%Y', order_delivered_customer_date) IS NULL",
+    "SELECT strftime('%Y', order_purchase_timestamp), COUNT(*) FROM orders "
+    "WHERE strftime('%Y', order_purchase_timestamp) > '2016' GROUP BY 1 ORDER BY 1",
+    "SELECT strftime('%m', order_purchase_timestamp) m, COUNT(*) FROM orders "
+    "WHERE strftime('%Y', order_purchase_timestamp) = '2017' GROUP BY m ORDER BY m",
+]
+
+
+@pytest.fixture(scope="module")
+def migrated_db(olist_template, tmp_path_factory):
+    path = tmp_path_factory.mktemp("time_keys") / "olist.sqlite"
+    path.write_bytes(olist_template.read_bytes())
+    run_migrations(path)
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def _run(conn, query):
+    cursor = conn.execute(query)
+    return [column[0] for column in cursor.description], cursor.fetchall()
+
+
+def test_migrations_are_idempotent(olist_db):
+    version = run_migrations(olist_db)
+    assert run_migrations(olist_db) == version
+    conn = sqlite3.connect(olist_db)
+    try:
+        assert get_schema_version(conn) == version
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_rewritten_query_matches_source(migrated_db, query):
+    rewritten = rewrite_query(query)
+    assert rewritten is not None and rewritten != query
+    assert _run(migrated_db, rewritten) == _run(migrated_db, query)
+
+
+def test_unwrapped_columns_are_not_rewritten():
+    assert rewrite_query("SELECT COUNT(*) FROM orders WHERE order_purchase_timestamp >= '2018-01-01'") is None